@@ -0,0 +1,289 @@
+# api_executor.py
+#
+# Calendar APIへのリクエストを、クォータに合わせた流量制限・指数バックオフ付きの再試行・
+# エラー率に応じた同時実行数の自動調整のもとで実行するための実行層です。
+# 流量制限・同時実行数の制御・バックオフは tests/test_api_executor.py で確認します。
+
+import contextvars
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from googleapiclient.errors import HttpError
+
+from instrumentation import current_metrics
+
+API_RATE_LIMIT_PER_SECOND = 10.0 # ユーザーあたりのクォータ（600リクエスト/分）に合わせた流量
+API_RATE_BURST = 50 # 一度に消費できるトークン数（バッチ1回分が収まる大きさ）
+API_MAX_CONCURRENCY = 8 # 同時実行数の上限
+API_MIN_CONCURRENCY = 1 # 同時実行数の下限
+API_MAX_RETRIES = 5 # 再試行回数
+API_BACKOFF_BASE_DELAY = 1.0 # バックオフの初期待機秒数
+API_BACKOFF_MAX_DELAY = 32.0 # バックオフの最大待機秒数
+
+_thread_local = threading.local()
+
+def is_retryable_error(exception):
+    """
+    再試行で回復する見込みのあるエラー（レート制限・サーバーエラー・通信エラー）かを判定します。
+    """
+    if not isinstance(exception, HttpError):
+        return True
+    status = exception.resp.status
+    return status == 429 or status >= 500 or is_rate_limit_error(exception)
+
+def is_rate_limit_error(exception):
+    """
+    クォータ超過によるエラー（429、または理由が rateLimitExceeded の403）かを判定します。
+    """
+    if not isinstance(exception, HttpError):
+        return False
+    status = exception.resp.status
+    if status == 429:
+        return True
+    if status == 403:
+        content = exception.content.decode("utf-8", "ignore") if isinstance(exception.content, bytes) else str(exception.content)
+        reason = str(getattr(exception, "error_details", "")) + content
+        return "rateLimitExceeded" in reason or "userRateLimitExceeded" in reason
+    return False
+
+def thread_http(http):
+    """
+    ワーカースレッド専用のHTTPクライアントを返します。
+    httplib2はスレッドセーフではないため、スレッドごとにクライアントを作成します。
+    タイムアウトは元のクライアントの値（未設定なら build() と同じ build_http() の既定値）を使い、
+    応答のない接続がワーカーと同時実行数の枠を占有し続けないようにします。
+    HttpMockなどの差し替え用クライアントは None を返し、呼び出し元の既定のクライアントを使わせます。
+    """
+    import httplib2
+    from google_auth_httplib2 import AuthorizedHttp
+    from googleapiclient.http import build_http
+
+    credentials = getattr(http, "credentials", None)
+    if credentials is None and type(http) is not httplib2.Http:
+        return None
+    clients = getattr(_thread_local, "clients", None)
+    if clients is None:
+        clients = _thread_local.clients = {}
+    key = id(credentials) if credentials is not None else id(http)
+    client = clients.get(key)
+    if client is None:
+        client = build_http()
+        timeout = getattr(getattr(http, "http", http), "timeout", None) # AuthorizedHttp は .http の値
+        if timeout is not None:
+            client.timeout = timeout
+        if credentials is not None:
+            client = AuthorizedHttp(credentials, http=client)
+        clients[key] = client
+    return client
+
+class TokenBucket:
+    """
+    一定の速度でトークンが補充されるバケットです。acquire() はトークンが貯まるまで待機します。
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait_seconds = (tokens - self._tokens) / self.rate
+            time.sleep(wait_seconds)
+
+class AdaptiveConcurrency:
+    """
+    同時実行数の上限を、スロットリングを受けたら半減し、成功が続けば1ずつ増やす（AIMD）制御です。
+    """
+
+    def __init__(self, initial, minimum, maximum, window=20, error_threshold=0.05, cooldown=2.0):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.window = window
+        self.error_threshold = error_threshold
+        self.cooldown = cooldown
+        self._active = 0
+        self._completed = 0
+        self._errors = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self._active >= self.limit:
+                self._condition.wait()
+            self._active += 1
+
+    def release(self, throttled=False):
+        with self._condition:
+            self._active -= 1
+            self._record(throttled)
+            self._condition.notify_all()
+
+    def report_throttle(self):
+        with self._condition:
+            self._record(True)
+            self._condition.notify_all()
+
+    def _record(self, throttled):
+        now = time.monotonic()
+        self._completed += 1
+        if throttled:
+            self._errors += 1
+            # 連続したスロットリングで一気に下限まで下がらないよう、減少は cooldown 秒に1回まで
+            if now - self._last_decrease >= self.cooldown:
+                self.limit = max(self.minimum, self.limit // 2)
+                self._last_decrease = now
+                self._completed = self._errors = 0
+            return
+        if self._completed >= self.window:
+            if self._errors / self._completed <= self.error_threshold:
+                self.limit = min(self.maximum, self.limit + 1)
+            self._completed = self._errors = 0
+
+class ApiExecutor:
+    """
+    Calendar APIのリクエスト（HttpRequest / BatchHttpRequest）を流量制限と再試行付きで実行します。
+    """
+
+    def __init__(self, rate_per_second=API_RATE_LIMIT_PER_SECOND, burst=API_RATE_BURST,
+                 max_concurrency=API_MAX_CONCURRENCY, min_concurrency=API_MIN_CONCURRENCY,
+                 max_retries=API_MAX_RETRIES, base_delay=API_BACKOFF_BASE_DELAY, max_delay=API_BACKOFF_MAX_DELAY,
+                 bucket=None):
+        # bucket を指定した場合は、rate_per_second / burst の代わりにそのバケットを他の実行層と共有します
+        self.bucket = bucket or TokenBucket(rate_per_second, burst)
+        self.concurrency = AdaptiveConcurrency(max_concurrency, min_concurrency, max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "failed": 0}
+        self._stats_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="calendar-api")
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self.stats[name] += amount
+        metrics = current_metrics()
+        if metrics is not None and name != "requests":
+            metrics.count(name, amount)
+
+    def backoff_delay(self, attempt, exception=None):
+        """
+        attempt 回目の再試行までの待機秒数（ジッター付きの指数バックオフ）を返します。
+        Retry-After ヘッダーがある場合はその値を下限にします。
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        resp = getattr(exception, "resp", None)
+        retry_after = resp.get("retry-after") if resp is not None else None
+        if retry_after and str(retry_after).isdigit():
+            delay = max(delay, float(retry_after))
+        return delay
+
+    def report_throttle(self, count=1):
+        """
+        バッチ内のサブリクエストなど、execute() の外で検出したスロットリングを通知します。
+        count はスロットリングを受けたリクエスト数で、同時実行数の調整は呼び出し1回につき1回です。
+        """
+        self._count("throttled", count)
+        self.concurrency.report_throttle()
+
+    def report_retries(self, count=1):
+        """
+        バッチ内で失敗したサブリクエストの再送など、execute() の外で行った再試行の件数を記録します。
+        """
+        self._count("retries", count)
+
+    def execute(self, request, http=None, cost=1):
+        """
+        リクエストを実行してレスポンスを返します。再試行可能なエラーは max_retries 回まで再試行し、
+        それでも失敗した場合は最後の例外を送出します。
+        cost にはクォータの消費量（バッチの場合はサブリクエスト数）を指定します。
+        """
+        if http is None and getattr(request, "http", None) is not None:
+            http = thread_http(request.http)
+
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire(cost)
+            self.concurrency.acquire()
+            throttled = False
+            started = time.perf_counter()
+            try:
+                self._count("requests")
+                return request.execute(http=http)
+            except Exception as e:
+                throttled = is_rate_limit_error(e)
+                if throttled:
+                    self._count("throttled")
+                if not is_retryable_error(e) or attempt == self.max_retries:
+                    self._count("failed")
+                    raise
+                error = e
+            finally:
+                self.concurrency.release(throttled)
+                metrics = current_metrics()
+                if metrics is not None:
+                    metrics.record_call(request, time.perf_counter() - started)
+            self._count("retries")
+            time.sleep(self.backoff_delay(attempt, error))
+
+    def submit(self, func, *args, **kwargs):
+        """
+        関数を実行層のスレッドプールで非同期に実行し、Future を返します。
+        呼び出し元のコンテキスト（記録中の RunMetrics など）を引き継ぎます。
+        """
+        return self._pool.submit(contextvars.copy_context().run, func, *args, **kwargs)
+
+_default_executor = None
+_default_executor_lock = threading.Lock()
+_shared_bucket = None
+
+def get_shared_bucket():
+    """
+    プロセス内のすべての実行層で共有する TokenBucket を返します。
+    クォータはカレンダーごとではなくユーザーごとのため、流量はこのバケット1つで制限します。
+    """
+    global _shared_bucket
+    with _default_executor_lock:
+        if _shared_bucket is None:
+            _shared_bucket = TokenBucket(API_RATE_LIMIT_PER_SECOND, API_RATE_BURST)
+        return _shared_bucket
+
+def get_default_executor():
+    """
+    プロセス内で共有する ApiExecutor を返します（同じユーザーのクォータを共有するため）。
+    """
+    global _default_executor
+    bucket = get_shared_bucket()
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = ApiExecutor(bucket=bucket)
+        return _default_executor
+
+_calendar_executors = {}
+
+def get_calendar_executor(calendar_id):
+    """
+    カレンダーごとに専用の ApiExecutor を返します。複数のカレンダーへ同時に登録する場合に、
+    同時実行数・スロットリングの集計をカレンダー単位で分け、1つのカレンダーの混雑が他を待たせないようにします。
+    流量制限は get_shared_bucket() をすべてのカレンダーと既定の実行層で共有し、合計がユーザーのクォータを超えないようにします。
+    """
+    bucket = get_shared_bucket()
+    with _default_executor_lock:
+        executor = _calendar_executors.get(calendar_id)
+        if executor is None:
+            executor = _calendar_executors[calendar_id] = ApiExecutor(bucket=bucket)
+        return executor
@@ -0,0 +1,85 @@
+# benchmarks/bench_event_batch.py
+#
+# 読み込んだイベントの受け渡し方法について、メモリ使用量と処理速度を比較します。
+#   - 文字列の列のDataFrame（process_excel_files の結果）を iterrows + build_event_data で処理する従来の方法
+#   - datetime64 の列のDataFrame（build_typed_event_frame）から build_event_payloads で全件のリストを作る方法
+#   - EventBatch から iter_event_payloads で作成しながら、送信と同じく50件ずつ受け取る方法
+# Excelの読み込みは含めません。保持するデータの大きさ（memory_usage(deep=True) と同じ数え方）と、
+# イベント本体をすべて作成し終えるまでの最大メモリ割り当て（tracemalloc）を表示します。
+#
+#   python -m benchmarks.bench_event_batch --rows 100000
+
+import argparse
+import itertools
+import time
+import tracemalloc
+
+from benchmarks.workbooks import make_frame
+from calendar_utils import BATCH_CHUNK_SIZE, attach_sync_properties, build_event_data
+from event_batch import EventBatch
+from excel_parser import build_typed_event_frame, clean_mng_series, format_event_frame
+from payloads import build_event_payloads, iter_event_payloads
+
+DESCRIPTION_COLUMNS = ["戸数", "面積", "担当"]
+
+def legacy_payloads(frame):
+    # 従来の main.py と同じく、iterrows で1行ずつ Series を作って処理します
+    payloads = []
+    for _, row in frame.iterrows():
+        event_data = build_event_data(row)
+        if row["管理番号"]:
+            attach_sync_properties(event_data, row["管理番号"])
+        payloads.append(event_data)
+    return len(payloads)
+
+def typed_payloads(typed):
+    return len(build_event_payloads(typed, False, True))
+
+def batch_payloads(batch):
+    # 送信処理と同じく BATCH_CHUNK_SIZE 件ずつ受け取り、受け取った分は保持しません
+    count = 0
+    payloads = iter_event_payloads(batch)
+    while True:
+        chunk = list(itertools.islice(payloads, BATCH_CHUNK_SIZE))
+        if not chunk:
+            return count
+        count += len(chunk)
+
+def _measure(func, data):
+    started = time.perf_counter()
+    count = func(data)
+    seconds = time.perf_counter() - started
+    tracemalloc.start()
+    func(data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return count, seconds, peak
+
+def _mb(size):
+    return size / 1024 / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description="イベントの中間表現のメモリ使用量と処理速度の比較")
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+    df["管理番号"] = clean_mng_series(df["管理番号"])
+    typed = build_typed_event_frame([df], DESCRIPTION_COLUMNS)
+    frame = format_event_frame(typed, False, True)
+    started = time.perf_counter()
+    batch = EventBatch.from_frame(typed, False, True)
+    convert_seconds = time.perf_counter() - started
+    print(f"{len(typed)} 件（DataFrame から EventBatch への変換 {convert_seconds:.2f} 秒）")
+
+    print(f"\n{'方法':40s} {'保持サイズ(MB)':>14s} {'作成(秒)':>9s} {'件/秒':>10s} {'最大割り当て(MB)':>16s}")
+    for label, func, data, size in (
+        ("文字列のDataFrame + iterrows", legacy_payloads, frame, frame.memory_usage(deep=True).sum()),
+        ("datetime64のDataFrame + build_event_payloads", typed_payloads, typed, typed.memory_usage(deep=True).sum()),
+        ("EventBatch + iter_event_payloads", batch_payloads, batch, batch.nbytes()),
+    ):
+        count, seconds, peak = _measure(func, data)
+        print(f"{label:40s} {_mb(size):14.1f} {seconds:9.2f} {count / seconds:10.0f} {_mb(peak):16.1f}")
+
+if __name__ == "__main__":
+    main()
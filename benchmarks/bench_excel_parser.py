@@ -0,0 +1,98 @@
+# benchmarks/bench_excel_parser.py
+#
+# process_excel_files の列単位変換と、従来の iterrows 版の処理時間の比較ベンチマークです。
+# 出力が従来版と一致することは tests/test_excel_parser_parity.py で確認します。
+#
+#   python -m benchmarks.bench_excel_parser --rows 100000
+
+import argparse
+import time
+
+import pandas as pd
+
+from benchmarks.workbooks import make_workbook
+from excel_parser import clean_mng_num, find_closest_column, format_description_value, process_excel_files
+
+def legacy_process_excel_files(uploaded_files, description_columns, all_day_event, private_event):
+    """
+    iterrows による従来の実装です（処理時間の比較用）。
+    """
+    dataframes = []
+    for uploaded_file in uploaded_files:
+        df = pd.read_excel(uploaded_file, engine="openpyxl")
+        df.columns = [str(c).strip() for c in df.columns]
+        mng_col = find_closest_column(df.columns, ["管理番号"])
+        if not mng_col:
+            continue
+        df["管理番号"] = df[mng_col].apply(clean_mng_num)
+        dataframes.append(df)
+
+    merged_df = dataframes[0]
+    for df in dataframes[1:]:
+        merged_df = pd.merge(merged_df, df, on="管理番号", how="outer")
+
+    merged_df["管理番号"] = merged_df["管理番号"].apply(clean_mng_num)
+    merged_df.drop_duplicates(subset="管理番号", inplace=True)
+
+    name_col = find_closest_column(merged_df.columns, ["物件名"])
+    start_col = find_closest_column(merged_df.columns, ["予定開始"])
+    end_col = find_closest_column(merged_df.columns, ["予定終了"])
+    addr_col = find_closest_column(merged_df.columns, ["住所", "所在地"])
+    merged_df = merged_df.dropna(subset=[start_col, end_col])
+
+    output = []
+    for _, row in merged_df.iterrows():
+        mng = clean_mng_num(row["管理番号"])
+        subj = f"{mng}{row.get(name_col, '')}"
+        try:
+            start = pd.to_datetime(row[start_col])
+            end = pd.to_datetime(row[end_col])
+        except Exception:
+            continue
+        location = row.get(addr_col, "")
+        if isinstance(location, str) and "北海道札幌市" in location:
+            location = location.replace("北海道札幌市", "")
+        description = " / ".join(
+            [format_description_value(row.get(col)) for col in description_columns if col in row]
+        )
+        output.append({
+            "Subject": subj,
+            "Start Date": start.strftime("%Y/%m/%d"),
+            "Start Time": start.strftime("%H:%M"),
+            "End Date": end.strftime("%Y/%m/%d"),
+            "End Time": end.strftime("%H:%M"),
+            "All Day Event": "True" if all_day_event else "False",
+            "Description": description,
+            "Location": location,
+            "Private": "True" if private_event else "False"
+        })
+    return pd.DataFrame(output)
+
+def _timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description="process_excel_files のベンチマーク")
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"{args.rows} 行の合成ワークブックを作成中...")
+    workbook = make_workbook(args.rows)
+    description_columns = ["戸数", "面積", "担当"]
+
+    def run(func):
+        workbook.seek(0)
+        return _timed(func, [workbook], description_columns, False, True)
+
+    _, read_seconds = _timed(lambda: (workbook.seek(0), pd.read_excel(workbook, engine="openpyxl")))
+    _, legacy_seconds = run(legacy_process_excel_files)
+    _, new_seconds = run(process_excel_files)
+
+    print(f"read_excel のみ    : {read_seconds:8.2f} 秒")
+    print(f"従来版 (iterrows)  : {legacy_seconds:8.2f} 秒 (変換 {legacy_seconds - read_seconds:.2f} 秒)")
+    print(f"列単位版           : {new_seconds:8.2f} 秒 (変換 {new_seconds - read_seconds:.2f} 秒)")
+
+if __name__ == "__main__":
+    main()
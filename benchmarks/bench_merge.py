@@ -0,0 +1,46 @@
+# benchmarks/bench_merge.py
+#
+# 複数ファイルの結合について、従来の pd.merge の連鎖と merge_dataframes を比較するベンチマークです。
+# Excelの読み込みを含めず、結合処理だけを計測します。
+#
+#   python -m benchmarks.bench_merge --rows 5000 --files 2 5 10 20 50
+
+import argparse
+import time
+
+import pandas as pd
+
+from benchmarks.workbooks import make_file_set
+from excel_parser import merge_dataframes
+
+def chained_merge(frames):
+    merged_df = frames[0]
+    for df in frames[1:]:
+        merged_df = pd.merge(merged_df, df, on="管理番号", how="outer")
+    return merged_df.drop_duplicates(subset="管理番号")
+
+def _measure(func, frames):
+    started = time.perf_counter()
+    try:
+        result = func(frames)
+    except Exception as e:
+        return None, f"失敗 ({type(e).__name__})"
+    elapsed = time.perf_counter() - started
+    memory_mb = result.memory_usage(deep=True).sum() / (1024 * 1024)
+    return elapsed, f"{elapsed:8.3f} 秒 {len(result.columns):4d} 列 {memory_mb:8.1f} MB"
+
+def main():
+    parser = argparse.ArgumentParser(description="複数ファイル結合のベンチマーク")
+    parser.add_argument("--rows", type=int, default=5000, help="1ファイルあたりの行数")
+    parser.add_argument("--files", type=int, nargs="+", default=[2, 5, 10, 20, 50])
+    args = parser.parse_args()
+
+    print(f"{'ファイル数':>8s}  {'pd.merge の連鎖':<36s}  merge_dataframes")
+    for file_count in args.files:
+        frames = make_file_set(file_count, args.rows, overlap=0.5, duplicate_rate=0.02)
+        _, chained = _measure(chained_merge, frames)
+        _, single_pass = _measure(merge_dataframes, frames)
+        print(f"{file_count:8d}  {chained:<36s}  {single_pass}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# benchmarks/bench_payloads.py
+#
+# イベント本体の作成について、文字列の列から行ごとに build_event_data で組み立てる従来の方法と、
+# datetime64 の列から build_event_payloads で一括作成する方法の処理速度を比較します。
+# Excelの読み込みは含めず、両方の結果が完全に一致することも確認します。
+#
+#   python -m benchmarks.bench_payloads --rows 100000
+
+import argparse
+import time
+
+from benchmarks.workbooks import make_frame
+from calendar_utils import attach_sync_properties, build_event_data
+from excel_parser import build_typed_event_frame, clean_mng_series, format_event_frame
+from payloads import build_event_payloads
+
+DESCRIPTION_COLUMNS = ["戸数", "面積", "担当"]
+
+def legacy_payloads(typed, all_day_event, private_event):
+    """
+    従来の main.py と同じく、文字列の列にしたDataFrameを iterrows で1行ずつ処理します。
+    """
+    df = format_event_frame(typed, all_day_event, private_event)
+    payloads = []
+    for _, row in df.iterrows():
+        event_data = build_event_data(row)
+        if row["管理番号"]:
+            attach_sync_properties(event_data, row["管理番号"])
+        payloads.append((row["管理番号"], event_data))
+    return payloads
+
+def records_payloads(typed, all_day_event, private_event):
+    """
+    to_dict("records") で行をdictにしてから build_event_data で処理します（バックグラウンドジョブの従来の方法）。
+    """
+    payloads = []
+    for record in format_event_frame(typed, all_day_event, private_event).to_dict("records"):
+        event_data = build_event_data(record)
+        if record["管理番号"]:
+            attach_sync_properties(event_data, record["管理番号"])
+        payloads.append((record["管理番号"], event_data))
+    return payloads
+
+def _timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description="イベント本体の作成のベンチマーク")
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+    df["管理番号"] = clean_mng_series(df["管理番号"])
+    typed = build_typed_event_frame([df], DESCRIPTION_COLUMNS)
+    print(f"{len(typed)} 件のイベント本体を作成します。")
+
+    for all_day_event in (False, True):
+        legacy, legacy_seconds = _timed(legacy_payloads, typed, all_day_event, True)
+        records, records_seconds = _timed(records_payloads, typed, all_day_event, True)
+        vectorized, vectorized_seconds = _timed(build_event_payloads, typed, all_day_event, True)
+        assert legacy == vectorized == records, "出力が一致しません"
+
+        mode = "終日" if all_day_event else "時間指定"
+        print(f"[{mode}] 出力一致: OK")
+        print(f"  iterrows + build_event_data      : {legacy_seconds:8.2f} 秒 ({len(typed) / legacy_seconds:10.0f} 件/秒)")
+        print(f"  to_dict + build_event_data       : {records_seconds:8.2f} 秒 ({len(typed) / records_seconds:10.0f} 件/秒)")
+        print(f"  build_event_payloads             : {vectorized_seconds:8.2f} 秒 ({len(typed) / vectorized_seconds:10.0f} 件/秒)")
+
+        _, no_sync_seconds = _timed(build_event_payloads, typed, all_day_event, True, False)
+        print(f"  build_event_payloads（同期情報なし）: {no_sync_seconds:8.2f} 秒 ({len(typed) / no_sync_seconds:10.0f} 件/秒)")
+
+if __name__ == "__main__":
+    main()
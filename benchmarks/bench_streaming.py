@@ -0,0 +1,62 @@
+# benchmarks/bench_streaming.py
+#
+# DataFrame経由の process_excel_files と、ストリーミング読み込みの iter_event_records の
+# 処理時間とピークメモリ（最大RSS）を比較するベンチマークです。
+# 計測が互いに影響しないよう、それぞれ別プロセスで実行します。
+#
+#   python -m benchmarks.bench_streaming --rows 200000
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+DESCRIPTION_COLUMNS = ["戸数", "面積", "担当"]
+
+def _peak_rss_mb():
+    # Linuxでは ru_maxrss はKB単位、macOSではバイト単位
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def _run_child(mode, path):
+    from excel_parser import iter_event_records, process_excel_files
+
+    baseline = _peak_rss_mb()
+    started = time.perf_counter()
+    if mode == "dataframe":
+        count = len(process_excel_files([path], DESCRIPTION_COLUMNS, False, True))
+    else:
+        count = sum(1 for _ in iter_event_records([path], DESCRIPTION_COLUMNS, False, True))
+    elapsed = time.perf_counter() - started
+    print(f"{mode:10s}: {count:8d} 件 {elapsed:8.2f} 秒  ピークRSS {_peak_rss_mb():8.1f} MB (import後 {baseline:.1f} MB)")
+
+def main():
+    parser = argparse.ArgumentParser(description="ストリーミング読み込みのベンチマーク")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--child", choices=["dataframe", "stream"], help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _run_child(args.child, args.path)
+        return
+
+    from benchmarks.workbooks import make_workbook
+
+    print(f"{args.rows} 行の合成ワークブックを作成中...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.xlsx")
+        with open(path, "wb") as f:
+            f.write(make_workbook(args.rows).getvalue())
+        print(f"ファイルサイズ: {os.path.getsize(path) / (1024 * 1024):.1f} MB")
+        for mode in ("dataframe", "stream"):
+            subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_streaming", "--child", mode, "--path", path],
+                check=True
+            )
+
+if __name__ == "__main__":
+    main()
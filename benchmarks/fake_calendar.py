@@ -0,0 +1,398 @@
+# benchmarks/fake_calendar.py
+#
+# Calendar API v3 の一部（イベントの insert / get / list / patch / update / delete、
+# カレンダー一覧、バッチリクエスト）をプロセス内で再現する偽のバックエンドです。
+# httplib2.Http と同じ request() を持つため、googleapiclient の build(http=...) にそのまま渡せ、
+# バッチのマルチパート組み立て・解析を含めて本物と同じコードパスで計測できます。
+#
+#   backend = FakeCalendarBackend(latency=0.05, error_rate=0.01)
+#   service = build_fake_service(backend)
+#
+# 応答時間（HTTP呼び出しごと・サブリクエストごと）とエラー（レート制限・サーバーエラー）を注入できます。
+
+import bisect
+import copy
+import email.parser
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import httplib2
+
+JST = timezone(timedelta(hours=9))
+LIST_DEFAULT_PAGE_SIZE = 250 # maxResults 未指定時の件数（本物と同じ）
+LIST_MAX_PAGE_SIZE = 2500 # maxResults の上限（本物と同じ）
+
+_EVENTS_PATH = re.compile(r"^/calendar/v3/calendars/([^/]+)/events(?:/([^/]+))?$")
+_CALENDAR_LIST_PATH = "/calendar/v3/users/me/calendarList"
+_BATCH_PATH = "/batch/calendar/v3"
+
+_ERRORS = {
+    429: ("rateLimitExceeded", "Rate Limit Exceeded"),
+    403: ("rateLimitExceeded", "Rate Limit Exceeded"),
+    500: ("backendError", "Backend Error"),
+    503: ("backendError", "Backend Error"),
+    404: ("notFound", "Not Found"),
+    409: ("duplicate", "The requested identifier already exists."),
+    410: ("deleted", "Resource has been deleted"),
+    400: ("invalid", "Bad Request"),
+}
+
+def _error_body(status):
+    reason, message = _ERRORS.get(status, ("unknown", "Error"))
+    return {"error": {"code": status, "message": message, "errors": [{"domain": "global", "reason": reason, "message": message}]}}
+
+def _parse_time(value):
+    # RFC3339 の文字列をエポック秒に変換します（タイムゾーンなしは日本時間として扱います）
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return (dt if dt.tzinfo else dt.replace(tzinfo=JST)).timestamp()
+
+def _event_bounds(event):
+    def parse(value):
+        if "dateTime" in value:
+            return _parse_time(value["dateTime"])
+        return datetime.strptime(value["date"], "%Y-%m-%d").replace(tzinfo=JST).timestamp()
+
+    return parse(event["start"]), parse(event["end"])
+
+def _merge_patch(target, patch):
+    for key, value in patch.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge_patch(target[key], value)
+        else:
+            target[key] = value
+
+class FakeCalendarBackend:
+    """
+    httplib2.Http 互換の偽バックエンドです。複数スレッドから同時に呼び出せます。
+
+    latency: HTTP呼び出し1回あたりの応答時間（秒）、jitter: それに加える0〜jitter秒の揺らぎ、
+    item_latency: バッチ内のサブリクエスト1件あたりの追加時間、
+    error_rate: (サブ)リクエストごとに error_status を返す確率、
+    batch_error_rate: バッチ全体が 503 を返す確率です。
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, item_latency=0.0, error_rate=0.0, error_status=429,
+                 batch_error_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.item_latency = item_latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.batch_error_rate = batch_error_rate
+        self.calls = Counter() # 操作名 -> 回数（"batch" はHTTP呼び出し、それ以外はサブリクエストも含む）
+        self.errors = Counter() # ステータス -> 注入したエラー数
+        self._events = {} # カレンダーID -> {イベントID: イベント}
+        self._order = {} # カレンダーID -> 開始時刻順の [(開始, イベントID)]
+        self._bounds = {} # (カレンダーID, イベントID) -> (開始, 終了)
+        self._deleted = set() # 削除済みの (カレンダーID, イベントID)
+        self._changes = {} # カレンダーID -> {イベントID: 最後に変更された通番}（syncToken 用）
+        self._seq = 0
+        self._sync_generation = 0 # 世代の異なる syncToken は 410 を返します
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    # ---- テスト・ベンチマーク用の直接操作 ----
+
+    def add_calendar(self, calendar_id):
+        with self._lock:
+            self._calendar(calendar_id)
+
+    def seed_events(self, calendar_id, events):
+        """
+        HTTPを経由せずにイベントを登録し、登録した件数を返します（削除シナリオの準備用）。
+        """
+        with self._lock:
+            count = 0
+            for event in events:
+                self._insert(calendar_id, copy.deepcopy(event))
+                count += 1
+            return count
+
+    def events(self, calendar_id):
+        """
+        カレンダーのイベントを開始時刻順に返します。
+        """
+        with self._lock:
+            store = self._events.get(calendar_id, {})
+            return [copy.deepcopy(store[event_id]) for _, event_id in self._order.get(calendar_id, [])]
+
+    def invalidate_sync_tokens(self):
+        """
+        発行済みの syncToken をすべて無効にします（次の差分取得は 410 になります）。
+        """
+        with self._lock:
+            self._sync_generation += 1
+
+    def count(self, calendar_id):
+        with self._lock:
+            return len(self._events.get(calendar_id, {}))
+
+    # ---- httplib2.Http 互換 ----
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=None, connection_type=None):
+        parsed = urllib.parse.urlparse(uri)
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        if parsed.path == _BATCH_PATH:
+            return self._handle_batch(body, headers)
+
+        self._sleep(self.latency + self._random() * self.jitter)
+        status, payload = self._dispatch(method, parsed.path, parsed.query, body)
+        return self._response(status, payload)
+
+    # ---- 内部処理 ----
+
+    def _random(self):
+        with self._lock:
+            return self._rng.random()
+
+    @staticmethod
+    def _sleep(seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    @staticmethod
+    def _response(status, payload, content_type="application/json; charset=UTF-8"):
+        content = b"" if payload is None else (payload if isinstance(payload, bytes) else json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+        return httplib2.Response({"status": str(status), "content-type": content_type}), content
+
+    def _calendar(self, calendar_id):
+        # 呼び出し元でロックを取得していること
+        if calendar_id not in self._events:
+            self._events[calendar_id] = {}
+            self._order[calendar_id] = []
+        return self._events[calendar_id]
+
+    def _insert(self, calendar_id, event):
+        store = self._calendar(calendar_id)
+        event_id = event.get("id") or uuid.uuid4().hex
+        now = datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+        event.update({
+            "kind": "calendar#event", "id": event_id, "status": "confirmed", "created": now, "updated": now,
+            "etag": f'"{uuid.uuid4().int % 10**16}"', "iCalUID": f"{event_id}@google.com",
+            "htmlLink": f"https://www.google.com/calendar/event?eid={event_id}",
+        })
+        store[event_id] = event
+        self._index(calendar_id, event_id, event)
+        return event
+
+    def _touch(self, calendar_id, event_id):
+        self._seq += 1
+        self._changes.setdefault(calendar_id, {})[event_id] = self._seq
+
+    def _sync_token(self):
+        return json.dumps({"seq": self._seq, "generation": self._sync_generation})
+
+    def _index(self, calendar_id, event_id, event):
+        self._touch(calendar_id, event_id)
+        bounds = _event_bounds(event)
+        self._bounds[(calendar_id, event_id)] = bounds
+        bisect.insort(self._order[calendar_id], (bounds[0], event_id))
+
+    def _unindex(self, calendar_id, event_id):
+        start, _ = self._bounds.pop((calendar_id, event_id))
+        order = self._order[calendar_id]
+        del order[bisect.bisect_left(order, (start, event_id))]
+
+    def _dispatch(self, method, path, query, body):
+        """
+        (ステータス, 応答本体) を返します。エラー注入もここで行います。
+        """
+        if self.error_rate and self._random() < self.error_rate:
+            with self._lock:
+                self.errors[self.error_status] += 1
+            return self.error_status, _error_body(self.error_status)
+
+        params = urllib.parse.parse_qs(query)
+        data = json.loads(body) if body else {}
+        if path == _CALENDAR_LIST_PATH and method == "GET":
+            return self._list_calendars(params)
+
+        match = _EVENTS_PATH.match(path)
+        if not match:
+            return 404, _error_body(404)
+        calendar_id = urllib.parse.unquote(match.group(1))
+        event_id = urllib.parse.unquote(match.group(2)) if match.group(2) else None
+
+        with self._lock:
+            if event_id is None and method == "POST":
+                self.calls["insert"] += 1
+                if data.get("id") and (data["id"] in self._calendar(calendar_id) or (calendar_id, data["id"]) in self._deleted):
+                    return 409, _error_body(409) # 指定したIDが使用済み（本物と同じく削除済みのIDも再利用できません）
+                return 200, copy.deepcopy(self._insert(calendar_id, data))
+            if event_id is None and method == "GET":
+                self.calls["list"] += 1
+                if "syncToken" in params:
+                    return self._list_changes(calendar_id, params)
+                return 200, self._list_events(calendar_id, params)
+
+            store = self._calendar(calendar_id)
+            if event_id not in store:
+                self.calls[method.lower()] += 1
+                status = 410 if (calendar_id, event_id) in self._deleted else 404
+                return status, _error_body(status)
+            if method == "GET":
+                self.calls["get"] += 1
+                return 200, copy.deepcopy(store[event_id])
+            if method == "DELETE":
+                self.calls["delete"] += 1
+                del store[event_id]
+                self._unindex(calendar_id, event_id)
+                self._touch(calendar_id, event_id)
+                self._deleted.add((calendar_id, event_id))
+                return 204, None
+            if method in ("PATCH", "PUT"):
+                self.calls["patch" if method == "PATCH" else "update"] += 1
+                event = store[event_id]
+                if method == "PUT":
+                    kept = {key: event[key] for key in ("kind", "id", "status", "created", "etag", "iCalUID", "htmlLink")}
+                    event.clear()
+                    event.update(kept)
+                _merge_patch(event, data)
+                event["updated"] = datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+                self._unindex(calendar_id, event_id)
+                self._index(calendar_id, event_id, event)
+                return 200, copy.deepcopy(event)
+        return 400, _error_body(400)
+
+    def _list_calendars(self, params):
+        with self._lock:
+            self.calls["calendarList"] += 1
+            items = [
+                {"kind": "calendar#calendarListEntry", "id": calendar_id, "summary": calendar_id, "accessRole": "owner"}
+                for calendar_id in self._events
+            ]
+        return 200, {"kind": "calendar#calendarList", "items": items}
+
+    def _list_events(self, calendar_id, params):
+        # 呼び出し元でロックを取得していること。
+        # ページトークンは最後に返したイベントの (開始, ID) のため、ページの間に削除しても取りこぼしません。
+        self._calendar(calendar_id)
+        time_min = _parse_time(params["timeMin"][0]) if "timeMin" in params else float("-inf")
+        time_max = _parse_time(params["timeMax"][0]) if "timeMax" in params else float("inf")
+        page_size = min(int(params.get("maxResults", [LIST_DEFAULT_PAGE_SIZE])[0]), LIST_MAX_PAGE_SIZE)
+        properties = [value.split("=", 1) for value in params.get("privateExtendedProperty", [])]
+
+        order = self._order[calendar_id]
+        position = 0
+        if "pageToken" in params:
+            start, event_id = json.loads(params["pageToken"][0])
+            position = bisect.bisect_right(order, (start, event_id))
+
+        store = self._events[calendar_id]
+        items = []
+        last = None
+        while position < len(order) and len(items) < page_size:
+            start, event_id = order[position]
+            position += 1
+            if start >= time_max:
+                position = len(order)
+                break
+            if self._bounds[(calendar_id, event_id)][1] <= time_min:
+                continue
+            event = store[event_id]
+            private = event.get("extendedProperties", {}).get("private", {})
+            if any(private.get(key) != value for key, value in properties):
+                continue
+            items.append(event)
+            last = (start, event_id)
+
+        result = {"kind": "calendar#events", "items": [self._select_fields(event, params) for event in items]}
+        if position < len(order) and last is not None:
+            result["nextPageToken"] = json.dumps(last)
+        else:
+            result["nextSyncToken"] = self._sync_token()
+        return result
+
+    def _list_changes(self, calendar_id, params):
+        # syncToken 以降に変更・削除されたイベントを変更順に返します（削除済みは status が cancelled）
+        token = json.loads(params["syncToken"][0])
+        if token["generation"] != self._sync_generation:
+            return 410, _error_body(410)
+        since = token["seq"]
+        after = json.loads(params["pageToken"][0])["after"] if "pageToken" in params else since
+        page_size = min(int(params.get("maxResults", [LIST_DEFAULT_PAGE_SIZE])[0]), LIST_MAX_PAGE_SIZE)
+        changes = sorted((seq, event_id) for event_id, seq in self._changes.get(calendar_id, {}).items() if seq > after)
+        store = self._calendar(calendar_id)
+        items = [
+            store.get(event_id) or {"kind": "calendar#event", "id": event_id, "status": "cancelled"}
+            for _, event_id in changes[:page_size]
+        ]
+        result = {"kind": "calendar#events", "items": [self._select_fields(event, params) for event in items]}
+        if len(changes) > page_size:
+            result["nextPageToken"] = json.dumps({"after": changes[page_size - 1][0]})
+        else:
+            result["nextSyncToken"] = self._sync_token()
+        return 200, result
+
+    @staticmethod
+    def _select_fields(event, params):
+        # fields=items(id,summary),nextPageToken のような部分レスポンスの指定に対応します
+        # （items の直下の項目のみ絞り込み、extendedProperties(private(...)) のような入れ子の指定は項目全体を返します）
+        fields = params.get("fields", [""])[0]
+        position = fields.find("items(")
+        if position < 0:
+            return copy.deepcopy(event)
+        keys = []
+        depth = 0
+        current = ""
+        for char in fields[position + len("items("):]:
+            if char == "(":
+                depth += 1
+            elif char == ")":
+                if depth == 0:
+                    break
+                depth -= 1
+            elif char == "," and depth == 0:
+                keys.append(current)
+                current = ""
+                continue
+            if depth == 0 and char != ")":
+                current += char
+        keys.append(current)
+        return {key.strip(): copy.deepcopy(event[key.strip()]) for key in keys if key.strip() in event}
+
+    def _handle_batch(self, body, headers):
+        with self._lock:
+            self.calls["batch"] += 1
+        if self.batch_error_rate and self._random() < self.batch_error_rate:
+            with self._lock:
+                self.errors[503] += 1
+            self._sleep(self.latency)
+            return self._response(503, _error_body(503))
+
+        message = email.parser.Parser().parsestr(f"content-type: {headers['content-type']}\r\n\r\n{body}")
+        parts = message.get_payload()
+        self._sleep(self.latency + self._random() * self.jitter + self.item_latency * len(parts))
+
+        boundary = f"batch_{uuid.uuid4().hex}"
+        chunks = []
+        for part in parts:
+            content_id = part["Content-ID"]
+            request_line, rest = part.get_payload().split("\n", 1)
+            method, target, _ = request_line.split(" ", 2)
+            sub_body = re.split(r"\r?\n\r?\n", rest, maxsplit=1)[1] if re.search(r"\r?\n\r?\n", rest) else ""
+            parsed = urllib.parse.urlparse(target)
+            status, payload = self._dispatch(method, parsed.path, parsed.query, sub_body or None)
+            content = "" if payload is None else json.dumps(payload, ensure_ascii=False)
+            reason = "OK" if status < 300 else "Error"
+            chunks.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id[1:-1]}>\r\n\r\n"
+                f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n{content}\r\n"
+            )
+        chunks.append(f"--{boundary}--\r\n")
+        return self._response(200, "".join(chunks).encode("utf-8"), f"multipart/mixed; boundary={boundary}")
+
+def build_fake_service(backend):
+    """
+    偽のバックエンドに接続した Calendar API のサービスを返します。
+    """
+    from googleapiclient.discovery import build
+    return build("calendar", "v3", http=backend, static_discovery=True, cache_discovery=False)
@@ -0,0 +1,184 @@
+# benchmarks/suite.py
+#
+# 読み込み・結合・登録・期間削除をまとめて計測するベンチマークスイートです。
+# 登録と削除は偽のCalendarバックエンド（benchmarks/fake_calendar.py）に対して実行するため、
+# ネットワークや認証なしで、応答時間やエラー率を変えながら繰り返し計測できます。
+#
+#   python -m benchmarks.suite --sizes 1000 10000 100000
+#   python -m benchmarks.suite --scenarios register delete --latency 0.2 --error-rate 0.02
+#   python -m benchmarks.suite --sizes 10000 --compare benchmarks/results/20250401-120000.json
+#
+# 結果は benchmarks/results/ にJSONで保存され、--compare で以前の結果と比較できます。
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+SCENARIOS = ["parse", "merge", "register", "delete"]
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+CALENDAR_ID = "bench@group.calendar.google.com"
+DESCRIPTION_COLUMNS = ["戸数", "面積", "担当"]
+
+def _executor(args):
+    from api_executor import ApiExecutor
+
+    # 流量制限は偽バックエンドでは不要なため実質無制限にし、同時実行数とバックオフだけを本番と同じ仕組みで動かします
+    return ApiExecutor(rate_per_second=1e9, burst=1e9, max_concurrency=args.concurrency,
+                       base_delay=args.backoff_base, max_delay=args.backoff_base * 32)
+
+def _backend(args):
+    from benchmarks.fake_calendar import FakeCalendarBackend
+    return FakeCalendarBackend(
+        latency=args.latency, jitter=args.jitter, item_latency=args.item_latency,
+        error_rate=args.error_rate, error_status=args.error_status, seed=args.seed
+    )
+
+def _events(size, seed):
+    # 読み込み済みのイベント本体（Excelの読み込みを含めない）
+    from benchmarks.workbooks import make_frame
+    from excel_parser import build_typed_event_frame, clean_mng_series
+    from payloads import build_event_payloads
+
+    df = make_frame(size, seed, messy=False)
+    df["管理番号"] = clean_mng_series(df["管理番号"])
+    typed = build_typed_event_frame([df], DESCRIPTION_COLUMNS)
+    return [event_data for _, event_data in build_event_payloads(typed, False, True)]
+
+def bench_parse(size, args):
+    from benchmarks.workbooks import make_workbooks
+    from excel_parser import clear_parse_cache, process_excel_files
+
+    workbooks = make_workbooks(args.files, size // args.files, overlap=args.overlap,
+                               column_overlap=args.column_overlap, seed=args.seed)
+    clear_parse_cache()
+    started = time.perf_counter()
+    df = process_excel_files(workbooks, DESCRIPTION_COLUMNS, False, True)
+    return {"seconds": time.perf_counter() - started, "events": len(df)}
+
+def bench_merge(size, args):
+    from benchmarks.workbooks import make_file_set
+    from excel_parser import merge_dataframes
+
+    frames = make_file_set(args.files, size // args.files, overlap=args.overlap,
+                           column_overlap=args.column_overlap, duplicate_rate=0.02, seed=args.seed)
+    started = time.perf_counter()
+    merged = merge_dataframes(frames)
+    return {"seconds": time.perf_counter() - started, "events": len(merged)}
+
+def bench_register(size, args):
+    from benchmarks.fake_calendar import build_fake_service
+    from calendar_utils import add_events_to_calendar_batch
+    from instrumentation import RunMetrics
+
+    events = _events(size, args.seed)
+    backend = _backend(args)
+    service = build_fake_service(backend)
+    metrics = RunMetrics("register")
+    started = time.perf_counter()
+    with metrics.activate():
+        results = add_events_to_calendar_batch(service, CALENDAR_ID, events, executor=_executor(args))
+    seconds = time.perf_counter() - started
+    failed = sum(1 for result in results if not result["success"])
+    return {"seconds": seconds, "events": len(events), "failed": failed,
+            "stored": backend.count(CALENDAR_ID), **_api_summary(metrics, backend)}
+
+def bench_delete(size, args):
+    from benchmarks.fake_calendar import build_fake_service
+    from calendar_utils import delete_events_in_range
+    from instrumentation import RunMetrics
+
+    backend = _backend(args)
+    backend.seed_events(CALENDAR_ID, _events(size, args.seed))
+    service = build_fake_service(backend)
+    metrics = RunMetrics("delete")
+    started = time.perf_counter()
+    with metrics.activate():
+        result = delete_events_in_range(service, CALENDAR_ID, datetime(2025, 1, 1), datetime(2026, 12, 31),
+                                        executor=_executor(args))
+    seconds = time.perf_counter() - started
+    return {"seconds": seconds, "events": size, "failed": len(result["failures"]),
+            "remaining": backend.count(CALENDAR_ID), **_api_summary(metrics, backend)}
+
+def _api_summary(metrics, backend):
+    report = metrics.finish().to_dict()
+    return {
+        "http_calls": sum(report["api_calls"].values()),
+        "api_calls": report["api_calls"],
+        "latency_seconds": report["latency_seconds"],
+        "retries": report["counters"]["retries"],
+        "throttled": report["counters"]["throttled"],
+        "injected_errors": dict(backend.errors),
+    }
+
+def _environment():
+    import pandas as pd
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(__file__)).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"python": platform.python_version(), "pandas": pd.__version__, "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "commit": commit}
+
+def _compare(results, path):
+    with open(path, encoding="utf-8") as f:
+        previous = {(r["scenario"], r["size"]): r for r in json.load(f)["results"]}
+    print(f"\n{path} との比較")
+    print(f"{'シナリオ':10s} {'件数':>8s} {'前回(秒)':>10s} {'今回(秒)':>10s} {'比':>7s}")
+    for result in results:
+        before = previous.get((result["scenario"], result["size"]))
+        if before is None:
+            continue
+        ratio = result["seconds"] / before["seconds"] if before["seconds"] else float("inf")
+        print(f"{result['scenario']:10s} {result['size']:8d} {before['seconds']:10.3f} {result['seconds']:10.3f} {ratio:6.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="読み込み・結合・登録・期間削除のベンチマークスイート")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="イベント件数")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--files", type=int, default=3, help="読み込み・結合で件数を分割するファイル数")
+    parser.add_argument("--overlap", type=float, default=0.5, help="ファイル間で重なる管理番号の割合")
+    parser.add_argument("--column-overlap", type=float, default=1.0, help="ファイル間で共通の追加列の割合")
+    parser.add_argument("--latency", type=float, default=0.05, help="偽バックエンドのHTTP呼び出し1回の応答時間（秒）")
+    parser.add_argument("--jitter", type=float, default=0.02, help="応答時間に加える揺らぎの最大値（秒）")
+    parser.add_argument("--item-latency", type=float, default=0.0, help="バッチ内のサブリクエスト1件あたりの追加時間（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="(サブ)リクエストごとにエラーを返す確率")
+    parser.add_argument("--error-status", type=int, default=429, choices=[403, 429, 500, 503])
+    parser.add_argument("--concurrency", type=int, default=8, help="APIの同時実行数の上限")
+    parser.add_argument("--backoff-base", type=float, default=0.05, help="再試行のバックオフの初期待機秒数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="結果の保存先（既定: benchmarks/results/日時.json）")
+    parser.add_argument("--compare", help="比較する以前の結果ファイル")
+    args = parser.parse_args()
+
+    benches = {"parse": bench_parse, "merge": bench_merge, "register": bench_register, "delete": bench_delete}
+    results = []
+    print(f"{'シナリオ':10s} {'件数':>8s} {'秒':>10s} {'件/秒':>12s}  備考")
+    for scenario in args.scenarios:
+        for size in args.sizes:
+            result = {"scenario": scenario, "size": size, **benches[scenario](size, args)}
+            results.append(result)
+            notes = ", ".join(
+                f"{key}={result[key]}" for key in ("events", "failed", "http_calls", "retries", "remaining") if key in result
+            )
+            rate = result["events"] / result["seconds"] if result["seconds"] else float("inf")
+            print(f"{scenario:10s} {size:8d} {result['seconds']:10.3f} {rate:12.0f}  {notes}")
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    params = {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"created_at": datetime.now().isoformat(timespec="seconds"), "environment": _environment(),
+                   "params": params, "results": results}, f, ensure_ascii=False, indent=2)
+    print(f"\n結果を {output} に保存しました。")
+    if args.compare:
+        _compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
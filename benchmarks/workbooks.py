@@ -0,0 +1,105 @@
+# benchmarks/workbooks.py
+#
+# ベンチマーク共通の合成データ生成です。
+# 管理番号・物件名・予定開始・予定終了・住所と追加の列を持つDataFrame／ワークブックを、
+# 行数・ファイル数・ファイル間で重なる管理番号と列の割合を指定して作成します。
+
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+WARDS = ["中央区", "北区", "東区", "白石区", "豊平区", "南区", "西区", "厚別区", "手稲区", "清田区"]
+EXTRA_COLUMNS = ["戸数", "面積", "担当"] # 説明欄に使う追加の列
+
+def make_frame(rows=None, seed=0, keys=None, extra_columns=EXTRA_COLUMNS, messy=True):
+    """
+    管理番号・物件名・予定開始・予定終了・住所と extra_columns の列を持つDataFrameを作成します。
+    keys（整数の配列）を指定した場合はその管理番号で行を作成します。
+    messy が True の場合は、空欄や変換できない日時など実データに含まれる崩れた値も混ぜます。
+    """
+    rng = np.random.default_rng(seed)
+    keys = np.arange(rows) if keys is None else np.asarray(keys)
+    rows = len(keys)
+    start = pd.Timestamp("2025-04-01 09:00") + pd.to_timedelta(rng.integers(0, 365 * 24, rows), unit="h")
+    end = start + pd.to_timedelta(rng.integers(1, 4, rows), unit="h")
+    df = pd.DataFrame({
+        "管理番号": [f"HK-{k:06d}" for k in keys],
+        "物件名": [f"物件{k}" for k in keys],
+        "予定開始": start.astype(object) if messy else start,
+        "予定終了": end,
+        "住所": [f"北海道札幌市{WARDS[k % len(WARDS)]}{k % 30 + 1}条" for k in keys],
+    })
+    for col in extra_columns:
+        if col == "戸数":
+            df[col] = rng.integers(1, 200, rows).astype(float)
+        elif col == "担当":
+            df[col] = [f"担当{k % 7}" for k in keys]
+        else:
+            df[col] = rng.random(rows) * 100
+
+    if messy:
+        df.loc[df.index % 97 == 0, "住所"] = np.nan
+        if "面積" in df.columns:
+            df.loc[df.index % 89 == 0, "面積"] = np.nan
+        df.loc[df.index % 113 == 0, "予定開始"] = "未定"
+        df.loc[df.index % 127 == 0, "予定終了"] = pd.NaT
+    return df
+
+def to_workbook(df, name="synthetic.xlsx"):
+    """
+    DataFrameをアップロードファイル相当のBytesIO（name 属性付き）に書き出します。
+    """
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False, engine="openpyxl")
+    buffer.seek(0)
+    buffer.name = name
+    return buffer
+
+def make_workbook(rows, seed=0, name="synthetic.xlsx"):
+    """
+    1ファイル分の合成ワークブックを作成します。
+    """
+    return to_workbook(make_frame(rows, seed), name)
+
+def make_file_set(files, rows, overlap=0.5, column_overlap=1.0, duplicate_rate=0.0, seed=0, messy=False):
+    """
+    月次ファイル相当の複数のDataFrameを作成します。
+
+    各ファイルの管理番号のうち overlap の割合は共通の範囲から選び、残りはファイル固有にします。
+    追加の列は EXTRA_COLUMNS のうち column_overlap の割合を全ファイル共通にし、
+    それ以外にファイル固有の列（月次項目n）を1列持たせます。
+    duplicate_rate の割合でファイル内の重複行も混ぜます。
+    """
+    rng = np.random.default_rng(seed)
+    shared_columns = EXTRA_COLUMNS[:round(len(EXTRA_COLUMNS) * column_overlap)]
+    frames = []
+    for n in range(files):
+        shared = rng.choice(rows, int(rows * overlap), replace=False)
+        own = np.arange(rows * (n + 1), rows * (n + 1) + rows - len(shared))
+        keys = np.concatenate([shared, own])
+        keys = np.concatenate([keys, rng.choice(keys, int(rows * duplicate_rate))])
+        frames.append(make_frame(
+            keys=keys, seed=seed + n, extra_columns=shared_columns + [f"月次項目{n}"], messy=messy
+        ))
+    return frames
+
+def make_workbooks(files, rows, overlap=0.5, column_overlap=1.0, duplicate_rate=0.0, seed=0, messy=True):
+    """
+    make_file_set の各DataFrameをワークブック（BytesIO）にしたリストを返します。
+    """
+    frames = make_file_set(files, rows, overlap, column_overlap, duplicate_rate, seed, messy)
+    return [to_workbook(df, f"synthetic_{n}.xlsx") for n, df in enumerate(frames)]
+
+def write_workbooks(directory, files, rows, **kwargs):
+    """
+    make_workbooks のワークブックを directory に書き出し、パスのリストを返します（cli.py の計測用）。
+    """
+    paths = []
+    for workbook in make_workbooks(files, rows, **kwargs):
+        path = os.path.join(directory, workbook.name)
+        with open(path, "wb") as f:
+            f.write(workbook.getvalue())
+        paths.append(path)
+    return paths
@@ -0,0 +1,263 @@
+# calendar_mirror.py
+#
+# 登録先カレンダーのイベントを SQLite に複製したローカルの索引です。
+# 初回はカレンダー全体を取得し、以降は Calendar API の syncToken で前回からの変更分だけを取得します
+# （syncToken が失効して 410 が返った場合は全体を取得し直します）。
+# 期間による検索・管理番号の重複検出・削除対象の事前確認・差分同期の照合を、一覧取得なしで行えます。
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from googleapiclient.errors import HttpError
+
+from api_executor import get_default_executor
+from calendar_utils import JST, SYNC_HASH_PROPERTY, SYNC_KEY_PROPERTY, _event_time_bounds
+
+MIRROR_DB_PATH = "calendar_mirror.sqlite3" # ローカルの索引を保存するファイル名
+MIRROR_LIST_PAGE_SIZE = 2500 # 取得1ページあたりの件数（APIの上限）
+MIRROR_LOOKUP_CHUNK = 500 # 管理番号で検索するときに1回の IN に含める件数
+MIRROR_LIST_FIELDS = "items(id,status,summary,start,end,extendedProperties),nextPageToken,nextSyncToken"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    calendar_id TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    summary TEXT,
+    start_ts REAL NOT NULL,
+    end_ts REAL NOT NULL,
+    mng_num TEXT,
+    content_hash TEXT,
+    PRIMARY KEY (calendar_id, event_id)
+);
+CREATE INDEX IF NOT EXISTS events_start ON events (calendar_id, start_ts);
+CREATE INDEX IF NOT EXISTS events_mng_num ON events (calendar_id, mng_num);
+CREATE TABLE IF NOT EXISTS events_staging (
+    calendar_id TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    summary TEXT,
+    start_ts REAL NOT NULL,
+    end_ts REAL NOT NULL,
+    mng_num TEXT,
+    content_hash TEXT,
+    PRIMARY KEY (calendar_id, event_id)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    calendar_id TEXT PRIMARY KEY,
+    sync_token TEXT,
+    synced_at TEXT NOT NULL
+);
+"""
+
+def _timestamp(value):
+    # datetime（タイムゾーンなしは日本時間）をエポック秒に変換します
+    return (value if value.tzinfo else value.replace(tzinfo=JST)).timestamp()
+
+def _to_row(calendar_id, event):
+    start, end = _event_time_bounds(event)
+    private = event.get("extendedProperties", {}).get("private", {})
+    return (calendar_id, event["id"], event.get("summary", ""), start.timestamp(), end.timestamp(),
+            private.get(SYNC_KEY_PROPERTY), private.get(SYNC_HASH_PROPERTY))
+
+class CalendarMirror:
+    """
+    カレンダーごとのイベントの複製と syncToken を保存する SQLite ストアです。
+    """
+
+    def __init__(self, path=MIRROR_DB_PATH):
+        self.path = path
+        self._refresh_locks = {}
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # ブロックを抜けるときにコミットして接続を閉じる
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _refresh_lock(self, calendar_id):
+        with self._lock:
+            return self._refresh_locks.setdefault(calendar_id, threading.Lock())
+
+    def refresh(self, service, calendar_id, executor=None):
+        """
+        索引を最新にします。保存済みの syncToken があれば変更分だけを取得し、
+        なければ（または失効していれば）カレンダー全体を取得し直します。
+        {"full": 全体を取得したか, "changed": 追加・更新件数, "removed": 削除件数} を返します。
+        """
+        executor = executor or get_default_executor()
+        # 同じカレンダーの更新が同時に走らないようにします
+        with self._refresh_lock(calendar_id):
+            sync_token = self.sync_state(calendar_id)["sync_token"]
+            if sync_token:
+                try:
+                    return self._fetch(service, calendar_id, executor, sync_token)
+                except HttpError as e:
+                    if e.resp.status != 410:
+                        raise
+                    # syncToken の失効（410 Gone）は全体の取得し直しで回復します
+            return self._fetch(service, calendar_id, executor, None)
+
+    def _fetch(self, service, calendar_id, executor, sync_token):
+        # 取得中に書き込みのトランザクションを開いたままにすると、他のカレンダーの更新が SQLite のロックで待たされるため、
+        # 各ページは受信してから短いトランザクションで反映し、syncToken は最後に保存します。
+        # 差分は events に直接反映します。途中で失敗しても syncToken は前回のままのため、次回は同じ変更から取得し直します。
+        # 全体の取得は events_staging に貯め、最後のページの後に入れ替えるため、途中で失敗しても前回の状態のまま残ります。
+        full = sync_token is None
+        table = "events_staging" if full else "events"
+        summary = {"full": full, "changed": 0, "removed": 0}
+        events_resource = service.events()
+        page_token = None
+        if full:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM events_staging WHERE calendar_id = ?", (calendar_id,))
+        while True:
+            params = {"calendarId": calendar_id, "singleEvents": True, "maxResults": MIRROR_LIST_PAGE_SIZE,
+                      "fields": MIRROR_LIST_FIELDS, "pageToken": page_token}
+            if sync_token is not None:
+                params["syncToken"] = sync_token
+            events_result = executor.execute(events_resource.list(**params))
+
+            items = events_result.get("items", [])
+            removed = [(calendar_id, event["id"]) for event in items if event.get("status") == "cancelled"]
+            rows = [_to_row(calendar_id, event) for event in items
+                    if event.get("status") != "cancelled" and "start" in event]
+            with self._connect() as conn:
+                conn.executemany(f"DELETE FROM {table} WHERE calendar_id = ? AND event_id = ?", removed)
+                conn.executemany(f"INSERT OR REPLACE INTO {table} VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            summary["changed"] += len(rows)
+            summary["removed"] += len(removed)
+
+            page_token = events_result.get("nextPageToken")
+            if not page_token:
+                break
+        with self._connect() as conn:
+            if full:
+                conn.execute("DELETE FROM events WHERE calendar_id = ?", (calendar_id,))
+                conn.execute("INSERT INTO events SELECT * FROM events_staging WHERE calendar_id = ?", (calendar_id,))
+                conn.execute("DELETE FROM events_staging WHERE calendar_id = ?", (calendar_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state (calendar_id, sync_token, synced_at) VALUES (?, ?, ?)",
+                (calendar_id, events_result.get("nextSyncToken"), datetime.now().isoformat(timespec="seconds"))
+            )
+        return summary
+
+    def sync_state(self, calendar_id):
+        """
+        {"sync_token", "synced_at", "count"} を返します。一度も取得していなければ sync_token は None です。
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT sync_token, synced_at FROM sync_state WHERE calendar_id = ?", (calendar_id,)).fetchone()
+            count = conn.execute("SELECT COUNT(*) FROM events WHERE calendar_id = ?", (calendar_id,)).fetchone()[0]
+        return {"sync_token": row["sync_token"] if row else None, "synced_at": row["synced_at"] if row else None,
+                "count": count}
+
+    def events_in_range(self, calendar_id, start, end, summary_prefix=None, mng_num_pattern=None, limit=None):
+        """
+        start〜end と重なるイベントを開始時刻順に返します。
+        summary_prefix で件名の前方一致、mng_num_pattern（SQLite の GLOB 形式）で管理番号を絞り込めます。
+        """
+        query = "SELECT event_id, summary, start_ts, end_ts, mng_num FROM events WHERE calendar_id = ? AND start_ts < ? AND end_ts > ?"
+        params = [calendar_id, _timestamp(end), _timestamp(start)]
+        if summary_prefix:
+            query += " AND substr(summary, 1, ?) = ?"
+            params += [len(summary_prefix), summary_prefix]
+        if mng_num_pattern:
+            query += " AND mng_num GLOB ?"
+            params.append(mng_num_pattern)
+        query += " ORDER BY start_ts"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [
+            {"id": row["event_id"], "summary": row["summary"], "mng_num": row["mng_num"],
+             "start": datetime.fromtimestamp(row["start_ts"], JST), "end": datetime.fromtimestamp(row["end_ts"], JST)}
+            for row in rows
+        ]
+
+    def count_in_range(self, calendar_id, start, end):
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM events WHERE calendar_id = ? AND start_ts < ? AND end_ts > ?",
+                (calendar_id, _timestamp(end), _timestamp(start))
+            ).fetchone()[0]
+
+    def duplicate_keys(self, calendar_id):
+        """
+        同じ管理番号で複数登録されているイベントを {管理番号: [イベントID, ...]} で返します。
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT mng_num, event_id FROM events WHERE calendar_id = ? AND mng_num IN ("
+                " SELECT mng_num FROM events WHERE calendar_id = ? AND mng_num IS NOT NULL"
+                " GROUP BY mng_num HAVING COUNT(*) > 1) ORDER BY mng_num, start_ts",
+                (calendar_id, calendar_id)
+            ).fetchall()
+        duplicates = {}
+        for row in rows:
+            duplicates.setdefault(row["mng_num"], []).append(row["event_id"])
+        return duplicates
+
+    def synced_events_index(self, calendar_id, time_min, time_max, keys=()):
+        """
+        calendar_utils.fetch_synced_events_index と同じ形式の (索引, 重複イベントのリスト) を、
+        一覧取得なしで返します。time_min / time_max はタイムゾーン付きの ISO 8601 文字列です。
+        keys の管理番号のうち期間内にないものは、期間を限らずに管理番号の索引から探して加えます。
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT event_id, summary, mng_num, content_hash FROM events"
+                " WHERE calendar_id = ? AND mng_num IS NOT NULL AND start_ts < ? AND end_ts > ? ORDER BY start_ts",
+                (calendar_id, datetime.fromisoformat(time_max).timestamp(), datetime.fromisoformat(time_min).timestamp())
+            ).fetchall()
+            found = {row["mng_num"] for row in rows}
+            missing = [key for key in dict.fromkeys(keys) if key not in found]
+            for offset in range(0, len(missing), MIRROR_LOOKUP_CHUNK):
+                chunk = missing[offset:offset + MIRROR_LOOKUP_CHUNK]
+                rows += conn.execute(
+                    "SELECT event_id, summary, mng_num, content_hash FROM events"
+                    " WHERE calendar_id = ? AND mng_num IN (%s) ORDER BY start_ts" % ",".join("?" * len(chunk)),
+                    (calendar_id, *chunk)
+                ).fetchall()
+        index = {}
+        duplicates = []
+        for row in rows:
+            event = {
+                "id": row["event_id"], "summary": row["summary"],
+                "extendedProperties": {"private": {SYNC_KEY_PROPERTY: row["mng_num"], SYNC_HASH_PROPERTY: row["content_hash"]}},
+            }
+            if row["mng_num"] in index:
+                duplicates.append(event)
+            else:
+                index[row["mng_num"]] = event
+        return index, duplicates
+
+    def clear(self, calendar_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM events WHERE calendar_id = ?", (calendar_id,))
+            conn.execute("DELETE FROM events_staging WHERE calendar_id = ?", (calendar_id,))
+            conn.execute("DELETE FROM sync_state WHERE calendar_id = ?", (calendar_id,))
+
+_mirror = None
+_mirror_lock = threading.Lock()
+
+def get_calendar_mirror():
+    """
+    プロセス内で共有する CalendarMirror を返します。
+    """
+    global _mirror
+    with _mirror_lock:
+        if _mirror is None:
+            _mirror = CalendarMirror()
+        return _mirror
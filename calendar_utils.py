@@ -1,94 +1,545 @@
-import pickle
 import os
-import streamlit as st
-from google_auth_oauthlib.flow import Flow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+import time
+import itertools
+import json
+import re
+import hashlib
+import threading
+from googleapiclient.errors import HttpError
+from concurrent.futures import FIRST_COMPLETED, wait
 from datetime import datetime, timedelta, timezone 
+from api_executor import get_default_executor, is_rate_limit_error, is_retryable_error, thread_http
+from reporting import StreamlitReporter
+
+# pandas・streamlit・認証ライブラリ・ディスカバリーは読み込みに時間がかかるため、
+# CLI の起動を速くする目的で使用する関数の中で読み込みます。
 
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
-TOKEN_FILE = "token.pickle" # 認証トークンを保存するファイル名
+
+BATCH_CHUNK_SIZE = 50 # Calendar APIのバッチ1回あたりの上限件数
+BATCH_MAX_RETRIES = 3 # 失敗したサブリクエストの再試行回数
+
+DELETE_LIST_PAGE_SIZE = 250 # 削除時の一覧取得1ページあたりの件数
+DELETE_MAX_CONCURRENT_BATCHES = 4 # 同時に実行する削除バッチ数の上限
+DELETE_MAX_PASSES = 3 # 取りこぼし確認のための最大走査回数
+DELETE_PREVIEW_PAGE_SIZE = 2500 # 削除前の確認で一覧取得する1ページあたりの件数（APIの上限）
+DELETE_PREVIEW_FIELDS = "items(id,summary,start),nextPageToken" # 削除前の確認で取得する項目
+PROGRESS_UPDATE_INTERVAL = 0.5 # プログレスバーの最小更新間隔（秒）
+
+SYNC_KEY_PROPERTY = "mngNum" # extendedProperties.private に保存する管理番号のキー
+SYNC_HASH_PROPERTY = "contentHash" # extendedProperties.private に保存する内容ハッシュのキー
+SYNC_LIST_PAGE_SIZE = 2500 # 差分同期時の一覧取得1ページあたりの件数
+SYNC_LIST_FIELDS = "items(id,summary,extendedProperties),nextPageToken" # 差分同期時の一覧取得で取得する項目
+SYNC_KEY_LOOKUP_LIMIT = 100 # 期間外の管理番号をこの件数までは1件ずつ検索し、超える場合はカレンダー全体を一覧します
+
+CALENDAR_LIST_CACHE_TTL = 300 # カレンダー一覧キャッシュの有効期間（秒）
+CALENDAR_LIST_PAGE_SIZE = 250 # カレンダー一覧取得1ページあたりの件数
+
+JST = timezone(timedelta(hours=9))
+
+_service_cache = {} # id(認証情報) -> (認証情報, サービス)
+_calendar_list_cache = {} # id(サービス) -> (取得時刻, {カレンダー名: カレンダーID})
+_cache_lock = threading.Lock()
 
 def authenticate_google():
-    creds = None
-    
-    # 1. まず現在のセッションの認証情報がst.session_stateにあるか確認します
-    if 'credentials' in st.session_state and st.session_state['credentials'] and st.session_state['credentials'].valid:
-        creds = st.session_state['credentials']
+    import streamlit as st
+    from google_auth_oauthlib.flow import Flow
+    from credential_store import get_credential_manager
+
+    # 認証情報はプロセス内で共有し、有効期限の前にバックグラウンドで更新されるため、
+    # 再実行のたびにファイルを読んだり、更新を待ったりすることはありません
+    try:
+        token_key = st.secrets["google"].get("token_key") # 保存ファイルを暗号化する Fernet 鍵（任意）
+    except Exception:
+        token_key = None
+    manager = get_credential_manager(token_key)
+
+    # 1. 共有の認証情報（初回のみ保存ファイル、または従来の token.pickle から読み込みます）
+    try:
+        creds = manager.get()
+    except Exception as e:
+        st.warning(f"保存済みの認証情報を使用できませんでした: {e}。再認証してください。")
+        creds = None
+    if creds:
+        st.session_state['credentials'] = creds
         return creds
 
-    # 2. session_stateにない場合、token.pickleから永続化された認証情報を読み込もうとします
-    if os.path.exists(TOKEN_FILE):
-        try:
-            with open(TOKEN_FILE, "rb") as token:
-                creds = pickle.load(token)
-            # 読み込んだ認証情報をsession_stateに保存し、このセッションで再利用できるようにします
-            st.session_state['credentials'] = creds 
-        except Exception as e:
-            st.warning(f"既存のトークンファイルの読み込みに失敗しました: {e}。再認証してください。")
-            creds = None
+    # 2. 有効な認証情報がない場合、新しい認証フローを開始します
+    try:
+        client_config = {
+            "installed": {
+                "client_id": st.secrets["google"]["client_id"],
+                "client_secret": st.secrets["google"]["client_secret"],
+                "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+                "token_uri": "https://oauth2.googleapis.com/token",
+                "redirect_uris": ["urn:ietf:wg:oauth:2.0:oob"] # コンソール認証用
+            }
+        }
+        flow = Flow.from_client_config(client_config, SCOPES)
+        flow.redirect_uri = "urn:ietf:wg:oauth:2.0:oob"
+        auth_url, _ = flow.authorization_url(prompt='consent')
 
-    # 3. 認証情報が有効でない、または期限切れの場合、更新または再認証を行います
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            # トークンが期限切れでリフレッシュトークンがある場合、トークンをリフレッシュします
-            try:
-                creds.refresh(Request())
-                # リフレッシュされた認証情報をファイルとsession_stateに保存します
-                with open(TOKEN_FILE, "wb") as token:
-                    pickle.dump(creds, token)
-                st.session_state['credentials'] = creds
-                st.info("認証トークンを更新しました。")
-                st.rerun() # トークン更新後、アプリを再実行して変更を反映
-            except Exception as e:
-                st.error(f"トークンのリフレッシュに失敗しました。再認証してください: {e}")
-                st.session_state['credentials'] = None
-                creds = None
-        else: # 有効な認証情報がない場合、新しい認証フローを開始します
-            try:
-                client_config = {
-                    "installed": {
-                        "client_id": st.secrets["google"]["client_id"],
-                        "client_secret": st.secrets["google"]["client_secret"],
-                        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                        "token_uri": "https://oauth2.googleapis.com/token",
-                        "redirect_uris": ["urn:ietf:wg:oauth:2.0:oob"] # コンソール認証用
-                    }
-                }
-                flow = Flow.from_client_config(client_config, SCOPES)
-                flow.redirect_uri = "urn:ietf:wg:oauth:2.0:oob"
-                auth_url, _ = flow.authorization_url(prompt='consent')
-
-                st.info("以下のURLをブラウザで開いて、表示されたコードをここに貼り付けてください：")
-                st.write(auth_url)
-                code = st.text_input("認証コードを貼り付けてください:")
-
-                if code:
-                    flow.fetch_token(code=code)
-                    creds = flow.credentials
-                    # 新しい認証情報をファイルとsession_stateに保存します
-                    with open(TOKEN_FILE, "wb") as token:
-                        pickle.dump(creds, token)
-                    st.session_state['credentials'] = creds
-                    st.success("Google認証が完了しました！")
-                    st.rerun() # 認証成功後、アプリを再読み込み
-            except Exception as e:
-                st.error(f"Google認証に失敗しました: {e}")
-                st.session_state['credentials'] = None
-                return None
-    
-    return creds
+        st.info("以下のURLをブラウザで開いて、表示されたコードをここに貼り付けてください：")
+        st.write(auth_url)
+        code = st.text_input("認証コードを貼り付けてください:")
+
+        if code:
+            flow.fetch_token(code=code)
+            # 新しい認証情報を共有・保存し、他のセッションでもそのまま使えるようにします
+            manager.set(flow.credentials)
+            st.session_state['credentials'] = flow.credentials
+            st.success("Google認証が完了しました！")
+            st.rerun() # 認証成功後、アプリを再読み込み
+    except Exception as e:
+        st.error(f"Google認証に失敗しました: {e}")
+        st.session_state['credentials'] = None
+    return None
+
+def load_saved_credentials(token_file=None, key=None):
+    """
+    画面を使わずに、保存済みの認証情報を読み込みます（CLI用）。
+    期限切れの場合は更新して保存します。有効な認証情報がなければ None を返します。
+    token_file を省略した場合は画面と同じ保存ファイル（token.json）を使い、
+    .pickle のファイルを指定した場合は同じ名前の .json に移行して使います。
+    """
+    from credential_store import CredentialManager, get_credential_manager
+
+    if token_file is None:
+        manager = get_credential_manager(key)
+    elif token_file.endswith(".pickle"):
+        manager = CredentialManager(os.path.splitext(token_file)[0] + ".json", key=key, legacy_path=token_file)
+    else:
+        manager = CredentialManager(token_file, key=key, legacy_path=None)
+    return manager.get()
+
+def get_calendar_service(creds):
+    """
+    認証情報ごとにCalendar APIのサービスを一度だけ構築して再利用します。
+    ライブラリ同梱のディスカバリー文書を使うため、構築時に通信は発生しません。
+    """
+    with _cache_lock:
+        cached = _service_cache.get(id(creds))
+        if cached and cached[0] is creds:
+            return cached[1]
+
+    from googleapiclient.discovery import build
+    service = build("calendar", "v3", credentials=creds, static_discovery=True, cache_discovery=False)
+    with _cache_lock:
+        _service_cache[id(creds)] = (creds, service)
+    return service
+
+def get_editable_calendars(service, ttl=CALENDAR_LIST_CACHE_TTL, force_refresh=False, executor=None):
+    """
+    書き込み可能なカレンダーの {カレンダー名: カレンダーID} を返します。
+    結果は ttl 秒間キャッシュし、nextPageToken をたどってすべてのページを取得します。
+    """
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _calendar_list_cache.get(id(service))
+        if cached and not force_refresh and now - cached[0] < ttl:
+            return dict(cached[1])
+
+    executor = executor or get_default_executor()
+    calendars = {}
+    page_token = None
+    while True:
+        calendar_list = executor.execute(service.calendarList().list(
+            minAccessRole="writer", # 読み取り専用カレンダーを除外
+            maxResults=CALENDAR_LIST_PAGE_SIZE,
+            fields="items(id,summary),nextPageToken",
+            pageToken=page_token
+        ))
+        for cal in calendar_list.get('items', []):
+            calendars[cal['summary']] = cal['id']
+        page_token = calendar_list.get('nextPageToken')
+        if not page_token:
+            break
+
+    with _cache_lock:
+        _calendar_list_cache[id(service)] = (now, calendars)
+    return dict(calendars)
+
+def invalidate_calendar_list_cache(service=None):
+    """
+    カレンダー一覧のキャッシュを破棄します。service を省略するとすべて破棄します。
+    """
+    with _cache_lock:
+        if service is None:
+            _calendar_list_cache.clear()
+        else:
+            _calendar_list_cache.pop(id(service), None)
 
 def add_event_to_calendar(service, calendar_id, event_data):
     """
     Googleカレンダーにイベントを追加します。
     """
-    event = service.events().insert(calendarId=calendar_id, body=event_data).execute()
+    event = get_default_executor().execute(service.events().insert(calendarId=calendar_id, body=event_data))
     return event.get("htmlLink")
 
-def delete_events_from_calendar(service, calendar_id, start_date: datetime, end_date: datetime):
+def build_event_data(row):
+    """
+    process_excel_files の1行（Seriesまたはdict）からイベント本体を組み立てます。
+    """
+    import pandas as pd
+
+    location = row['Location'] if pd.notna(row['Location']) else ''
+    description = row['Description'] if pd.notna(row['Description']) else ''
+    transparency = 'transparent' if row['Private'] == "True" else 'opaque'
+
+    if row['All Day Event'] == "True":
+        # 終日イベントの場合、日付のみを使用
+        start_date_str = datetime.strptime(row['Start Date'], "%Y/%m/%d").strftime("%Y-%m-%d")
+        end_date_str = datetime.strptime(row['End Date'], "%Y/%m/%d").strftime("%Y-%m-%d")
+        return {
+            'summary': row['Subject'],
+            'location': location,
+            'description': description,
+            'start': {'date': start_date_str},
+            'end': {'date': end_date_str},
+            'transparency': transparency
+        }
+
+    # 時間指定イベントの場合、日付と時間を使用
+    start = datetime.strptime(f"{row['Start Date']} {row['Start Time']}", "%Y/%m/%d %H:%M").isoformat()
+    end = datetime.strptime(f"{row['End Date']} {row['End Time']}", "%Y/%m/%d %H:%M").isoformat()
+    return {
+        'summary': row['Subject'],
+        'location': location,
+        'description': description,
+        'start': {'dateTime': start, 'timeZone': 'Asia/Tokyo'},
+        'end': {'dateTime': end, 'timeZone': 'Asia/Tokyo'},
+        'transparency': transparency
+    }
+
+def _execute_batch(service, indexed_requests, results, executor):
+    """
+    (index, リクエスト生成関数) の組をひとつのBatchHttpRequestで送信し、結果を results に書き込みます。
+    失敗したサブリクエストの (index, リクエスト生成関数) を返します。
+    """
+    failed = []
+    requests_by_id = {str(index): (index, make_request) for index, make_request in indexed_requests}
+
+    def callback(request_id, response, exception):
+        index, make_request = requests_by_id[request_id]
+        if exception is None:
+            results[index] = {"index": index, "success": True, "response": response, "error": None}
+        else:
+            results[index] = {"index": index, "success": False, "response": None, "error": exception}
+            failed.append((index, make_request))
+
+    batch = service.new_batch_http_request(callback=callback)
+    for request_id, (_, make_request) in requests_by_id.items():
+        batch.add(make_request(), request_id=request_id)
+
+    try:
+        executor.execute(batch, http=thread_http(service._http), cost=len(requests_by_id))
+    except Exception as e:
+        # バッチ全体が失敗した場合は、コールバック未到達のサブリクエストをすべて失敗扱いにします
+        for index, make_request in requests_by_id.values():
+            if index not in results:
+                results[index] = {"index": index, "success": False, "response": None, "error": e}
+                failed.append((index, make_request))
+    return failed
+
+def _run_batch_with_retries(service, chunk, max_retries, executor):
+    """
+    ひとつのチャンクをバッチ送信し、再試行可能な失敗だけをバックオフしながら再送します。
+    {index: 結果} の辞書を返します。
+    """
+    results = {}
+    pending = chunk
+    for attempt in range(max_retries + 1):
+        failed = _execute_batch(service, pending, results, executor)
+        pending = [item for item in failed if is_retryable_error(results[item[0]]["error"])]
+        if not pending or attempt == max_retries:
+            break
+        errors = [results[index]["error"] for index, _ in pending]
+        throttled = sum(1 for error in errors if is_rate_limit_error(error))
+        if throttled:
+            executor.report_throttle(throttled)
+        executor.report_retries(len(pending))
+        for index, _ in pending:
+            del results[index]
+        time.sleep(executor.backoff_delay(attempt, errors[0]))
+    return results
+
+def execute_requests_in_batches(service, request_factories, chunk_size=BATCH_CHUNK_SIZE,
+                                max_retries=BATCH_MAX_RETRIES, progress_callback=None, result_callback=None,
+                                executor=None, max_in_flight=None):
     """
-    指定された期間内のGoogleカレンダーイベントを削除します。
+    リクエスト生成関数のイテラブルを chunk_size 件ずつBatchHttpRequestにまとめて実行します。
+
+    バッチは executor（既定はプロセス共有の ApiExecutor）のもとで流量制限しながら並行して送信し
+    （同時に送信するバッチ数は executor.max_concurrency と max_in_flight の小さいほう）、
+    失敗したサブリクエストのうち再試行可能なものだけを max_retries 回まで再送します。
+    戻り値は入力順に並んだ {"index", "success", "response", "error"} の辞書のリストです。
+    progress_callback(processed) には処理済み件数が渡されます。
+    result_callback を指定した場合は結果をバッチごとに渡して保持せず、空のリストを返します
+    （件数の多いストリーミング登録でメモリ使用量を一定に保つため）。
+    コールバックはいずれも呼び出し元のスレッドで実行されます。
+
+    service は http=HttpMockSequence(...) で構築したものでも動作します。
+    """
+    executor = executor or get_default_executor()
+    chunk_size = max(1, min(chunk_size, BATCH_CHUNK_SIZE))
+    results = {}
+    processed = 0
+    indexed = enumerate(request_factories)
+    in_flight = set()
+    limit = min(executor.max_concurrency, max_in_flight or executor.max_concurrency)
+
+    def collect(done_futures):
+        nonlocal processed
+        for future in done_futures:
+            chunk_results = future.result()
+            processed += len(chunk_results)
+            if result_callback:
+                for index in sorted(chunk_results):
+                    result_callback(chunk_results[index])
+            else:
+                results.update(chunk_results)
+        if done_futures and progress_callback:
+            progress_callback(processed)
+
+    while True:
+        chunk = list(itertools.islice(indexed, chunk_size))
+        if not chunk:
+            break
+        # 同時実行数の上限に達している場合は、いずれかのバッチの完了を待ちます
+        if len(in_flight) >= limit:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            collect(done)
+        in_flight.add(executor.submit(_run_batch_with_retries, service, chunk, max_retries, executor))
+
+    while in_flight:
+        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+        collect(done)
+
+    return [results[index] for index in sorted(results)]
+
+def add_events_to_calendar_batch(service, calendar_id, events, chunk_size=BATCH_CHUNK_SIZE,
+                                 max_retries=BATCH_MAX_RETRIES, progress_callback=None, result_callback=None,
+                                 executor=None):
+    """
+    複数のイベントをBatchHttpRequestにまとめてGoogleカレンダーに追加します。
+    events はイベント本体のイテラブルで、結果の形式は execute_requests_in_batches と同じです。
+    """
+    # service.events() はディスカバリー文書からメソッドを組み立て直すため、1回だけ作成して使い回します
+    events_resource = service.events()
+    request_factories = (
+        lambda event_data=event_data: events_resource.insert(calendarId=calendar_id, body=event_data)
+        for event_data in events
+    )
+    return execute_requests_in_batches(
+        service, request_factories, chunk_size, max_retries, progress_callback, result_callback, executor
+    )
+
+def compute_event_hash(event_data):
+    """
+    イベントの件名・日時・場所・説明からハッシュ値を計算します。
+    """
+    content = {
+        'summary': event_data.get('summary', ''),
+        'start': event_data.get('start', {}),
+        'end': event_data.get('end', {}),
+        'location': event_data.get('location', ''),
+        'description': event_data.get('description', ''),
+    }
+    serialized = json.dumps(content, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+def attach_sync_properties(event_data, key):
+    """
+    差分同期用に、管理番号と内容ハッシュを extendedProperties.private に設定します。
+    """
+    event_data['extendedProperties'] = {
+        'private': {
+            SYNC_KEY_PROPERTY: key,
+            SYNC_HASH_PROPERTY: compute_event_hash(event_data),
+        }
+    }
+    return event_data
+
+def _event_time_bounds(event_data):
+    """
+    イベント本体の開始・終了をタイムゾーン付きのdatetimeで返します。
+    """
+    def parse(value, is_end):
+        if 'dateTime' in value:
+            dt = datetime.fromisoformat(value['dateTime'])
+            return dt if dt.tzinfo else dt.replace(tzinfo=JST)
+        dt = datetime.strptime(value['date'], "%Y-%m-%d").replace(tzinfo=JST)
+        return dt + timedelta(days=1) if is_end else dt
+
+    return parse(event_data['start'], False), parse(event_data['end'], True)
+
+def _sync_key(event):
+    return event.get('extendedProperties', {}).get('private', {}).get(SYNC_KEY_PROPERTY)
+
+def _add_to_sync_index(events, index, duplicates, seen_ids):
+    # 管理番号ごとに最初のイベントを索引に、2件目以降を重複に振り分けます（同じイベントは一度だけ数えます）
+    for event in events:
+        key = _sync_key(event)
+        if not key or event['id'] in seen_ids:
+            continue # このツールで登録していないイベントは対象外
+        seen_ids.add(event['id'])
+        if key in index:
+            duplicates.append(event)
+        else:
+            index[key] = event
+
+def _iter_listed_events(service, calendar_id, executor, **params):
+    # 一覧の全ページのイベントを順に返します
+    events_resource = service.events()
+    page_token = None
+    while True:
+        events_result = executor.execute(events_resource.list(
+            calendarId=calendar_id, maxResults=SYNC_LIST_PAGE_SIZE, fields=SYNC_LIST_FIELDS, pageToken=page_token,
+            **params
+        ))
+        yield from events_result.get('items', [])
+        page_token = events_result.get('nextPageToken')
+        if not page_token:
+            return
+
+def fetch_synced_events_index(service, calendar_id, time_min, time_max, executor=None, keys=()):
+    """
+    期間内の登録済みイベントを一度だけ取得し、管理番号をキーにした索引を作成します。
+    keys の管理番号のうち期間内に見つからないものは期間を限らずに検索して索引に加えるため、
+    日付が前回の期間の外へ移動した行も既存のイベントと照合できます。
+    (索引, 同じ管理番号を持つ重複イベントのリスト) を返します。
+    """
+    executor = executor or get_default_executor()
+    index = {}
+    duplicates = []
+    seen_ids = set()
+    _add_to_sync_index(
+        _iter_listed_events(service, calendar_id, executor, timeMin=time_min, timeMax=time_max, singleEvents=True),
+        index, duplicates, seen_ids
+    )
+
+    missing = [key for key in dict.fromkeys(keys) if key not in index]
+    if len(missing) > SYNC_KEY_LOOKUP_LIMIT:
+        # 件数が多い場合（初回の登録など）は、1件ずつの検索よりカレンダー全体を1回一覧するほうがリクエスト数が少なくなります
+        wanted = set(missing)
+        _add_to_sync_index(
+            (event for event in _iter_listed_events(service, calendar_id, executor) if _sync_key(event) in wanted),
+            index, duplicates, seen_ids
+        )
+    elif missing:
+        events_resource = service.events()
+        request_factories = [
+            lambda key=key: events_resource.list(
+                calendarId=calendar_id, privateExtendedProperty=f"{SYNC_KEY_PROPERTY}={key}", fields=SYNC_LIST_FIELDS
+            )
+            for key in missing
+        ]
+        for result in execute_requests_in_batches(service, request_factories, executor=executor):
+            if not result["success"]:
+                # 既存のイベントの有無がわからないまま登録すると重複するため、同期を中止します
+                raise result["error"]
+            _add_to_sync_index(result["response"].get('items', []), index, duplicates, seen_ids)
+    return index, duplicates
+
+def sync_events_to_calendar(service, calendar_id, keyed_events, delete_orphans=False, progress_callback=None,
+                            executor=None, mirror=None):
+    """
+    (管理番号, イベント本体) のリストを登録済みイベントと照合し、差分だけを送信します。
+
+    新しい管理番号は insert、内容ハッシュが変わったもの（日付が前回の期間の外へ移動したものを含む）は patch で更新し、
+    delete_orphans が True の場合は期間内でファイルに存在しない登録済みイベントと重複を削除します。
+    progress_callback(processed, total) には送信済み件数と送信件数が渡されます。
+    mirror（calendar_mirror.CalendarMirror）を指定した場合は、一覧を取得せずに
+    差分だけ更新したローカルの索引と照合します。
+    """
+    keyed_events = list(keyed_events)
+    summary = {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0, "failures": []}
+    if not keyed_events:
+        return summary
+
+    bounds = [_event_time_bounds(event_data) for _, event_data in keyed_events]
+    time_min = min(start for start, _ in bounds).isoformat()
+    time_max = max(end for _, end in bounds).isoformat()
+    keys = [key for key, _ in keyed_events]
+    if mirror is not None:
+        mirror.refresh(service, calendar_id, executor)
+        index, duplicates = mirror.synced_events_index(calendar_id, time_min, time_max, keys)
+    else:
+        index, duplicates = fetch_synced_events_index(service, calendar_id, time_min, time_max, executor, keys)
+
+    events_resource = service.events()
+    request_factories = []
+    operations = [] # 各リクエストの (操作種別, 表示名)
+    for key, event_data in keyed_events:
+        attach_sync_properties(event_data, key)
+        existing = index.pop(key, None)
+        if existing is None:
+            request_factories.append(
+                lambda event_data=event_data: events_resource.insert(calendarId=calendar_id, body=event_data)
+            )
+            operations.append(("inserted", event_data.get('summary', key)))
+        elif existing['extendedProperties']['private'].get(SYNC_HASH_PROPERTY) != event_data['extendedProperties']['private'][SYNC_HASH_PROPERTY]:
+            request_factories.append(
+                lambda event_id=existing['id'], event_data=event_data: events_resource.patch(
+                    calendarId=calendar_id, eventId=event_id, body=event_data
+                )
+            )
+            operations.append(("updated", event_data.get('summary', key)))
+        else:
+            summary["unchanged"] += 1
+
+    if delete_orphans:
+        for event in list(index.values()) + duplicates:
+            request_factories.append(
+                lambda event_id=event['id']: events_resource.delete(calendarId=calendar_id, eventId=event_id)
+            )
+            operations.append(("deleted", event.get('summary', event['id'])))
+
+    total = len(request_factories)
+    results = execute_requests_in_batches(
+        service, request_factories,
+        progress_callback=(lambda processed: progress_callback(processed, total)) if progress_callback else None,
+        executor=executor
+    )
+    for result in results:
+        operation, label = operations[result["index"]]
+        if result["success"]:
+            summary[operation] += 1
+        else:
+            summary["failures"].append((label, result["error"]))
+    return summary
+
+def _is_deleted(error):
+    """
+    削除リクエストの結果が成功か判定します。404/410 は既に削除済みのため成功として扱います。
+    """
+    return error is None or (isinstance(error, HttpError) and error.resp.status in (404, 410))
+
+def _execute_delete_batch(service, calendar_id, events, executor, max_retries=BATCH_MAX_RETRIES):
+    """
+    イベントのリストをひとつのBatchHttpRequestで削除します。登録と同じく _run_batch_with_retries で送信し、
+    スロットリングなど再試行可能な失敗だけをバックオフしながら再送します。
+    (削除件数, [(イベント, 例外), ...]) を返します。
+    """
+    events_resource = service.events()
+    chunk = [
+        (index, lambda event_id=event['id']: events_resource.delete(calendarId=calendar_id, eventId=event_id))
+        for index, event in enumerate(events)
+    ]
+    results = _run_batch_with_retries(service, chunk, max_retries, executor)
+
+    deleted = 0
+    failures = []
+    for index in sorted(results):
+        if _is_deleted(results[index]["error"]):
+            deleted += 1
+        else:
+            failures.append((events[index], results[index]["error"]))
+    return deleted, failures
+
+def _day_range_utc(start_date, end_date):
+    """
+    日本時間の開始日の0時から終了日の終わりまでを、UTCの timeMin / timeMax 文字列で返します。
     """
     JST_OFFSET = timedelta(hours=9)
 
@@ -97,53 +548,206 @@ def delete_events_from_calendar(service, calendar_id, start_date: datetime, end_
 
     time_min_utc = (start_dt_jst - JST_OFFSET).isoformat(timespec='microseconds') + 'Z'
     time_max_utc = (end_dt_jst - JST_OFFSET).isoformat(timespec='microseconds') + 'Z'
+    return time_min_utc, time_max_utc
+
+def preview_events_in_range(service, calendar_id, start_date: datetime, end_date: datetime,
+                            summary_prefix=None, mng_num_pattern=None, executor=None):
+    """
+    期間内の削除対象イベントを、削除せずに一覧します（削除前の件数確認用）。
 
-    # st.write(f"検索期間 (UTC): {time_min_utc} から {time_max_utc}") # デバッグ用
+    取得する項目を id・件名・開始日時に絞り、1ページ2500件で一覧を取得します。
+    summary_prefix で件名の前方一致、mng_num_pattern（正規表現、先頭から照合）で
+    このツールが登録時に記録した管理番号（clean_mng_num で記号を除いた値）を絞り込めます。
+    戻り値は {"events": [{"id", "summary", "start"}], "scanned": 走査件数, "error"} の辞書で、
+    events はそのまま delete_events_by_ids に渡せます。
+    """
+    executor = executor or get_default_executor()
+    time_min_utc, time_max_utc = _day_range_utc(start_date, end_date)
+    pattern = re.compile(mng_num_pattern) if mng_num_pattern else None
+    fields = DELETE_PREVIEW_FIELDS
+    if pattern is not None:
+        # 管理番号で絞り込む場合だけ extendedProperties も取得します
+        fields = fields.replace("start)", f"start,extendedProperties(private({SYNC_KEY_PROPERTY})))")
 
-    deleted_count = 0
-    all_events_to_delete = []
+    result = {"events": [], "scanned": 0, "error": None}
+    events_resource = service.events()
     page_token = None
+    while True:
+        try:
+            events_result = executor.execute(events_resource.list(
+                calendarId=calendar_id,
+                timeMin=time_min_utc,
+                timeMax=time_max_utc,
+                singleEvents=True,
+                maxResults=DELETE_PREVIEW_PAGE_SIZE,
+                fields=fields,
+                pageToken=page_token
+            ))
+        except Exception as e:
+            result["error"] = e
+            break
+
+        for event in events_result.get('items', []):
+            result["scanned"] += 1
+            if summary_prefix and not event.get('summary', '').startswith(summary_prefix):
+                continue
+            if pattern is not None:
+                key = event.get('extendedProperties', {}).get('private', {}).get(SYNC_KEY_PROPERTY)
+                if not key or not pattern.match(key):
+                    continue
+            result["events"].append({"id": event['id'], "summary": event.get('summary', ''), "start": event.get('start', {})})
+
+        page_token = events_result.get('nextPageToken')
+        if not page_token:
+            break
+    return result
+
+def delete_events_by_ids(service, calendar_id, events, max_concurrent_batches=DELETE_MAX_CONCURRENT_BATCHES,
+                         progress_interval=PROGRESS_UPDATE_INTERVAL, progress_callback=None, executor=None):
+    """
+    preview_events_in_range などで取得済みのイベント（"id" を持つdict）を、一覧を取得し直さずに削除します。
+    戻り値と progress_callback(deleted, found) は delete_events_in_range と同じです。
+    """
+    events = list(events)
+    result = {"deleted": 0, "found": len(events), "failures": [], "error": None}
+    last_progress_update = 0.0
+
+    def record(item):
+        if _is_deleted(item["error"]):
+            result["deleted"] += 1
+        else:
+            result["failures"].append((events[item["index"]], item["error"]))
+
+    def update_progress(processed):
+        nonlocal last_progress_update
+        now = time.monotonic()
+        if now - last_progress_update >= progress_interval:
+            last_progress_update = now
+            progress_callback(result["deleted"], result["found"])
+
+    events_resource = service.events()
+    request_factories = (
+        lambda event_id=event['id']: events_resource.delete(calendarId=calendar_id, eventId=event_id)
+        for event in events
+    )
+    execute_requests_in_batches(
+        service, request_factories, progress_callback=update_progress if progress_callback else None,
+        result_callback=record, executor=executor, max_in_flight=max_concurrent_batches
+    )
+    if progress_callback:
+        progress_callback(result["deleted"], result["found"])
+    return result
+
+def delete_events_in_range(service, calendar_id, start_date: datetime, end_date: datetime,
+                           max_concurrent_batches=DELETE_MAX_CONCURRENT_BATCHES,
+                           progress_interval=PROGRESS_UPDATE_INTERVAL, progress_callback=None, executor=None):
+    """
+    指定された期間内のGoogleカレンダーイベントを削除します（画面表示を行わない本体）。
+
+    一覧の各ページを受信した時点でバッチ削除リクエストに分割し、
+    最大 max_concurrent_batches 個のバッチを並行して実行します。
+    progress_callback(deleted, found) の呼び出しは progress_interval 秒に1回までに抑えます。
+    戻り値は {"deleted", "found", "failures": [(イベント, 例外)], "error"} の辞書です。
+    """
+    executor = executor or get_default_executor()
+    time_min_utc, time_max_utc = _day_range_utc(start_date, end_date)
+
+    result = {"deleted": 0, "found": 0, "failures": [], "error": None}
+    last_progress_update = 0.0
+
+    def update_progress(force=False):
+        nonlocal last_progress_update
+        now = time.monotonic()
+        if not progress_callback or (not force and now - last_progress_update < progress_interval):
+            return
+        last_progress_update = now
+        progress_callback(result["deleted"], result["found"])
 
-    # Step 1: 削除対象イベントをすべてリストアップ
-    with st.spinner(f"{start_date.strftime('%Y/%m/%d')}から{end_date.strftime('%Y/%m/%d')}までの削除対象イベントを検索中..."):
+    def collect(done_futures):
+        for future in done_futures:
+            deleted, batch_failures = future.result()
+            result["deleted"] += deleted
+            result["failures"].extend(batch_failures)
+
+    # 削除中にページ位置がずれて取りこぼしが出ないよう、1回の走査で何も削除されなくなるまで繰り返します
+    for _ in range(DELETE_MAX_PASSES):
+        deleted_before = result["deleted"]
+        page_token = None
+        in_flight = set()
         while True:
             try:
-                events_result = service.events().list(
+                events_result = executor.execute(service.events().list(
                     calendarId=calendar_id,
                     timeMin=time_min_utc,
                     timeMax=time_max_utc,
                     singleEvents=True,
-                    orderBy='startTime',
+                    maxResults=DELETE_LIST_PAGE_SIZE,
+                    fields="items(id,summary),nextPageToken",
                     pageToken=page_token
-                ).execute()
-                events = events_result.get('items', [])
-                all_events_to_delete.extend(events) # 取得したイベントをリストに追加
-
-                page_token = events_result.get('nextPageToken')
-                if not page_token:
-                    break 
+                ))
             except Exception as e:
-                st.error(f"イベントの検索中にエラーが発生しました: {e}")
-                return 0 # エラーが発生したら処理を中断
-
-    total_events = len(all_events_to_delete)
-    
-    # 削除対象イベントがない場合、ここでリターン
-    if total_events == 0:
-        return 0
-
-    # Step 2: 取得したイベントを削除（プログレスバー表示）
-    progress_bar = st.progress(0)
-    
-    for i, event in enumerate(all_events_to_delete):
-        event_summary = event.get('summary', '不明なイベント')
-        try:
-            service.events().delete(calendarId=calendar_id, eventId=event['id']).execute()
-            deleted_count += 1
-        except Exception as e:
-            st.warning(f"イベント '{event_summary}' の削除に失敗しました: {e}")
-        
-        # プログレスバーを更新
-        progress_bar.progress((i + 1) / total_events)
-    
-    return deleted_count
+                result["error"] = e
+                break
+
+            events = events_result.get('items', [])
+            result["found"] += len(events)
+            for i in range(0, len(events), BATCH_CHUNK_SIZE):
+                # 同時実行数の上限に達している場合は、いずれかのバッチの完了を待ちます
+                if len(in_flight) >= max_concurrent_batches:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                in_flight.add(executor.submit(
+                    _execute_delete_batch, service, calendar_id, events[i:i + BATCH_CHUNK_SIZE], executor
+                ))
+            done = {future for future in in_flight if future.done()}
+            in_flight -= done
+            collect(done)
+            update_progress()
+
+            page_token = events_result.get('nextPageToken')
+            if not page_token:
+                break
+
+        done, _ = wait(in_flight)
+        collect(done)
+        if result["error"] is not None or result["deleted"] == deleted_before:
+            break
+        # 2回目以降の走査では、削除に失敗したイベントを再度数えないようにします
+        result["found"] -= len(result["failures"])
+        result["failures"] = []
+
+    update_progress(force=True)
+    return result
+
+def delete_events_from_calendar(service, calendar_id, start_date: datetime, end_date: datetime,
+                                max_concurrent_batches=DELETE_MAX_CONCURRENT_BATCHES,
+                                progress_interval=PROGRESS_UPDATE_INTERVAL, executor=None, events=None):
+    """
+    指定された期間内のGoogleカレンダーイベントを、進捗を表示しながら削除します。
+    events（preview_events_in_range の結果）を指定した場合は、一覧を取得し直さずにそのイベントだけを削除します。
+    """
+    import streamlit as st
+    reporter = StreamlitReporter()
+
+    def show_progress(deleted, found):
+        if found:
+            reporter.progress(deleted / found, text=f"{deleted} / {found} 件を削除しました")
+
+    with st.spinner(f"{start_date.strftime('%Y/%m/%d')}から{end_date.strftime('%Y/%m/%d')}までのイベントを削除中..."):
+        if events is not None:
+            result = delete_events_by_ids(
+                service, calendar_id, events, max_concurrent_batches, progress_interval,
+                progress_callback=show_progress, executor=executor
+            )
+        else:
+            result = delete_events_in_range(
+                service, calendar_id, start_date, end_date, max_concurrent_batches, progress_interval,
+                progress_callback=show_progress, executor=executor
+            )
+
+    if result["error"] is not None:
+        reporter.error(f"イベントの検索中にエラーが発生しました: {result['error']}")
+    for event, e in result["failures"]:
+        reporter.warning(f"イベント '{event.get('summary', '不明なイベント')}' の削除に失敗しました: {e}")
+
+    return result["deleted"]
@@ -0,0 +1,276 @@
+# cli.py
+#
+# 画面を使わずに、フォルダ内のExcelファイルをまとめてGoogleカレンダーに登録するコマンドです。
+# 定期実行やスクリプトからの利用を想定しています。認証は画面で作成済みのトークンファイルを使います。
+#
+#   python cli.py ./excel --calendar-id xxxx@group.calendar.google.com
+#   python cli.py ./excel --calendar-id xxxx@group.calendar.google.com --sync --dry-run
+#   python cli.py ./excel --route 中央区=aaaa@group.calendar.google.com --route 北区=bbbb@group.calendar.google.com
+#   python cli.py ./excel --route-rules rules.csv --calendar-id default@group.calendar.google.com
+#
+# ワークブックの読み込みはファイルごとに別プロセスで並列に行い、管理番号による結合は親プロセスで行います。
+# pandas・Google APIクライアントは必要になった時点で読み込むため、--help などはすぐに終了します。
+
+import argparse
+import csv
+import glob
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+CLI_FILE_PATTERN = "*.xlsx" # 既定で処理するファイル名のパターン
+
+def find_workbooks(directory, pattern=CLI_FILE_PATTERN):
+    """
+    フォルダ内のワークブックのパスを名前順に返します。Excelの一時ファイル（~$で始まる）は除外します。
+    """
+    paths = glob.glob(os.path.join(directory, pattern))
+    return sorted(p for p in paths if not os.path.basename(p).startswith("~$") and os.path.isfile(p))
+
+def _load_frame(path):
+    from excel_parser import load_excel_frame
+    return load_excel_frame(path)
+
+def parse_workbooks(paths, description_columns, workers=None, reporter=None, route_columns=(),
+                    all_day_event=False, private_event=True):
+    """
+    ワークブックをプロセスプールで並列に読み込み、結合したイベントの EventBatch を返します。
+    読み込みに失敗したファイルは reporter に通知してスキップし、(EventBatch, 失敗したパスのリスト) を返します。
+    """
+    from event_batch import EventBatch
+    from excel_parser import build_typed_event_frame
+    from reporting import get_reporter
+
+    reporter = get_reporter(reporter)
+    dataframes = []
+    failed = []
+    if workers == 1 or len(paths) <= 1:
+        frames = [(path, _run_safely(_load_frame, path)) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [(path, pool.submit(_run_safely, _load_frame, path)) for path in paths]
+            frames = [(path, future.result()) for path, future in futures]
+
+    # ファイルの順番は結合時の優先順位になるため、完了順ではなく入力順に並べます
+    for index, (path, (df, error)) in enumerate(frames, start=1):
+        if error is not None:
+            reporter.error(f"ファイル '{path}' の読み込みに失敗しました: {error}")
+            failed.append(path)
+        elif df is not None:
+            dataframes.append(df)
+        reporter.progress(index / len(frames), text=f"{index} / {len(frames)} ファイルを読み込みました")
+
+    typed = build_typed_event_frame(dataframes, description_columns, reporter, route_columns)
+    return EventBatch.from_frame(typed, all_day_event, private_event), failed
+
+def _run_safely(func, *args):
+    # 例外オブジェクトがpickleできない場合に備えて、ワーカー側で文字列にして返します
+    try:
+        return func(*args), None
+    except Exception as e:
+        return None, str(e)
+
+def import_workbooks(paths, calendar_id, creds, description_columns=(), all_day_event=False, private_event=True,
+                     sync=False, delete_orphans=False, workers=None, dry_run=False, reporter=None,
+                     profile_parse=False, router=None, route_columns=()):
+    """
+    ワークブックを読み込んでカレンダーに登録し、結果のdictを返します。
+    sync が True の場合は管理番号をキーに差分だけを反映します。dry_run が True の場合は送信しません。
+    router（EventBatch から行ごとの登録先の Series を返す関数）を指定した場合は、
+    複数のカレンダーに振り分けて並行して登録し、登録先のない行は calendar_id に登録します（None ならスキップ）。
+    route_columns は router が参照する元の列名です。
+    結果の "metrics" には段階ごとの所要時間とAPI呼び出しの計測結果が入ります。
+    """
+    from instrumentation import RunMetrics
+
+    metrics = RunMetrics("cli import")
+    with metrics.activate():
+        summary = _import_workbooks(paths, calendar_id, creds, description_columns, all_day_event, private_event,
+                                    sync, delete_orphans, workers, dry_run, reporter, metrics, profile_parse,
+                                    router, route_columns)
+    summary["metrics"] = metrics.finish().to_dict()
+    return summary
+
+def _import_workbooks(paths, calendar_id, creds, description_columns, all_day_event, private_event,
+                      sync, delete_orphans, workers, dry_run, reporter, metrics, profile_parse,
+                      router, route_columns):
+    from calendar_mirror import get_calendar_mirror
+    from calendar_utils import get_calendar_service
+    from reporting import get_reporter
+    from routing import register_events
+
+    reporter = get_reporter(reporter)
+    # プロセスプールを使う場合、プロファイルには親プロセスの結合処理だけが記録されます
+    with metrics.stage("parse", profile=profile_parse):
+        batch, failed_files = parse_workbooks(paths, list(description_columns), workers, reporter, route_columns,
+                                              all_day_event, private_event)
+    summary = {"files": len(paths), "failed_files": failed_files, "events": len(batch),
+               "inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0, "failures": []}
+    if not len(batch):
+        reporter.warning("登録するイベントがありません。")
+        return summary
+    if router is not None:
+        return _import_routed(batch, calendar_id, creds, sync, delete_orphans, dry_run, reporter, metrics,
+                              router, summary)
+
+    reporter.info(f"{len(paths)} ファイルから {len(batch)} 件のイベントを読み込みました。")
+    if dry_run:
+        return summary
+
+    service = get_calendar_service(creds)
+
+    def show_progress(processed, total):
+        if total:
+            reporter.progress(processed / total, text=f"{processed} / {total} 件を処理しました")
+
+    result = register_events(service, calendar_id, batch, sync=sync, delete_orphans=delete_orphans,
+                             mirror=get_calendar_mirror() if sync else None, progress_callback=show_progress,
+                             metrics=metrics)
+    for name in ("inserted", "updated", "unchanged", "deleted"):
+        summary[name] += result[name]
+    summary["failures"].extend(result["failures"])
+    return summary
+
+def _import_routed(batch, calendar_id, creds, sync, delete_orphans, dry_run, reporter, metrics, router, summary):
+    # 1回の読み込み結果を登録先ごとに分け、カレンダーごとの ApiExecutor で並行して登録します
+    from calendar_mirror import get_calendar_mirror
+    from calendar_utils import get_calendar_service
+    from routing import register_routed_events, split_batch
+
+    with metrics.stage("route_split"):
+        routes = router(batch)
+        if calendar_id:
+            routes = routes.where(routes.notna(), calendar_id)
+        groups, unrouted = split_batch(batch, routes)
+    summary["unrouted"] = len(unrouted)
+    summary["calendars"] = {target: {"events": len(group)} for target, group in groups.items()}
+    reporter.info(f"{len(batch)} 件のイベントを {len(groups)} 件のカレンダーに振り分けました。")
+    if unrouted:
+        reporter.warning(f"登録先が決まらない {len(unrouted)} 件のイベントはスキップします。")
+    if dry_run or not groups:
+        return summary
+
+    service = get_calendar_service(creds)
+
+    def show_progress(processed, total):
+        if total:
+            reporter.progress(processed / total, text=f"{processed} / {total} 件を処理しました")
+
+    with metrics.stage("route"):
+        results = register_routed_events(service, groups, sync=sync, delete_orphans=delete_orphans,
+                                         mirror=get_calendar_mirror() if sync else None,
+                                         progress_callback=show_progress)
+    for target, result in results.items():
+        for name in ("inserted", "updated", "unchanged", "deleted"):
+            summary[name] += result[name]
+        summary["failures"].extend(result["failures"])
+        if result["error"] is not None:
+            summary["failures"].append((target, result["error"]))
+        summary["calendars"][target] = {key: value for key, value in result.items() if key not in ("failures", "error")}
+    return summary
+
+def load_route_rules(path):
+    """
+    振り分けのルール表（CSV: 列名, 正規表現, カレンダーID。1行目は見出し）を routing.route_by_rules の形式で返します。
+    """
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        rows = list(csv.reader(f))
+    return [(column.strip(), pattern.strip(), target.strip()) for column, pattern, target in
+            (row[:3] for row in rows[1:] if len(row) >= 3 and row[0].strip())]
+
+def _build_router(args, parser):
+    # --route / --route-rules から、EventBatch -> 行ごとの登録先 の関数と参照する元の列名を作ります
+    from routing import ROUTE_LOCATION_COLUMN, route_by_rules, route_by_value
+
+    if args.route_rules:
+        rules = load_route_rules(args.route_rules)
+        if not rules:
+            parser.error(f"ルール表 '{args.route_rules}' にルールがありません。")
+        return (lambda batch: route_by_rules(batch, rules)), sorted({column for column, _, _ in rules})
+    if args.route:
+        mapping = {}
+        for item in args.route:
+            key, separator, target = item.partition("=")
+            if not separator or not key or not target:
+                parser.error(f"--route は 値=カレンダーID の形式で指定してください: {item}")
+            mapping[key] = target
+        column = args.route_column or ROUTE_LOCATION_COLUMN
+        return (lambda batch: route_by_value(batch, mapping, column, args.route_pattern)), [column]
+    return None, ()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="フォルダ内のExcelファイルのイベントをGoogleカレンダーに登録します。")
+    parser.add_argument("directory", help="Excelファイルを置いたフォルダ")
+    parser.add_argument("--calendar-id", default=None,
+                        help="登録先のカレンダーID（振り分け時は登録先が決まらない行の登録先）")
+    parser.add_argument("--pattern", default=CLI_FILE_PATTERN, help=f"処理するファイル名のパターン（既定: {CLI_FILE_PATTERN}）")
+    parser.add_argument("--token", default=None, help="認証情報の保存ファイル（既定: token.json。.pickle は .json に移行）")
+    parser.add_argument("--workers", type=int, default=None, help="読み込みに使うプロセス数（既定: CPU数）")
+    parser.add_argument("--description-columns", nargs="*", default=[], metavar="COLUMN", help="説明欄に含める列名")
+    parser.add_argument("--all-day", action="store_true", help="終日イベントとして登録する")
+    parser.add_argument("--public", action="store_true", help="公開イベント（予定あり）として登録する")
+    parser.add_argument("--sync", action="store_true", help="管理番号をキーに差分だけを反映する")
+    parser.add_argument("--delete-orphans", action="store_true", help="--sync 時、Excelにない管理番号のイベントを削除する")
+    parser.add_argument("--dry-run", action="store_true", help="読み込みのみ行い、カレンダーには送信しない")
+    parser.add_argument("--metrics", default=None, metavar="PATH", help="計測結果をJSONで保存するファイル")
+    parser.add_argument("--profile", action="store_true", help="読み込み処理を cProfile で記録する（--metrics に出力）")
+    parser.add_argument("--route", action="append", default=[], metavar="VALUE=CALENDAR_ID",
+                        help="--route-column の値（--route-pattern で取り出した部分）ごとの登録先。複数指定可")
+    parser.add_argument("--route-column", default=None,
+                        help="振り分けに使う列（既定: 住所・所在地から作成した場所）")
+    parser.add_argument("--route-pattern", default=None, metavar="REGEX",
+                        help="振り分けの値を取り出す正規表現（既定: 区の名前 ^(.+?区)）")
+    parser.add_argument("--route-rules", default=None, metavar="CSV",
+                        help="振り分けのルール表（列名,正規表現,カレンダーID。上から順に照合）")
+    parser.add_argument("-v", "--verbose", action="store_true", help="進捗も表示する")
+    args = parser.parse_args(argv)
+    if args.route_pattern is None:
+        from routing import ROUTE_WARD_PATTERN
+        args.route_pattern = ROUTE_WARD_PATTERN
+    router, route_columns = _build_router(args, parser)
+    if router is None and not args.calendar_id:
+        parser.error("--calendar-id、または --route / --route-rules を指定してください。")
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="%(levelname)s %(message)s")
+
+    paths = find_workbooks(args.directory, args.pattern)
+    if not paths:
+        print(f"'{args.directory}' に {args.pattern} に一致するファイルがありません。", file=sys.stderr)
+        return 2
+
+    creds = None
+    if not args.dry_run:
+        from calendar_utils import load_saved_credentials
+        creds = load_saved_credentials(args.token)
+        if creds is None:
+            print("有効な認証トークンがありません。先に画面からGoogle認証を行ってください。", file=sys.stderr)
+            return 2
+
+    summary = import_workbooks(
+        paths, args.calendar_id, creds, args.description_columns, all_day_event=args.all_day,
+        private_event=not args.public, sync=args.sync, delete_orphans=args.delete_orphans,
+        workers=args.workers, dry_run=args.dry_run, profile_parse=args.profile,
+        router=router, route_columns=route_columns
+    )
+    if args.metrics:
+        with open(args.metrics, "w", encoding="utf-8") as f:
+            json.dump(summary["metrics"], f, ensure_ascii=False, indent=2)
+    print(f"ファイル: {summary['files']} 件（読み込み失敗 {len(summary['failed_files'])} 件） / イベント: {summary['events']} 件")
+    for target, result in summary.get("calendars", {}).items():
+        detail = f"{result['events']} 件"
+        if "seconds" in result:
+            detail += f"（追加 {result['inserted']} / 更新 {result['updated']} / 変更なし {result['unchanged']} / {result['seconds']:.1f} 秒）"
+        print(f"  {target}: {detail}")
+    if summary.get("unrouted"):
+        print(f"  登録先なし（スキップ）: {summary['unrouted']} 件")
+    if not args.dry_run:
+        print(f"追加: {summary['inserted']} 件 / 更新: {summary['updated']} 件 / 変更なし: {summary['unchanged']} 件 / "
+              f"削除: {summary['deleted']} 件 / 失敗: {len(summary['failures'])} 件")
+    for label, error in summary["failures"]:
+        print(f"失敗: {label}: {error}", file=sys.stderr)
+    return 1 if summary["failures"] or summary["failed_files"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
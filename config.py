@@ -4,7 +4,7 @@
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 
 # 認証トークンの保存場所
-TOKEN_PATH = 'token.pickle'
+TOKEN_PATH = 'token.json'
 
 # Googleクレデンシャルファイル
 CREDENTIALS_FILE = 'credentials.json'
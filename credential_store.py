@@ -0,0 +1,212 @@
+# credential_store.py
+#
+# Google の認証情報をプロセス内で1つだけ保持し、すべてのセッション・ジョブ・CLI で共有する仕組みです。
+# 有効期限が近づくとバックグラウンドのスレッドで先回りして更新するため、画面の再実行中に更新を待つことはなく、
+# 更新はロックで1回にまとめるため、同時に多数のセッションが期限切れに気づいても更新は1回だけです。
+# 読み込み後の get() はロックを取らないため、バックグラウンドでの更新中も画面の再実行は待たされません。
+# 保存は pickle ではなく JSON（鍵を指定した場合は cryptography の Fernet で暗号化）で行い、
+# 従来の token.pickle は最初の読み込み時に一度だけ移行して削除します。
+
+import json
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+
+TOKEN_STORE_FILE = "token.json" # 認証情報を保存するファイル名
+LEGACY_TOKEN_FILE = "token.pickle" # 移行元の従来のトークンファイル
+TOKEN_KEY_ENV = "CALENDAR_TOKEN_KEY" # 保存ファイルを暗号化する Fernet 鍵の環境変数
+REFRESH_MARGIN_SECONDS = 600 # 有効期限の何秒前に更新するか
+REFRESH_CHECK_INTERVAL = 60 # バックグラウンドで有効期限を確認する最大間隔（秒）
+REFRESH_RETRY_DELAY = 30 # 更新に失敗したときに再試行するまでの秒数
+
+logger = logging.getLogger("calendar_import")
+
+def _utcnow():
+    # google-auth の有効期限（タイムゾーンなしのUTC）と比較できる現在時刻
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class CredentialManager:
+    """
+    認証情報をメモリに保持し、期限前の更新と保存を行います。プロセスにつき1つを get_credential_manager() で共有します。
+    key（省略時は環境変数 CALENDAR_TOKEN_KEY）に Fernet 鍵を指定すると保存ファイルを暗号化します。
+    """
+
+    def __init__(self, path=TOKEN_STORE_FILE, key=None, legacy_path=LEGACY_TOKEN_FILE,
+                 refresh_margin=REFRESH_MARGIN_SECONDS, check_interval=REFRESH_CHECK_INTERVAL):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.refresh_margin = timedelta(seconds=refresh_margin)
+        self.check_interval = check_interval
+        self.refresh_count = 0
+        self._fernet = None
+        key = key or os.environ.get(TOKEN_KEY_ENV)
+        if key:
+            from cryptography.fernet import Fernet
+            self._fernet = Fernet(key.encode() if isinstance(key, str) else key)
+        self._creds = None
+        self._loaded = False
+        self._lock = threading.Lock() # 読み込み・更新・保存をこのロックで1つずつ行います
+        self._thread_lock = threading.Lock() # 更新スレッドの起動用（更新中の _lock を待たないよう分けています）
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self):
+        """
+        有効な認証情報を返します。初回はファイル（または従来の token.pickle）から読み込み、
+        期限切れの場合はその場で更新します。認証情報がなければ None を返します。
+        読み込み後はロックを取らずに保持中の認証情報を返します（更新は同じオブジェクトを書き換えます）。
+        """
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._creds = self._load()
+                    self._loaded = True
+        creds = self._creds
+        if creds is None:
+            return None
+        if not creds.valid:
+            self.refresh_if_needed()
+            creds = self._creds
+        self._start_refresher()
+        return creds if creds is not None and creds.valid else None
+
+    def set(self, creds):
+        """
+        新しく取得した認証情報を保持して保存し、バックグラウンドでの更新を開始します。
+        """
+        with self._lock:
+            self._creds = creds
+            self._loaded = True
+            self._save(creds)
+        self._start_refresher()
+
+    def clear(self):
+        """
+        保持している認証情報と保存ファイルを削除します（再認証が必要になります）。
+        """
+        with self._lock:
+            self._creds = None
+            self._loaded = True
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def refresh_if_needed(self):
+        """
+        有効期限まで refresh_margin を切っていれば更新して保存します。更新した場合は True を返します。
+        複数のスレッドから同時に呼ばれても、ロックを待つ間に他のスレッドが更新していれば更新しません。
+        """
+        from google.auth.exceptions import RefreshError
+        from google.auth.transport.requests import Request
+
+        with self._lock:
+            creds = self._creds
+            if creds is None or not creds.refresh_token or not self._needs_refresh(creds):
+                return False
+            try:
+                creds.refresh(Request())
+            except RefreshError:
+                # リフレッシュトークンが失効・取り消された場合は再認証が必要です
+                self._creds = None
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+                raise
+            self.refresh_count += 1
+            self._save(creds)
+            return True
+
+    def _needs_refresh(self, creds):
+        if creds.expiry is None:
+            return not creds.valid
+        return creds.expiry - _utcnow() <= self.refresh_margin
+
+    def _seconds_until_refresh(self):
+        creds = self._creds
+        if creds is None or creds.expiry is None:
+            return self.check_interval
+        remaining = (creds.expiry - self.refresh_margin - _utcnow()).total_seconds()
+        return min(max(remaining, 0), self.check_interval)
+
+    def _start_refresher(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._refresh_loop, name="credential-refresh", daemon=True)
+            self._thread.start()
+
+    def _refresh_loop(self):
+        delay = self._seconds_until_refresh()
+        while not self._stop.wait(delay):
+            if self._creds is None:
+                break
+            try:
+                if self.refresh_if_needed():
+                    logger.info("認証トークンを更新しました。")
+                delay = self._seconds_until_refresh()
+            except Exception as e:
+                if self._creds is None:
+                    logger.error(f"認証トークンの更新に失敗しました。再認証が必要です: {e}")
+                    break
+                logger.warning(f"認証トークンの更新に失敗しました。{REFRESH_RETRY_DELAY} 秒後に再試行します: {e}")
+                delay = REFRESH_RETRY_DELAY
+
+    def stop(self):
+        self._stop.set()
+
+    def _load(self):
+        # 保存ファイルから読み込みます。なければ従来の token.pickle を移行します
+        from google.oauth2.credentials import Credentials
+
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                data = f.read()
+            if self._fernet is not None and not data.lstrip().startswith(b"{"):
+                data = self._fernet.decrypt(data)
+            creds = Credentials.from_authorized_user_info(json.loads(data))
+            if self._fernet is not None and data.lstrip().startswith(b"{"):
+                # 暗号化前に保存された平文のファイルは、鍵を設定した後の最初の読み込みで暗号化し直します
+                self._save(creds)
+            return creds
+        if self.legacy_path and os.path.exists(self.legacy_path):
+            with open(self.legacy_path, "rb") as f:
+                creds = pickle.load(f)
+            self._save(creds)
+            os.remove(self.legacy_path)
+            logger.info(f"{self.legacy_path} を {self.path} に移行しました。")
+            return creds
+        return None
+
+    def _save(self, creds):
+        # 書きかけのファイルを読まれないよう、一時ファイルに書いてから置き換えます（所有者のみ読み書き可）
+        data = creds.to_json().encode("utf-8")
+        if self._fernet is not None:
+            data = self._fernet.encrypt(data)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".token-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.chmod(temp_path, 0o600)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_credential_manager(key=None):
+    """
+    プロセス内で共有する CredentialManager を返します。key は最初の呼び出しのものを使います。
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = CredentialManager(key=key)
+        return _manager
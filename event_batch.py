@@ -0,0 +1,131 @@
+# event_batch.py
+#
+# 読み込んだイベントを列ごとの NumPy 配列で保持するコンパクトな中間表現です。
+# 開始・終了は datetime64[m]、終日・非公開は bool、件名・管理番号は pandas の文字列配列（pyarrow があれば Arrow 形式）、
+# 場所と説明は同じ値の多い列（区・担当など）なら値を1つにまとめる categorical で持ち、
+# 行ごとの dict や Series を作らずに、読み込み（excel_parser）・振り分け（routing）・
+# イベント本体の作成（payloads）・送信（calendar_utils / job_runner）の間で受け渡します。
+
+import numpy as np
+import pandas as pd
+
+BASE_COLUMNS = ["Subject", "Start", "End", "Description", "Location", "管理番号"] # build_typed_event_frame の列
+
+def _string_array(series):
+    # 文字列の列は pandas の文字列配列（欠損値は空文字）
+    return pd.array(series.astype(object).where(series.notna(), "").tolist(), dtype="str")
+
+def _compact_values(series):
+    # 異なる値が行数の半分以下なら出現順に番号を振った categorical、それ以外は文字列配列にします（欠損値は空文字）。
+    # 文字列と数値が混ざっている列は、イベント本体に同じ値が入るよう値をそのままの型で残します
+    values = series.astype(object).where(series.notna(), "").to_numpy(dtype=object)
+    codes, uniques = pd.factorize(values, sort=False)
+    all_strings = pd.api.types.infer_dtype(uniques, skipna=False) in ("string", "empty")
+    if len(uniques) * 2 > len(values):
+        return pd.array(values, dtype="str") if all_strings else values
+    return pd.Categorical.from_codes(codes, categories=pd.Index(uniques, dtype="str" if all_strings else object))
+
+def _minutes(series):
+    # 分単位の datetime64 配列。タイムゾーン付きの列は現地時刻のまま扱います
+    if series.dt.tz is not None:
+        series = series.dt.tz_localize(None)
+    return series.to_numpy().astype("datetime64[m]")
+
+def _deep_nbytes(values):
+    # DataFrame.memory_usage(deep=True) と同じ数え方（object の要素は Python オブジェクトの大きさも含めます）
+    return int(pd.Series(values, copy=False).memory_usage(index=False, deep=True))
+
+class EventBatch:
+    """
+    イベントの列をまとめた読み取り専用のバッチです。len() で件数、column() で列を Series として取り出せます。
+    """
+
+    __slots__ = ("subject", "start", "end", "all_day", "private", "location", "description", "mng_num", "extra")
+
+    def __init__(self, subject, start, end, all_day, private, location, description, mng_num, extra=None):
+        self.subject = subject
+        self.start = start
+        self.end = end
+        self.all_day = all_day
+        self.private = private
+        self.location = location
+        self.description = description
+        self.mng_num = mng_num
+        self.extra = extra or {} # 振り分け用に残した元の列（列名 -> 配列）
+
+    @classmethod
+    def from_frame(cls, typed, all_day_event=False, private_event=True):
+        """
+        build_typed_event_frame の結果から作成します。終日・非公開の指定は全行に設定します。
+        """
+        if typed.empty:
+            return cls.empty()
+        size = len(typed)
+        return cls(
+            subject=_string_array(typed["Subject"]),
+            start=_minutes(typed["Start"]),
+            end=_minutes(typed["End"]),
+            all_day=np.full(size, bool(all_day_event)),
+            private=np.full(size, bool(private_event)),
+            location=_compact_values(typed["Location"]),
+            description=_compact_values(typed["Description"]),
+            mng_num=_string_array(typed["管理番号"]),
+            extra={col: typed[col].array for col in typed.columns if col not in BASE_COLUMNS},
+        )
+
+    @classmethod
+    def empty(cls):
+        empty_categorical = pd.Categorical.from_codes([], categories=pd.Index([], dtype=object))
+        empty_strings = pd.array([], dtype="str")
+        return cls(empty_strings, np.empty(0, dtype="datetime64[m]"), np.empty(0, dtype="datetime64[m]"),
+                   np.empty(0, dtype=bool), np.empty(0, dtype=bool), empty_categorical, empty_categorical, empty_strings)
+
+    def __len__(self):
+        return len(self.subject)
+
+    @property
+    def columns(self):
+        return BASE_COLUMNS + list(self.extra)
+
+    def column(self, name):
+        """
+        列を Series で返します。Start / End は datetime64 です。
+        """
+        values = {
+            "Subject": self.subject, "Start": self.start, "End": self.end, "Description": self.description,
+            "Location": self.location, "管理番号": self.mng_num,
+        }.get(name)
+        if values is None:
+            values = self.extra[name]
+        return pd.Series(values, copy=False)
+
+    def take(self, indices):
+        """
+        indices（行番号の配列）の行だけを持つバッチを返します。
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+        return EventBatch(
+            self.subject[indices], self.start[indices], self.end[indices], self.all_day[indices],
+            self.private[indices], self.location[indices], self.description[indices], self.mng_num[indices],
+            {col: values[indices] for col, values in self.extra.items()},
+        )
+
+    def to_frame(self):
+        """
+        build_typed_event_frame と同じ列の DataFrame に戻します（表示・確認用）。
+        """
+        frame = pd.DataFrame({name: self.column(name) for name in BASE_COLUMNS})
+        frame["Start"] = frame["Start"].astype("datetime64[us]")
+        frame["End"] = frame["End"].astype("datetime64[us]")
+        for col, values in self.extra.items():
+            frame[col] = values
+        return frame
+
+    def nbytes(self):
+        """
+        バッチが保持するデータのおおよそのバイト数です。
+        """
+        return sum(_deep_nbytes(values) for values in (
+            self.subject, self.start, self.end, self.all_day, self.private, self.location, self.description,
+            self.mng_num, *self.extra.values()
+        ))
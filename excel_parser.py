@@ -2,14 +2,35 @@
 
 import pandas as pd
 import re
+import io
+import hashlib
+import threading
 import datetime
-import streamlit as st
+from collections import OrderedDict
+import openpyxl
+from pandas.api.types import is_bool_dtype, is_float_dtype, is_integer_dtype, is_string_dtype
+from reporting import get_reporter
+from event_batch import EventBatch
+
+# ファイル内容のハッシュをキーにした読み込み結果のキャッシュ（Streamlitの再実行をまたいで保持）
+PARSE_CACHE_MAX_BYTES = 512 * 1024 * 1024 # キャッシュするDataFrameの合計メモリ上限
+PARSE_CACHE_MAX_ENTRIES = 32
+
+_parse_cache = OrderedDict() # ハッシュ -> (メモリ使用量, DataFrame)
+_parse_cache_bytes = 0
+_header_cache = OrderedDict() # ハッシュ -> 列名のリスト
+_cache_lock = threading.Lock()
 
 def clean_mng_num(value):
     if pd.isna(value):
         return ""
     return re.sub(r"[^0-9A-Za-z]", "", str(value)).replace("HK", "")
 
+def clean_mng_series(series):
+    # clean_mng_num の列単位版
+    values = series.astype(object).where(series.notna(), "").astype(str)
+    return values.str.replace(r"[^0-9A-Za-z]", "", regex=True).str.replace("HK", "", regex=False)
+
 def find_closest_column(columns, keywords):
     for kw in keywords:
         for col in columns:
@@ -24,36 +45,316 @@ def format_description_value(val):
         return str(int(val)) if val.is_integer() else str(round(val, 2))
     return str(val)
 
-def process_excel_files(uploaded_files, description_columns, all_day_event, private_event):
-    dataframes = []
+def format_description_series(series):
+    # format_description_value の列単位版
+    if is_float_dtype(series):
+        result = pd.Series("", index=series.index, dtype=object)
+        is_integer = series.notna() & (series % 1 == 0)
+        in_int64_range = series.abs() < 2 ** 62
+        fast = is_integer & in_int64_range
+        result[fast] = series[fast].astype("int64").astype(str)
+        # int64に収まらない値と小数はPythonのround()と同じ結果になるよう個別に変換
+        slow = series.notna() & ~fast
+        result[slow] = series[slow].map(format_description_value)
+        return result
+    if is_integer_dtype(series) or is_bool_dtype(series):
+        return series.astype(str).astype(object)
+    return series.map(format_description_value)
 
-    if not uploaded_files:
-        st.warning("Excelファイルをアップロードしてください。")
-        return pd.DataFrame()
+def to_datetime_series(series):
+    # 列全体を一度に変換し、解釈できなかった値だけ個別に変換し直す
+    try:
+        converted = pd.to_datetime(series, errors="coerce")
+    except Exception:
+        converted = pd.Series(pd.NaT, index=series.index)
+    failed = converted.isna() & series.notna()
+    if failed.any():
+        converted = converted.astype(object)
+        for idx in failed[failed].index:
+            try:
+                converted[idx] = pd.to_datetime(series[idx])
+            except Exception:
+                converted[idx] = pd.NaT
+        converted = pd.to_datetime(converted, errors="coerce")
+    return converted
+
+def _read_bytes(source):
+    # アップロードファイル（BytesIO互換）またはファイルパスから内容を読み込む
+    if isinstance(source, (str, bytes)) or hasattr(source, "__fspath__"):
+        with open(source, "rb") as f:
+            return f.read()
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    position = source.tell()
+    source.seek(0)
+    data = source.read()
+    source.seek(position)
+    return data
+
+def file_content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+def read_excel_headers(uploaded_file):
+    """
+    ワークブック先頭シートの1行目だけを読み込み、列名のリストを返します。
+    """
+    data = _read_bytes(uploaded_file)
+    key = file_content_hash(data)
+    with _cache_lock:
+        if key in _header_cache:
+            _header_cache.move_to_end(key)
+            return list(_header_cache[key])
+
+    workbook = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        first_row = next(workbook.worksheets[0].iter_rows(min_row=1, max_row=1, values_only=True), ())
+    finally:
+        workbook.close()
+    columns = [str(c).strip() for c in first_row if c is not None]
+
+    with _cache_lock:
+        _header_cache[key] = columns
+        while len(_header_cache) > PARSE_CACHE_MAX_ENTRIES * 4:
+            _header_cache.popitem(last=False)
+    return list(columns)
+
+def read_excel_cached(uploaded_file):
+    """
+    ワークブックを読み込み、列名を整えたDataFrameを返します。
+    同じ内容のファイルは一度だけ解析し、以降はキャッシュのコピーを返します。
+    """
+    global _parse_cache_bytes
+
+    data = _read_bytes(uploaded_file)
+    key = file_content_hash(data)
+    with _cache_lock:
+        if key in _parse_cache:
+            _parse_cache.move_to_end(key)
+            return _parse_cache[key][1].copy()
+
+    df = pd.read_excel(io.BytesIO(data), engine="openpyxl")
+    df.columns = [str(c).strip() for c in df.columns]
+    size = int(df.memory_usage(deep=True).sum())
+
+    with _cache_lock:
+        if key not in _parse_cache and size <= PARSE_CACHE_MAX_BYTES:
+            _parse_cache[key] = (size, df)
+            _parse_cache_bytes += size
+            # 上限を超えた分は最も長く使われていないものから破棄
+            while _parse_cache_bytes > PARSE_CACHE_MAX_BYTES or len(_parse_cache) > PARSE_CACHE_MAX_ENTRIES:
+                evicted_size, _ = _parse_cache.popitem(last=False)[1]
+                _parse_cache_bytes -= evicted_size
+    return df.copy()
 
+def _open_workbook_read_only(source):
+    # ファイルパスはそのまま渡し、内容全体をメモリに載せないようにする
+    if isinstance(source, (str, bytes)) or hasattr(source, "__fspath__"):
+        return openpyxl.load_workbook(source, read_only=True, data_only=True)
+    source.seek(0)
+    return openpyxl.load_workbook(source, read_only=True, data_only=True)
+
+def iter_event_records(uploaded_files, description_columns, all_day_event, private_event, reporter=None):
+    """
+    ワークブックを openpyxl の read_only モードで1行ずつ読み込み、イベントレコードを順に返すジェネレーターです。
+    レコードは process_excel_files の出力1行と同じキーを持つdictです。
+
+    ファイル全体をDataFrameにしないため、ファイルサイズに関係なくメモリ使用量が一定に保たれます。
+    複数ファイルは結合せずに順番に処理し、既に出現した管理番号の行はスキップします。
+    """
+    reporter = get_reporter(reporter)
+    seen = set()
     for uploaded_file in uploaded_files:
+        file_name = getattr(uploaded_file, "name", str(uploaded_file))
         try:
-            df = pd.read_excel(uploaded_file, engine="openpyxl")
-            df.columns = [str(c).strip() for c in df.columns]
-            mng_col = find_closest_column(df.columns, ["管理番号"])
-            if mng_col:
-                df["管理番号"] = df[mng_col].apply(clean_mng_num)
-            else:
-                st.warning(f"ファイル '{uploaded_file.name}' に '管理番号' が見つかりません。スキップします。")
+            workbook = _open_workbook_read_only(uploaded_file)
+        except Exception as e:
+            reporter.error(f"ファイル '{file_name}' の読み込みに失敗しました: {e}")
+            continue
+
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = [str(c).strip() if c is not None else "" for c in next(rows, ())]
+            positions = {col: i for i, col in reversed(list(enumerate(header)))}
+
+            mng_col = find_closest_column(header, ["管理番号"])
+            name_col = find_closest_column(header, ["物件名"])
+            start_col = find_closest_column(header, ["予定開始"])
+            end_col = find_closest_column(header, ["予定終了"])
+            addr_col = find_closest_column(header, ["住所", "所在地"])
+            if not mng_col:
+                reporter.warning(f"ファイル '{file_name}' に '管理番号' が見つかりません。スキップします。")
                 continue
-            dataframes.append(df)
+            if not all([name_col, start_col, end_col]):
+                reporter.error(f"ファイル '{file_name}' に必要な列（物件名・予定開始・予定終了）が見つかりません。")
+                continue
+
+            mng_pos = positions[mng_col]
+            name_pos = positions[name_col]
+            start_pos = positions[start_col]
+            end_pos = positions[end_col]
+            addr_pos = positions[addr_col] if addr_col else None
+            description_positions = [positions[col] for col in description_columns if col in positions]
+
+            for values in rows:
+                values = values + (None,) * (len(header) - len(values))
+                if values[start_pos] is None or values[end_pos] is None:
+                    continue
+
+                mng = clean_mng_num(values[mng_pos])
+                if mng in seen:
+                    continue
+                try:
+                    # 日付セルは openpyxl が datetime で返すため、文字列の場合だけ変換する
+                    start = values[start_pos]
+                    end = values[end_pos]
+                    if not isinstance(start, datetime.datetime):
+                        start = pd.to_datetime(start)
+                    if not isinstance(end, datetime.datetime):
+                        end = pd.to_datetime(end)
+                except Exception:
+                    continue
+                if pd.isna(start) or pd.isna(end):
+                    continue
+                seen.add(mng)
+
+                name = values[name_pos]
+                location = values[addr_pos] if addr_pos is not None else ""
+                if isinstance(location, str):
+                    location = location.replace("北海道札幌市", "")
+
+                yield {
+                    "Subject": f"{mng}{name if name is not None else ''}",
+                    "Start Date": start.strftime("%Y/%m/%d"),
+                    "Start Time": start.strftime("%H:%M"),
+                    "End Date": end.strftime("%Y/%m/%d"),
+                    "End Time": end.strftime("%H:%M"),
+                    "All Day Event": "True" if all_day_event else "False",
+                    "Description": " / ".join(format_description_value(values[i]) for i in description_positions),
+                    "Location": location if location is not None else "",
+                    "Private": "True" if private_event else "False",
+                    "管理番号": mng
+                }
+        finally:
+            workbook.close()
+
+def clear_parse_cache():
+    global _parse_cache_bytes
+    with _cache_lock:
+        _parse_cache.clear()
+        _header_cache.clear()
+        _parse_cache_bytes = 0
+
+def merge_dataframes(dataframes, key="管理番号", prefer="first"):
+    """
+    複数ファイルのDataFrameを管理番号で一度に外部結合します。
+
+    各ファイルを先に管理番号で重複排除し、全ファイルのキーを合わせた共通の索引に揃えてから列を組み立てます。
+    同名の列は _x/_y に分けず、prefer="first" なら先のファイル、"last" なら後のファイルの値を優先し、
+    空欄だけを他のファイルの値で補完します。
+    """
+    if len(dataframes) == 1:
+        return dataframes[0]
+
+    frames = [df.drop_duplicates(subset=key).set_index(key) for df in dataframes]
+    # pd.merge(how="outer") と同じくキーの昇順に並べる
+    index = frames[0].index.append([frame.index for frame in frames[1:]]).unique().sort_values()
+
+    columns = {}
+    for frame in (frames if prefer == "first" else reversed(frames)):
+        for col in frame.columns:
+            aligned = frame[col].reindex(index)
+            columns[col] = columns[col].combine_first(aligned) if col in columns else aligned
+
+    # 列順は最初に現れたファイルの順に揃える
+    ordered = list(dict.fromkeys(col for frame in frames for col in frame.columns))
+    merged_df = pd.DataFrame({col: columns[col] for col in ordered}, index=index)
+    merged_df.index.name = key
+    return merged_df.reset_index()
+
+def load_excel_frame(uploaded_file, reporter=None):
+    """
+    ワークブックを読み込み、管理番号を正規化したDataFrameを返します。
+    管理番号の列がない場合は None を返し、読み込みに失敗した場合は例外を送出します。
+    ファイルごとに独立しているため、別プロセスで並列に実行できます。
+    """
+    reporter = get_reporter(reporter)
+    df = read_excel_cached(uploaded_file)
+    mng_col = find_closest_column(df.columns, ["管理番号"])
+    if not mng_col:
+        file_name = getattr(uploaded_file, "name", str(uploaded_file))
+        reporter.warning(f"ファイル '{file_name}' に '管理番号' が見つかりません。スキップします。")
+        return None
+    df["管理番号"] = clean_mng_series(df[mng_col])
+    return df
+
+def _load_excel_frames(uploaded_files, reporter):
+    # いずれかのファイルの読み込みに失敗した場合は None を返します
+    if not uploaded_files:
+        reporter.warning("Excelファイルをアップロードしてください。")
+        return None
+
+    dataframes = []
+    for uploaded_file in uploaded_files:
+        try:
+            df = load_excel_frame(uploaded_file, reporter)
         except Exception as e:
-            st.error(f"ファイル '{uploaded_file.name}' の読み込みに失敗しました: {e}")
-            return pd.DataFrame()
+            file_name = getattr(uploaded_file, "name", str(uploaded_file))
+            reporter.error(f"ファイル '{file_name}' の読み込みに失敗しました: {e}")
+            return None
+        if df is not None:
+            dataframes.append(df)
+    return dataframes
 
+def process_excel_files(uploaded_files, description_columns, all_day_event, private_event, reporter=None):
+    reporter = get_reporter(reporter)
+    dataframes = _load_excel_frames(uploaded_files, reporter)
+    if dataframes is None:
+        return pd.DataFrame()
+    return build_event_frame(dataframes, description_columns, all_day_event, private_event, reporter)
+
+def process_excel_files_typed(uploaded_files, description_columns, reporter=None, route_columns=()):
+    """
+    process_excel_files と同じ処理で、日時を datetime64 の列のまま返します（build_typed_event_frame を参照）。
+    """
+    reporter = get_reporter(reporter)
+    dataframes = _load_excel_frames(uploaded_files, reporter)
+    if dataframes is None:
+        return pd.DataFrame()
+    return build_typed_event_frame(dataframes, description_columns, reporter, route_columns)
+
+def process_excel_files_batch(uploaded_files, description_columns, all_day_event, private_event, reporter=None,
+                              route_columns=()):
+    """
+    process_excel_files と同じ処理で、列ごとの配列にまとめた EventBatch を返します（event_batch.py を参照）。
+    payloads.iter_event_payloads・routing・送信処理にそのまま渡せます。
+    """
+    typed = process_excel_files_typed(uploaded_files, description_columns, reporter, route_columns)
+    return EventBatch.from_frame(typed, all_day_event, private_event)
+
+def build_event_frame(dataframes, description_columns, all_day_event, private_event, reporter=None):
+    """
+    load_excel_frame で読み込んだDataFrameを管理番号で結合し、イベント一覧のDataFrameを返します。
+    日時は "Start Date" などの文字列の列になります。
+    """
+    typed = build_typed_event_frame(dataframes, description_columns, reporter)
+    if typed.empty:
+        return pd.DataFrame()
+    return format_event_frame(typed, all_day_event, private_event)
+
+def build_typed_event_frame(dataframes, description_columns, reporter=None, route_columns=()):
+    """
+    load_excel_frame で読み込んだDataFrameを管理番号で結合し、
+    Subject・Start・End（datetime64）・Description・Location・管理番号の列を持つDataFrameを返します。
+    payloads.build_event_payloads にそのまま渡せます。
+    route_columns に指定した元の列は、登録先の振り分け（routing.py）に使えるよう値のまま末尾に残します。
+    """
+    reporter = get_reporter(reporter)
     if not dataframes:
         return pd.DataFrame()
 
-    merged_df = dataframes[0]
-    for df in dataframes[1:]:
-        merged_df = pd.merge(merged_df, df, on="管理番号", how="outer")
+    merged_df = merge_dataframes(dataframes)
 
-    merged_df["管理番号"] = merged_df["管理番号"].apply(clean_mng_num)
+    merged_df["管理番号"] = clean_mng_series(merged_df["管理番号"])
     merged_df.drop_duplicates(subset="管理番号", inplace=True)
 
     name_col = find_closest_column(merged_df.columns, ["物件名"])
@@ -62,41 +363,77 @@ def process_excel_files(uploaded_files, description_columns, all_day_event, priv
     addr_col = find_closest_column(merged_df.columns, ["住所", "所在地"])
 
     if not all([name_col, start_col, end_col]):
-        st.error("必要な列（物件名・予定開始・予定終了）が見つかりません。")
+        reporter.error("必要な列（物件名・予定開始・予定終了）が見つかりません。")
         return pd.DataFrame()
 
-    merged_df = merged_df.dropna(subset=[start_col, end_col])
+    merged_df = merged_df.dropna(subset=[start_col, end_col]).reset_index(drop=True)
 
-    output = []
-    for _, row in merged_df.iterrows():
-        mng = clean_mng_num(row["管理番号"])
-        name = row.get(name_col, "")
-        subj = f"{mng}{name}"
+    # 日時に変換できない行は除外
+    start = to_datetime_series(merged_df[start_col])
+    end = to_datetime_series(merged_df[end_col])
+    valid = start.notna() & end.notna()
+    if not valid.all():
+        merged_df = merged_df[valid].reset_index(drop=True)
+        start = start[valid].reset_index(drop=True)
+        end = end[valid].reset_index(drop=True)
 
-        try:
-            start = pd.to_datetime(row[start_col])
-            end = pd.to_datetime(row[end_col])
-        except Exception:
-            continue
+    if merged_df.empty:
+        return pd.DataFrame()
+
+    mng = clean_mng_series(merged_df["管理番号"])
+    subj = mng + merged_df[name_col].map(str)
+
+    if addr_col:
+        location = merged_df[addr_col]
+        if is_string_dtype(location.dtype):
+            # 文字列以外の値（NaNや数値）はそのまま残す
+            try:
+                replaced = location.str.replace("北海道札幌市", "", regex=False)
+                location = replaced.where(replaced.notna(), location)
+            except AttributeError:
+                pass # 文字列を含まない列
+
+    else:
+        location = pd.Series("", index=merged_df.index)
+
+    description_parts = [
+        format_description_series(merged_df[col]) for col in description_columns if col in merged_df.columns
+    ]
+    if not description_parts:
+        description = pd.Series("", index=merged_df.index)
+    elif len(description_parts) == 1:
+        description = description_parts[0]
+    else:
+        description = description_parts[0].str.cat(description_parts[1:], sep=" / ")
+
+    typed = pd.DataFrame({
+        "Subject": subj.tolist(),
+        "Start": start,
+        "End": end,
+        "Description": description.tolist(),
+        "Location": location.tolist(),
+        "管理番号": mng.tolist()
+    })
+    for col in route_columns:
+        if col in merged_df.columns and col not in typed.columns:
+            typed[col] = merged_df[col].tolist()
+    return typed
 
-        location = row.get(addr_col, "")
-        if isinstance(location, str) and "北海道札幌市" in location:
-            location = location.replace("北海道札幌市", "")
-
-        description = " / ".join(
-            [format_description_value(row.get(col)) for col in description_columns if col in row]
-        )
-
-        output.append({
-            "Subject": subj,
-            "Start Date": start.strftime("%Y/%m/%d"),
-            "Start Time": start.strftime("%H:%M"),
-            "End Date": end.strftime("%Y/%m/%d"),
-            "End Time": end.strftime("%H:%M"),
-            "All Day Event": "True" if all_day_event else "False",
-            "Description": description,
-            "Location": location,
-            "Private": "True" if private_event else "False"
-        })
-
-    return pd.DataFrame(output)
+def format_event_frame(typed, all_day_event, private_event):
+    """
+    build_typed_event_frame の結果を、日付・時刻を文字列にした従来のイベント一覧の形式に変換します。
+    """
+    start = typed["Start"]
+    end = typed["End"]
+    return pd.DataFrame({
+        "Subject": typed["Subject"].tolist(),
+        "Start Date": start.dt.strftime("%Y/%m/%d").tolist(),
+        "Start Time": start.dt.strftime("%H:%M").tolist(),
+        "End Date": end.dt.strftime("%Y/%m/%d").tolist(),
+        "End Time": end.dt.strftime("%H:%M").tolist(),
+        "All Day Event": "True" if all_day_event else "False",
+        "Description": typed["Description"].tolist(),
+        "Location": typed["Location"].tolist(),
+        "Private": "True" if private_event else "False",
+        "管理番号": typed["管理番号"].tolist()
+    })
@@ -0,0 +1,191 @@
+# instrumentation.py
+#
+# 登録・削除の1回の実行について、処理段階ごとの所要時間（経過時間・CPU時間）、
+# メソッドごとのAPI呼び出し回数と応答時間の分布（p50/p95/p99）、再試行・スロットリングの回数、
+# メモリ使用量を記録し、画面表示やJSON出力に使える形にまとめます。
+#
+# 記録中の RunMetrics は contextvars で保持します。ApiExecutor はワーカースレッドにも
+# コンテキストを引き継ぐため、呼び出し側は activate() で囲むだけでAPI呼び出しが記録されます。
+
+import contextvars
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+LATENCY_PERCENTILES = (50, 95, 99) # 応答時間の分布として出力するパーセンタイル
+PROFILE_TOP_FUNCTIONS = 30 # プロファイル結果に残す関数の数（累積時間順）
+
+_current_metrics = contextvars.ContextVar("run_metrics", default=None)
+
+def current_metrics():
+    """
+    現在のコンテキストで記録中の RunMetrics を返します。記録中でなければ None を返します。
+    """
+    return _current_metrics.get()
+
+def percentile(sorted_values, p):
+    """
+    昇順に並んだ値から p パーセンタイル（最近順位法）を返します。
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+def peak_memory_mb():
+    """
+    プロセスの起動以降の最大常駐メモリ（MB）を返します。取得できない環境では None を返します。
+    Streamlit のように長く動くプロセスでは、この実行ではなく過去の実行を含めた最大値です。
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux はKB、macOS はバイト単位
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def current_memory_mb():
+    """
+    プロセスの現在の常駐メモリ（MB）を返します。/proc のない環境では None を返します。
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+
+def describe_request(request):
+    """
+    リクエストのメソッド名（例: calendar.events.insert）と、バッチの場合は中のメソッド名のリストを返します。
+    """
+    sub_requests = getattr(request, "_requests", None)
+    if sub_requests is not None:
+        return "batch", [getattr(r, "methodId", None) or "unknown" for r in sub_requests.values()]
+    return getattr(request, "methodId", None) or "unknown", []
+
+class RunMetrics:
+    """
+    1回の実行の計測結果です。複数のスレッドから同時に記録できます。
+    CPU時間はプロセス全体の値のため、他のセッションが同時に処理している場合はその分も含みます。
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.stages = {} # 段階名 -> {"wall", "cpu", "count"}
+        self.api_calls = {} # メソッド名 -> HTTP呼び出し回数（バッチは "batch"）
+        self.batched_calls = {} # メソッド名 -> バッチ内で送信したサブリクエスト数
+        self.latencies = {} # メソッド名 -> 応答時間（秒）のリスト
+        self.counters = {"retries": 0, "throttled": 0, "failed": 0}
+        self.profiles = {} # 段階名 -> cProfile の結果（テキスト）
+        self.process_peak_memory_mb = None # プロセスの起動以降の最大値（この実行だけの値ではありません）
+        self.memory_delta_mb = None # 開始から終了までの常駐メモリの増減
+        self._memory_started = current_memory_mb()
+        self._wall_started = time.perf_counter()
+        self._wall_total = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def activate(self):
+        """
+        このブロック内（と ApiExecutor のワーカースレッド）のAPI呼び出しをこの RunMetrics に記録します。
+        """
+        token = _current_metrics.set(self)
+        try:
+            yield self
+        finally:
+            _current_metrics.reset(token)
+
+    @contextmanager
+    def stage(self, name, profile=False):
+        """
+        ブロックの経過時間とCPU時間を段階 name として記録します。
+        profile が True の場合は cProfile で呼び出しスレッドの処理を記録します。
+        """
+        profiler = None
+        if profile:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError: # 他のプロファイラが動作中
+                profiler = None
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            if profiler is not None:
+                profiler.disable()
+                self.profiles[name] = _format_profile(profiler)
+            with self._lock:
+                stage = self.stages.setdefault(name, {"wall": 0.0, "cpu": 0.0, "count": 0})
+                stage["wall"] += wall
+                stage["cpu"] += cpu
+                stage["count"] += 1
+
+    def record_call(self, request, seconds):
+        method, sub_methods = describe_request(request)
+        with self._lock:
+            self.api_calls[method] = self.api_calls.get(method, 0) + 1
+            self.latencies.setdefault(method, []).append(seconds)
+            for sub_method in sub_methods:
+                self.batched_calls[sub_method] = self.batched_calls.get(sub_method, 0) + 1
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def finish(self):
+        """
+        実行全体の経過時間とメモリ使用量を確定します。
+        """
+        self._wall_total = time.perf_counter() - self._wall_started
+        self.process_peak_memory_mb = peak_memory_mb()
+        memory = current_memory_mb()
+        if memory is not None and self._memory_started is not None:
+            self.memory_delta_mb = round(memory - self._memory_started, 1)
+        return self
+
+    def to_dict(self):
+        with self._lock:
+            latency = {}
+            for method, values in self.latencies.items():
+                values = sorted(values)
+                latency[method] = {"count": len(values), "mean": sum(values) / len(values)}
+                for p in LATENCY_PERCENTILES:
+                    latency[method][f"p{p}"] = percentile(values, p)
+            return {
+                "name": self.name,
+                "started_at": self.started_at,
+                "wall_seconds": self._wall_total if self._wall_total is not None else time.perf_counter() - self._wall_started,
+                "process_peak_memory_mb": self.process_peak_memory_mb,
+                "memory_delta_mb": self.memory_delta_mb,
+                "stages": {name: dict(stage) for name, stage in self.stages.items()},
+                "api_calls": dict(self.api_calls),
+                "batched_calls": dict(self.batched_calls),
+                "latency_seconds": latency,
+                "counters": dict(self.counters),
+                "profiles": dict(self.profiles),
+            }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+
+def _format_profile(profiler):
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+    return out.getvalue()
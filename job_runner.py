@@ -0,0 +1,365 @@
+# job_runner.py
+#
+# イベントの登録・削除を Streamlit のスクリプト実行から切り離して実行するバックグラウンドジョブです。
+# ジョブと行ごとの状態（pending / done / failed）は SQLite に保存するため、
+# 再実行・ブラウザの再読み込み・プロセスの再起動をまたいで進捗を確認でき、
+# 中断したジョブは未処理の行（チェックポイント）から再開できます。
+# 登録する行には行ごとに決まったイベントIDを付けるため、記録前に中断したバッチを再送しても重複して登録されません。
+
+import itertools
+import json
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+from googleapiclient.errors import HttpError
+
+from calendar_utils import add_events_to_calendar_batch, delete_events_by_ids, get_calendar_service
+from instrumentation import RunMetrics
+
+JOB_DB_PATH = "jobs.sqlite3" # ジョブの状態を保存するファイル名
+JOB_MAX_WORKERS = 2 # 同時に実行するジョブ数
+JOB_CHECKPOINT_ROWS = 500 # 1回に読み込んで送信する行数（結果はバッチごとに記録します）
+
+# ジョブの状態
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+JOB_INTERRUPTED = "interrupted"
+JOB_RESUMABLE_STATUSES = (JOB_INTERRUPTED, JOB_FAILED, JOB_CANCELLED) # 再開できるジョブの状態
+
+# 行ごとに状態を記録するジョブの種類（登録・確認済みイベントの削除）
+ROW_JOB_KINDS = ("import", "delete_events")
+
+# 行の状態
+ROW_PENDING = "pending"
+ROW_DONE = "done"
+ROW_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    calendar_id TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    processed INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_rows (
+    job_id TEXT NOT NULL,
+    row_index INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    label TEXT,
+    payload TEXT NOT NULL,
+    event_id TEXT,
+    error TEXT,
+    PRIMARY KEY (job_id, row_index)
+);
+CREATE INDEX IF NOT EXISTS job_rows_status ON job_rows (job_id, status);
+"""
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+class JobStore:
+    """
+    ジョブと行ごとの状態を保存する SQLite ストアです。スレッドごとに接続を開きます。
+    """
+
+    def __init__(self, path=JOB_DB_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # ブロックを抜けるときにコミットして接続を閉じる
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create_job(self, kind, calendar_id, params, labeled_events=()):
+        """
+        (表示名, イベント本体) のイテラブルを pending の行に持つ待機中のジョブを作成し、ジョブIDを返します。
+        ジョブと行は1つのトランザクションで保存するため、行の追加中に中断された場合（画面の再実行など）は
+        何も残らず、一部の行だけを持つジョブが待機中のまま残ることはありません。
+        """
+        job_id = uuid.uuid4().hex[:12]
+        now = _now()
+        total = 0
+        indexed = enumerate(labeled_events)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, calendar_id, params, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, calendar_id, json.dumps(params, ensure_ascii=False), JOB_QUEUED, now, now)
+            )
+            while True:
+                chunk = list(itertools.islice(indexed, JOB_CHECKPOINT_ROWS))
+                if not chunk:
+                    break
+                conn.executemany(
+                    "INSERT INTO job_rows (job_id, row_index, status, label, payload) VALUES (?, ?, ?, ?, ?)",
+                    [(job_id, i, ROW_PENDING, label, json.dumps(event_data, ensure_ascii=False, default=str))
+                     for i, (label, event_data) in chunk]
+                )
+                total += len(chunk)
+            conn.execute("UPDATE jobs SET total = ? WHERE id = ?", (total, job_id))
+        return job_id
+
+    def set_status(self, job_id, status, error=None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, error, _now(), job_id)
+            )
+
+    def transition(self, job_id, from_statuses, status):
+        """
+        ジョブの状態が from_statuses のいずれかの場合だけ status に変更し、変更したかを返します。
+        確認と変更を1つの UPDATE で行うため、複数のセッションから同時に呼ばれても成功するのは1回だけです。
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, error = NULL, updated_at = ? WHERE id = ? AND status IN (%s)"
+                % ",".join("?" * len(from_statuses)), (status, _now(), job_id, *from_statuses)
+            )
+        return cursor.rowcount == 1
+
+    def pending_rows(self, job_id, limit=JOB_CHECKPOINT_ROWS):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT row_index, label, payload FROM job_rows WHERE job_id = ? AND status = ? ORDER BY row_index LIMIT ?",
+                (job_id, ROW_PENDING, limit)
+            ).fetchall()
+        return [(row["row_index"], row["label"], json.loads(row["payload"])) for row in rows]
+
+    def mark_rows(self, job_id, updates):
+        """
+        updates は (row_index, 状態, イベントID, エラー) のリストです。
+        """
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE job_rows SET status = ?, event_id = ?, error = ? WHERE job_id = ? AND row_index = ?",
+                [(status, event_id, error, job_id, row_index) for row_index, status, event_id, error in updates]
+            )
+            conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (_now(), job_id))
+
+    def reset_failed_rows(self, job_id):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE job_rows SET status = ?, error = NULL WHERE job_id = ? AND status = ?",
+                (ROW_PENDING, job_id, ROW_FAILED)
+            )
+
+    def get_job(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            counts = dict(conn.execute(
+                "SELECT status, COUNT(*) FROM job_rows WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall())
+        return self._to_job(row, counts)
+
+    def list_jobs(self, limit=20):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+            if not rows:
+                return []
+            counts = {}
+            for job_id, status, count in conn.execute(
+                "SELECT job_id, status, COUNT(*) FROM job_rows WHERE job_id IN (%s) GROUP BY job_id, status"
+                % ",".join("?" * len(rows)), [row["id"] for row in rows]
+            ).fetchall():
+                counts.setdefault(job_id, {})[status] = count
+        return [self._to_job(row, counts.get(row["id"], {})) for row in rows]
+
+    def failed_rows(self, job_id, limit=100):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT label, error FROM job_rows WHERE job_id = ? AND status = ? ORDER BY row_index LIMIT ?",
+                (job_id, ROW_FAILED, limit)
+            ).fetchall()
+        return [(row["label"], row["error"]) for row in rows]
+
+    def mark_interrupted(self):
+        """
+        前回のプロセスで実行中・待機中のまま終了したジョブを中断扱いにします。
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE status IN (?, ?)",
+                (JOB_INTERRUPTED, _now(), JOB_QUEUED, JOB_RUNNING)
+            )
+
+    @staticmethod
+    def _to_job(row, counts):
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        if job["kind"] in ROW_JOB_KINDS:
+            # 行ごとのジョブの進捗は行の状態から集計します
+            job["done"] = counts.get(ROW_DONE, 0)
+            job["failed"] = counts.get(ROW_FAILED, 0)
+            job["pending"] = counts.get(ROW_PENDING, 0)
+            job["processed"] = job["done"] + job["failed"]
+        return job
+
+class JobRunner:
+    """
+    ジョブをワーカースレッドで実行します。プロセスにつき1つを get_job_runner() で共有します。
+    """
+
+    def __init__(self, store, max_workers=JOB_MAX_WORKERS):
+        self.store = store
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="calendar-job")
+        self._cancelled = set()
+        self._lock = threading.Lock()
+        self.metrics = {} # ジョブID -> 直近の実行の RunMetrics（プロセス内のみ保持）
+        self.store.mark_interrupted()
+
+    def submit_import(self, creds, calendar_id, labeled_events):
+        """
+        (表示名, イベント本体) のイテラブルを登録するジョブを開始し、ジョブIDを返します。
+        """
+        job_id = self.store.create_job("import", calendar_id, {}, labeled_events)
+        self._start(job_id, creds)
+        return job_id
+
+    def submit_delete_events(self, creds, calendar_id, events):
+        """
+        preview_events_in_range で確認済みのイベントを、一覧を取得し直さずに削除するジョブを開始し、ジョブIDを返します。
+        """
+        job_id = self.store.create_job(
+            "delete_events", calendar_id, {}, ((event.get("summary", ""), event) for event in events)
+        )
+        self._start(job_id, creds)
+        return job_id
+
+    def resume(self, job_id, creds, retry_failed=False):
+        """
+        中断・失敗・停止したジョブを未処理の行から再開し、再開したかを返します。
+        retry_failed が True の場合は失敗した行も再送します。
+        既に待機中・実行中のジョブ（再開ボタンの二度押しや、別のセッションが先に再開した場合）は再開しません。
+        """
+        if not self.store.transition(job_id, JOB_RESUMABLE_STATUSES, JOB_QUEUED):
+            return False
+        if retry_failed:
+            self.store.reset_failed_rows(job_id)
+        self._start(job_id, creds)
+        return True
+
+    def cancel(self, job_id):
+        """
+        ジョブの停止を要求します。送信中のチェックポイントが終わった時点で停止します。
+        """
+        with self._lock:
+            self._cancelled.add(job_id)
+
+    def _is_cancelled(self, job_id):
+        with self._lock:
+            return job_id in self._cancelled
+
+    def _start(self, job_id, creds):
+        # 呼び出し元でジョブを待機中（JOB_QUEUED）にしておくこと
+        with self._lock:
+            self._cancelled.discard(job_id)
+        self._pool.submit(self._run, job_id, creds)
+
+    def _run(self, job_id, creds):
+        if not self.store.transition(job_id, (JOB_QUEUED,), JOB_RUNNING):
+            return # 待機中に中断扱いになったジョブなど
+        job = self.store.get_job(job_id)
+        metrics = self.metrics[job_id] = RunMetrics(f"{job['kind']} {job_id}")
+        try:
+            with metrics.activate(), metrics.stage(job["kind"]):
+                service = get_calendar_service(creds)
+                if job["kind"] == "import":
+                    self._run_import(job_id, service, job["calendar_id"])
+                elif job["kind"] == "delete_events":
+                    self._run_delete_events(job_id, service, job["calendar_id"])
+                else:
+                    raise ValueError(f"このバージョンでは実行できない種類のジョブです: {job['kind']}")
+        except Exception as e:
+            self.store.set_status(job_id, JOB_FAILED, error=str(e))
+            return
+        finally:
+            metrics.finish()
+        self.store.set_status(job_id, JOB_CANCELLED if self._is_cancelled(job_id) else JOB_DONE)
+
+    def _run_import(self, job_id, service, calendar_id):
+        while not self._is_cancelled(job_id):
+            rows = self.store.pending_rows(job_id)
+            if not rows:
+                break
+            updates = []
+
+            def record(result):
+                row_index = rows[result["index"]][0]
+                event_id = import_event_id(job_id, row_index)
+                error = result["error"]
+                # 409 は同じIDのイベントが登録済み（記録前に中断したバッチの再送）のため成功として扱います
+                if result["success"] or (isinstance(error, HttpError) and error.resp.status == 409):
+                    updates.append((row_index, ROW_DONE, event_id, None))
+                else:
+                    updates.append((row_index, ROW_FAILED, None, str(error)))
+
+            def checkpoint(processed):
+                # チェックポイント: バッチが終わるたびに送信済みの行を記録し、再開時に再送しないようにします
+                if updates:
+                    self.store.mark_rows(job_id, updates[:])
+                    updates.clear()
+
+            add_events_to_calendar_batch(
+                service, calendar_id,
+                (dict(event_data, id=import_event_id(job_id, row_index)) for row_index, _, event_data in rows),
+                result_callback=record, progress_callback=checkpoint
+            )
+            checkpoint(None)
+
+    def _run_delete_events(self, job_id, service, calendar_id):
+        while not self._is_cancelled(job_id):
+            rows = self.store.pending_rows(job_id)
+            if not rows:
+                break
+            result = delete_events_by_ids(service, calendar_id, [event for _, _, event in rows])
+            failures = {event["id"]: str(error) for event, error in result["failures"]}
+            updates = [
+                (row_index, ROW_FAILED, event["id"], failures[event["id"]]) if event["id"] in failures
+                else (row_index, ROW_DONE, event["id"], None)
+                for row_index, _, event in rows
+            ]
+            # チェックポイント: 削除済みの行を記録し、再開時に再送しないようにします
+            self.store.mark_rows(job_id, updates)
+
+def import_event_id(job_id, row_index):
+    """
+    登録ジョブの行に付けるイベントIDです。Calendar API のIDに使える文字（0-9・a-v）だけで、行ごとに決まった値になります。
+    """
+    return f"{job_id}{row_index:08x}"
+
+_runner = None
+_runner_lock = threading.Lock()
+
+def get_job_runner():
+    """
+    プロセス内で共有する JobRunner を返します。
+    """
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner(JobStore())
+        return _runner
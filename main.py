@@ -1,9 +1,24 @@
 import streamlit as st
-import pandas as pd
+import json
+import re
 from datetime import datetime, date, timedelta
-from excel_parser import process_excel_files
-from calendar_utils import authenticate_google, add_event_to_calendar, delete_events_from_calendar
-from googleapiclient.discovery import build
+from excel_parser import process_excel_files_batch, read_excel_headers, iter_event_records, file_content_hash
+from payloads import iter_event_payloads
+from calendar_utils import (
+    authenticate_google, build_event_data, add_events_to_calendar_batch, delete_events_from_calendar,
+    attach_sync_properties, get_calendar_service, get_editable_calendars,
+    invalidate_calendar_list_cache, preview_events_in_range
+)
+from reporting import StreamlitReporter
+from instrumentation import RunMetrics
+from calendar_mirror import get_calendar_mirror
+from routing import (
+    ROUTE_LOCATION_COLUMN, ROUTE_WARD_PATTERN, extract_route_keys, register_events, register_routed_events,
+    route_by_rules, route_by_value, split_batch
+)
+from job_runner import (
+    get_job_runner, ROW_JOB_KINDS, JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED, JOB_CANCELLED, JOB_INTERRUPTED
+)
 
 st.set_page_config(page_title="Googleカレンダー登録・削除ツール", layout="wide")
 st.title("📅 Googleカレンダー一括イベント登録・削除")
@@ -17,17 +32,13 @@ if not creds:
     st.warning("Google認証を完了してください。")
     st.stop()
 
-# 認証が完了したらサービスをビルド
+# 認証が完了したらサービスを取得（認証情報ごとにキャッシュされ、再実行時は通信しません）
+if st.button("🔄 カレンダー一覧を再取得"):
+    invalidate_calendar_list_cache()
+
 try:
-    service = build("calendar", "v3", credentials=creds)
-    calendar_list = service.calendarList().list().execute()
-    
-    # 読み取り専用カレンダーを除外
-    editable_calendar_options = {
-        cal['summary']: cal['id'] 
-        for cal in calendar_list['items'] 
-        if cal.get('accessRole') != 'reader'
-    }
+    service = get_calendar_service(creds)
+    editable_calendar_options = get_editable_calendars(service)
     st.session_state['editable_calendar_options'] = editable_calendar_options
 
 except Exception as e:
@@ -37,7 +48,98 @@ except Exception as e:
 
 
 # ファイルアップロードとイベント設定、イベント削除のタブを作成
-tabs = st.tabs(["1. ファイルのアップロード", "2. イベントの登録", "3. イベントの削除"])
+tabs = st.tabs(["1. ファイルのアップロード", "2. イベントの登録", "3. イベントの削除", "4. ジョブの状況"])
+
+JOB_STATUS_LABELS = {
+    JOB_QUEUED: "待機中",
+    JOB_RUNNING: "実行中",
+    JOB_DONE: "完了",
+    JOB_FAILED: "失敗",
+    JOB_CANCELLED: "停止",
+    JOB_INTERRUPTED: "中断",
+}
+
+STAGE_LABELS = {
+    "parse": "Excelの読み込み・結合",
+    "build": "イベント本体の作成",
+    "enqueue": "ジョブへの行の登録",
+    "stream": "読み込みながら登録",
+    "sync": "差分同期",
+    "insert": "一括登録",
+    "route_split": "登録先の振り分け",
+    "route": "複数カレンダーへの振り分け登録",
+    "import": "登録ジョブ",
+    "delete": "削除",
+}
+
+def show_run_metrics(report, key):
+    # 実行ごとの計測結果（段階ごとの所要時間・API呼び出し・応答時間）を表示します
+    with st.expander(f"📊 計測結果（{report['name']}、{report['wall_seconds']:.1f} 秒）"):
+        st.table([
+            {"段階": STAGE_LABELS.get(name, name), "経過時間(秒)": round(stage["wall"], 3),
+             "CPU時間(秒)": round(stage["cpu"], 3), "回数": stage["count"]}
+            for name, stage in report["stages"].items()
+        ])
+        if report["api_calls"]:
+            st.table([
+                {"メソッド": method, "呼び出し回数": report["api_calls"][method],
+                 **{f"{p}(ms)": round(latency[p] * 1000, 1) for p in ("mean", "p50", "p95", "p99")}}
+                for method, latency in report["latency_seconds"].items()
+            ])
+        if report["batched_calls"]:
+            st.caption("バッチで送信したリクエスト: " + " / ".join(f"{m} {n} 件" for m, n in report["batched_calls"].items()))
+        counters = report["counters"]
+        st.caption(
+            f"再試行 {counters['retries']} 回 / スロットリング {counters['throttled']} 回 / 失敗 {counters['failed']} 回 / "
+            f"メモリ増減 {report['memory_delta_mb']} MB / プロセスの最大メモリ（起動以降） {report['process_peak_memory_mb']} MB"
+        )
+        for name, profile in report["profiles"].items():
+            st.caption(f"プロファイル（{STAGE_LABELS.get(name, name)}）")
+            st.code(profile, language=None)
+        st.download_button(
+            "JSONで保存", json.dumps(report, ensure_ascii=False, indent=2),
+            file_name=f"run_metrics_{report['started_at'].replace(':', '')}.json", mime="application/json", key=key
+        )
+
+@st.fragment(run_every=2)
+def show_jobs():
+    # 2秒ごとにこの部分だけを再描画し、画面をブロックせずに進捗を表示します
+    runner = get_job_runner()
+    jobs = runner.store.list_jobs()
+    if not jobs:
+        st.info("バックグラウンドジョブはまだありません。")
+        return
+
+    for job in jobs:
+        kind_label = "登録" if job['kind'] == "import" else "削除"
+        with st.container(border=True):
+            st.write(f"**{kind_label}ジョブ {job['id']}** - {JOB_STATUS_LABELS.get(job['status'], job['status'])}（開始 {job['created_at']}）")
+            if job['total']:
+                st.progress(min(job['processed'] / job['total'], 1.0), text=f"{job['processed']} / {job['total']} 件")
+            if job['kind'] in ROW_JOB_KINDS and job['failed']:
+                st.caption(f"失敗 {job['failed']} 件")
+                for label, error in runner.store.failed_rows(job['id'], limit=5):
+                    st.caption(f"- {label}: {error}")
+            if job['error']:
+                st.error(job['error'])
+            if job['status'] not in (JOB_QUEUED, JOB_RUNNING) and job['id'] in runner.metrics:
+                show_run_metrics(runner.metrics[job['id']].to_dict(), key=f"metrics_job_{job['id']}")
+
+            col1, col2 = st.columns(2)
+            if job['status'] in (JOB_QUEUED, JOB_RUNNING) and job['kind'] in ROW_JOB_KINDS:
+                col1.button("停止", key=f"cancel_job_{job['id']}", on_click=runner.cancel, args=(job['id'],))
+            if job['status'] in (JOB_INTERRUPTED, JOB_FAILED, JOB_CANCELLED) and job['kind'] in ROW_JOB_KINDS:
+                col1.button("再開", key=f"resume_job_{job['id']}", on_click=runner.resume, args=(job['id'], creds))
+                if job['kind'] in ROW_JOB_KINDS and job['failed']:
+                    col2.button(
+                        "失敗した行も再送して再開", key=f"retry_job_{job['id']}",
+                        on_click=runner.resume, args=(job['id'], creds), kwargs={"retry_failed": True}
+                    )
+
+# 他のタブの st.stop() で描画が止まらないよう、ジョブの状況タブを先に描画します
+with tabs[3]:
+    st.header("バックグラウンドジョブ")
+    show_jobs()
 
 with tabs[0]:
     st.header("ファイルをアップロード")
@@ -47,9 +149,8 @@ with tabs[0]:
     if uploaded_files:
         for file in uploaded_files:
             try:
-                df_temp = pd.read_excel(file, engine="openpyxl")
-                df_temp.columns = [str(c).strip() for c in df_temp.columns]
-                description_columns_pool.update(df_temp.columns)
+                # 列名の収集には1行目だけを読み込みます（結果はファイル内容ごとにキャッシュ）
+                description_columns_pool.update(read_excel_headers(file))
             except Exception as e:
                 st.warning(f"{file.name} の読み込みに失敗しました: {e}")
         # セッションステートにdescription_columns_poolを保存
@@ -79,6 +180,12 @@ with tabs[1]:
     st.subheader("📝 イベント設定")
     all_day_event = st.checkbox("終日イベントとして登録", value=False)
     private_event = st.checkbox("非公開イベントとして登録", value=True)
+    streaming_mode = st.checkbox("大容量ファイルモード（1行ずつ読み込みながら登録）", value=False)
+    sync_mode = st.checkbox("差分同期モード（登録済みのイベントは変更がある場合のみ更新し、重複登録しない）", value=False, disabled=streaming_mode)
+    delete_orphans = st.checkbox("ファイルに存在しない登録済みイベントを削除する", value=False, disabled=not sync_mode)
+    routing_mode = st.checkbox("行ごとに登録先のカレンダーを振り分ける（住所の区・ルール表）", value=False, disabled=streaming_mode) and not streaming_mode
+    background_mode = st.checkbox("バックグラウンドジョブとして実行（画面の再読み込みや離脱後も処理を継続）", value=True, disabled=sync_mode or routing_mode)
+    profile_parse = st.checkbox("Excel読み込みの処理時間を詳しく記録する（cProfile）", value=False)
     
     # セッションステートからdescription_columns_poolを取得
     description_columns = st.multiselect(
@@ -93,55 +200,232 @@ with tabs[1]:
     selected_calendar_name = st.selectbox("登録先カレンダーを選択", list(st.session_state['editable_calendar_options'].keys()), key="reg_calendar_select")
     calendar_id = st.session_state['editable_calendar_options'][selected_calendar_name]
 
+    if routing_mode:
+        st.subheader("🔀 登録先の振り分け")
+        calendar_names = list(st.session_state['editable_calendar_options'].keys())
+        location_label = "場所（住所・所在地）"
+        route_column_labels = [location_label] + sorted(st.session_state.get('description_columns_pool', []))
+
+        def route_column_of(label):
+            return ROUTE_LOCATION_COLUMN if label == location_label else label
+
+        route_method = st.radio("振り分け方法", ["列の値で振り分け", "ルール表で振り分け"], horizontal=True)
+        if route_method == "列の値で振り分け":
+            route_column = route_column_of(st.selectbox("振り分けに使う列", route_column_labels))
+            route_pattern = st.text_input("値を取り出す正規表現（空欄なら値そのもの）", value=ROUTE_WARD_PATTERN).strip()
+            route_columns = [route_column]
+        else:
+            edited_rules = st.data_editor(
+                [{"列": location_label, "パターン（正規表現）": "^中央区", "登録先": None}],
+                num_rows="dynamic", key="route_rules_editor",
+                column_config={
+                    "列": st.column_config.SelectboxColumn(options=route_column_labels, required=True),
+                    "登録先": st.column_config.SelectboxColumn(options=calendar_names),
+                }
+            )
+            route_rules = [
+                (route_column_of(rule["列"]), rule["パターン（正規表現）"], st.session_state['editable_calendar_options'][rule["登録先"]])
+                for rule in edited_rules if rule.get("列") and rule.get("パターン（正規表現）") and rule.get("登録先")
+            ]
+            route_columns = sorted({column for column, _, _ in route_rules})
+        route_unmatched = st.checkbox(f"振り分け先のない行は「{selected_calendar_name}」に登録する", value=False)
+
+        # 読み込みは1回だけ行い、候補の確認と登録で同じ結果を使います
+        # （同じ名前で内容の異なるファイルを選び直した場合に古い結果を使わないよう、内容のハッシュで判定します）
+        routing_conditions = (
+            tuple(file_content_hash(f.getvalue()) for f in st.session_state['uploaded_files']),
+            tuple(description_columns), tuple(route_columns), all_day_event, private_event
+        )
+
+        def load_routing_batch():
+            cached = st.session_state.get('routing_batch')
+            if cached is None or cached['conditions'] != routing_conditions:
+                batch = process_excel_files_batch(st.session_state['uploaded_files'], description_columns, all_day_event,
+                                                  private_event, StreamlitReporter(), route_columns=route_columns)
+                cached = st.session_state['routing_batch'] = {"conditions": routing_conditions, "batch": batch}
+            return cached['batch']
+
+        if route_method == "列の値で振り分け":
+            if st.button("振り分け先の候補を読み込む"):
+                with st.spinner("イベントデータを処理中..."):
+                    load_routing_batch()
+            cached = st.session_state.get('routing_batch')
+            route_mapping = {}
+            if cached is not None and cached['conditions'] == routing_conditions and len(cached['batch']):
+                try:
+                    key_counts = extract_route_keys(cached['batch'], route_column, route_pattern or None).value_counts()
+                except re.error as e:
+                    st.error(f"正規表現が正しくありません: {e}")
+                    key_counts = None
+                if key_counts is not None:
+                    # カレンダー名に値を含むものを既定の登録先にします
+                    edited_mapping = st.data_editor(
+                        [{"値": key, "件数": int(count),
+                          "登録先": next((name for name in calendar_names if key in name), None)}
+                         for key, count in key_counts.items()],
+                        key="route_mapping_editor", disabled=["値", "件数"],
+                        column_config={"登録先": st.column_config.SelectboxColumn(options=calendar_names)}
+                    )
+                    route_mapping = {
+                        row["値"]: st.session_state['editable_calendar_options'][row["登録先"]]
+                        for row in edited_mapping if row.get("登録先")
+                    }
+            else:
+                st.caption("「振り分け先の候補を読み込む」で、列の値ごとに登録先を選べます。")
+
     # データ処理と登録
     st.subheader("➡️ イベント登録")
-    if st.button("Googleカレンダーに登録する"):
-        with st.spinner("イベントデータを処理中..."):
-            df = process_excel_files(st.session_state['uploaded_files'], description_columns, all_day_event, private_event)
-            if df.empty:
+    register_clicked = st.button("Googleカレンダーに登録する")
+    if register_clicked:
+        run_metrics = RunMetrics(f"登録 {selected_calendar_name}")
+    if register_clicked and background_mode and not sync_mode and not routing_mode:
+        with run_metrics.activate():
+            if streaming_mode:
+                def labeled_events():
+                    records = iter_event_records(st.session_state['uploaded_files'], description_columns, all_day_event, private_event, StreamlitReporter())
+                    for record in records:
+                        event_data = build_event_data(record)
+                        if record['管理番号']:
+                            attach_sync_properties(event_data, record['管理番号'])
+                        yield record['Subject'], event_data
+            else:
+                with st.spinner("イベントデータを処理中..."):
+                    with run_metrics.stage("parse", profile=profile_parse):
+                        batch = process_excel_files_batch(st.session_state['uploaded_files'], description_columns,
+                                                          all_day_event, private_event, StreamlitReporter())
+
+                def labeled_events():
+                    # イベント本体はジョブの行に書き込みながら順に作成します
+                    for _, event_data in iter_event_payloads(batch):
+                        yield event_data['summary'], event_data
+
+            # 行はSQLiteに書き込まれ、送信はワーカースレッドで行われます（送信の計測結果はジョブの状況タブに表示）
+            with st.spinner("ジョブを登録中..."), run_metrics.stage("enqueue", profile=profile_parse and streaming_mode):
+                job_id = get_job_runner().submit_import(creds, calendar_id, labeled_events())
+        st.session_state['last_run_metrics'] = run_metrics.finish().to_dict()
+        st.success(f"バックグラウンドジョブ {job_id} を開始しました。進捗は「4. ジョブの状況」タブで確認できます。")
+    elif register_clicked and streaming_mode:
+        # ファイル全体を読み込まず、読み込んだ行から順にバッチ送信します（差分同期は行いません）
+        status = st.empty()
+        subjects = {}
+        counts = {"yielded": 0, "success": 0, "failed": 0}
+
+        def streamed_events():
+            records = iter_event_records(st.session_state['uploaded_files'], description_columns, all_day_event, private_event, StreamlitReporter())
+            for record in records:
+                event_data = build_event_data(record)
+                if record['管理番号']:
+                    attach_sync_properties(event_data, record['管理番号'])
+                subjects[counts["yielded"]] = record['Subject']
+                counts["yielded"] += 1
+                yield event_data
+
+        def on_result(result):
+            subject = subjects.pop(result["index"])
+            if result["success"]:
+                counts["success"] += 1
+            else:
+                counts["failed"] += 1
+                st.error(f"{subject} の登録に失敗しました: {result['error']}")
+
+        with st.spinner("ファイルを読み込みながらイベントを登録中..."), run_metrics.activate(), run_metrics.stage("stream", profile=profile_parse):
+            add_events_to_calendar_batch(
+                service, calendar_id, streamed_events(), result_callback=on_result,
+                progress_callback=lambda processed: status.text(f"{processed} 件を送信しました")
+            )
+        st.session_state['last_run_metrics'] = run_metrics.finish().to_dict()
+        if counts["yielded"] == 0:
+            st.warning("有効なイベントデータがありません。")
+        else:
+            st.success(f"✅ {counts['success']} 件のイベント登録が完了しました！")
+    elif register_clicked and routing_mode:
+        with st.spinner("イベントデータを処理中..."), run_metrics.activate():
+            with run_metrics.stage("parse", profile=profile_parse):
+                batch = load_routing_batch()
+            routes = None
+            if not len(batch):
                 st.warning("有効なイベントデータがありません。")
+            elif route_method == "列の値で振り分け" and not route_mapping:
+                st.warning("登録先が選ばれていません。「振り分け先の候補を読み込む」で値ごとの登録先を選んでください。")
+            elif route_method == "ルール表で振り分け" and not route_rules:
+                st.warning("ルール表に、列・パターン・登録先がそろったルールがありません。")
             else:
-                st.info(f"{len(df)} 件のイベントを登録します。")
+                try:
+                    if route_method == "列の値で振り分け":
+                        routes = route_by_value(batch, route_mapping, route_column, route_pattern or None)
+                    else:
+                        routes = route_by_rules(batch, route_rules)
+                except re.error as e:
+                    st.error(f"正規表現が正しくありません: {e}")
+
+            if routes is not None:
+                with run_metrics.stage("route_split"):
+                    if route_unmatched:
+                        routes = routes.where(routes.notna(), calendar_id)
+                    groups, unrouted = split_batch(batch, routes)
+                st.info(f"{len(batch)} 件のイベントを {len(groups)} 件のカレンダーに振り分けて登録します。")
+                if unrouted:
+                    st.warning(f"登録先が決まらない {len(unrouted)} 件のイベントはスキップします。")
                 progress = st.progress(0)
-                successful_registrations = 0
-                for i, row in df.iterrows():
-                    try:
-                        if row['All Day Event'] == "True":
-                            # 終日イベントの場合、日付のみを使用
-                            start_date_str = datetime.strptime(row['Start Date'], "%Y/%m/%d").strftime("%Y-%m-%d")
-                            end_date_str = datetime.strptime(row['End Date'], "%Y/%m/%d").strftime("%Y-%m-%d")
-
-                            event_data = {
-                                'summary': row['Subject'],
-                                'location': row['Location'] if pd.notna(row['Location']) else '',
-                                'description': row['Description'] if pd.notna(row['Description']) else '',
-                                'start': {'date': start_date_str},
-                                'end': {'date': end_date_str},
-                                'transparency': 'transparent' if row['Private'] == "True" else 'opaque'
-                            }
-                        else:
-                            # 時間指定イベントの場合、日付と時間を使用
-                            start_dt_str = f"{row['Start Date']} {row['Start Time']}"
-                            end_dt_str = f"{row['End Date']} {row['End Time']}"
-
-                            start = datetime.strptime(start_dt_str, "%Y/%m/%d %H:%M").isoformat()
-                            end = datetime.strptime(end_dt_str, "%Y/%m/%d %H:%M").isoformat()
-
-                            event_data = {
-                                'summary': row['Subject'],
-                                'location': row['Location'] if pd.notna(row['Location']) else '',
-                                'description': row['Description'] if pd.notna(row['Description']) else '',
-                                'start': {'dateTime': start, 'timeZone': 'Asia/Tokyo'},
-                                'end': {'dateTime': end, 'timeZone': 'Asia/Tokyo'},
-                                'transparency': 'transparent' if row['Private'] == "True" else 'opaque'
-                            }
-                        add_event_to_calendar(service, calendar_id, event_data)
-                        successful_registrations += 1
-                    except Exception as e:
-                        st.error(f"{row['Subject']} の登録に失敗しました: {e}")
-                    progress.progress((i + 1) / len(df))
 
+                # カレンダーごとに専用の同時実行数で並行して送信します（流量制限はすべてのカレンダーで共有）
+                with run_metrics.stage("route"):
+                    route_results = register_routed_events(
+                        service, groups, sync=sync_mode, delete_orphans=delete_orphans,
+                        mirror=get_calendar_mirror() if sync_mode else None,
+                        progress_callback=lambda processed, total: progress.progress(processed / total if total else 1.0)
+                    )
+                progress.progress(1.0)
+
+                calendar_labels = {value: name for name, value in st.session_state['editable_calendar_options'].items()}
+                st.table([
+                    {"カレンダー": calendar_labels.get(target, target), "件数": result["events"], "新規": result["inserted"],
+                     "更新": result["updated"], "変更なし": result["unchanged"], "削除": result["deleted"],
+                     "失敗": len(result["failures"]), "所要時間(秒)": round(result["seconds"], 1)}
+                    for target, result in route_results.items()
+                ])
+                for target, result in route_results.items():
+                    if result["error"] is not None:
+                        st.error(f"「{calendar_labels.get(target, target)}」への登録に失敗しました: {result['error']}")
+                    for label, error in result["failures"]:
+                        st.error(f"{label} の登録に失敗しました: {error}")
+                successful_registrations = sum(result["inserted"] + result["updated"] for result in route_results.values())
                 st.success(f"✅ {successful_registrations} 件のイベント登録が完了しました！")
+        st.session_state['last_run_metrics'] = run_metrics.finish().to_dict()
+    elif register_clicked:
+        with st.spinner("イベントデータを処理中..."), run_metrics.activate():
+            with run_metrics.stage("parse", profile=profile_parse):
+                batch = process_excel_files_batch(st.session_state['uploaded_files'], description_columns,
+                                                  all_day_event, private_event, StreamlitReporter())
+            if not len(batch):
+                st.warning("有効なイベントデータがありません。")
+            else:
+                st.info(f"{len(batch)} 件のイベントを登録します。")
+                progress = st.progress(0)
+
+                # イベント本体を日時の列から一括で作成し、BatchHttpRequestでまとめて送信します
+                # （登録済みイベントはローカル索引を変更分だけ更新して照合します。初回のみ全件を取得）
+                result = register_events(
+                    service, calendar_id, batch, sync=sync_mode, delete_orphans=delete_orphans,
+                    mirror=get_calendar_mirror() if sync_mode else None, metrics=run_metrics,
+                    progress_callback=lambda processed, total: progress.progress(processed / total)
+                )
+                if sync_mode:
+                    st.info(
+                        f"新規 {result['inserted']} 件 / 更新 {result['updated']} 件 / "
+                        f"変更なし {result['unchanged']} 件 / 削除 {result['deleted']} 件"
+                    )
+                for label, error in result["failures"]:
+                    st.error(f"{label} の登録に失敗しました: {error}")
+                successful_registrations = result['inserted'] + result['updated']
+                progress.progress(1.0)
+
+                st.success(f"✅ {successful_registrations} 件のイベント登録が完了しました！")
+        st.session_state['last_run_metrics'] = run_metrics.finish().to_dict()
+
+    # 直近の実行の計測結果（再実行しても残ります）
+    if st.session_state.get('last_run_metrics'):
+        show_run_metrics(st.session_state['last_run_metrics'], key="metrics_last_run")
 
 
 with tabs[2]:
@@ -166,50 +450,139 @@ with tabs[2]:
     if delete_start_date > delete_end_date:
         st.error("削除開始日は終了日より前に設定してください。")
     else:
+        mirror = get_calendar_mirror()
+        with st.expander("🗂️ ローカル索引（登録済みイベントの複製）"):
+            if st.button("索引を更新", key="refresh_mirror_button"):
+                with st.spinner("前回からの変更を取得中..."):
+                    try:
+                        refreshed = mirror.refresh(service, calendar_id_del)
+                        st.caption(
+                            f"{'全件を取得しました' if refreshed['full'] else '変更分を取得しました'}"
+                            f"（追加・更新 {refreshed['changed']} 件 / 削除 {refreshed['removed']} 件）"
+                        )
+                    except Exception as e:
+                        st.error(f"索引の更新に失敗しました: {e}")
+            mirror_state = mirror.sync_state(calendar_id_del)
+            if mirror_state['synced_at'] is None:
+                st.info("このカレンダーの索引はまだありません。「索引を更新」で作成します。")
+            else:
+                range_start = datetime.combine(delete_start_date, datetime.min.time())
+                range_end = datetime.combine(delete_end_date, datetime.max.time())
+                st.write(
+                    f"最終更新 {mirror_state['synced_at']} / 索引内 {mirror_state['count']} 件 / "
+                    f"選択期間 {mirror.count_in_range(calendar_id_del, range_start, range_end)} 件"
+                )
+                duplicate_keys = mirror.duplicate_keys(calendar_id_del)
+                if duplicate_keys:
+                    st.warning(f"同じ管理番号で重複登録されているイベントが {len(duplicate_keys)} 件あります。")
+                    st.caption("、".join(list(duplicate_keys)[:20]))
+
         st.subheader("🗑️ 削除実行")
+        delete_in_background = st.checkbox("バックグラウンドジョブとして削除", value=True, key="delete_in_background")
+        col_prefix, col_pattern = st.columns(2)
+        delete_summary_prefix = col_prefix.text_input(
+            "件名の先頭（空欄なら絞り込みなし）", key="delete_summary_prefix"
+        ).strip()
+        delete_mng_pattern = col_pattern.text_input(
+            "管理番号のパターン（正規表現・先頭から照合、空欄なら絞り込みなし）", key="delete_mng_pattern",
+            help="このツールで登録したイベントに記録された管理番号と照合します。"
+                 "管理番号は英数字以外の記号（- や空白）と HK を除いた形で記録されているため、"
+                 "その形に合わせて指定してください。例: 20250[1-3]"
+        ).strip()
 
         # 初期化
         if 'show_delete_confirmation' not in st.session_state:
             st.session_state.show_delete_confirmation = False
         if 'last_deleted_count' not in st.session_state: # 削除件数を保持するstateを追加
             st.session_state.last_deleted_count = None
+        if 'last_delete_job' not in st.session_state:
+            st.session_state.last_delete_job = None
+        if 'delete_preview' not in st.session_state: # 削除前に確認した対象イベント
+            st.session_state.delete_preview = None
+
+        start_dt = datetime.combine(delete_start_date, datetime.min.time())
+        end_dt = datetime.combine(delete_end_date, datetime.max.time()) # 日付の終わりまで含める
+        # 確認後に条件が変わった場合は、確認済みの対象を使わずにもう一度確認させます
+        preview_conditions = (calendar_id_del, delete_start_date.isoformat(), delete_end_date.isoformat(),
+                              delete_summary_prefix, delete_mng_pattern)
+        preview = st.session_state.delete_preview
+        if preview is not None and preview['conditions'] != preview_conditions:
+            st.session_state.delete_preview = preview = None
+            st.session_state.show_delete_confirmation = False
 
         # 「選択期間のイベントを削除する」ボタン
-        # このボタンが押されたら確認フラグを立てて再描画
+        # このボタンが押されたら削除対象を一覧して件数を確認し、確認フラグを立てて再描画
         if st.button("選択期間のイベントを削除する", key="delete_events_button"):
-            st.session_state.show_delete_confirmation = True 
             st.session_state.last_deleted_count = None # 新しい削除試行前に件数をリセット
-            st.rerun() # 再描画して確認ダイアログを表示
+            st.session_state.last_delete_job = None
+            with st.spinner("削除対象のイベントを確認中..."):
+                try:
+                    preview_result = preview_events_in_range(
+                        service, calendar_id_del, start_dt, end_dt,
+                        summary_prefix=delete_summary_prefix or None, mng_num_pattern=delete_mng_pattern or None
+                    )
+                except re.error as e:
+                    preview_result = {"events": [], "scanned": 0, "error": f"管理番号のパターンが正しくありません: {e}"}
+            if preview_result['error'] is not None:
+                st.error(f"削除対象の確認中にエラーが発生しました: {preview_result['error']}")
+            else:
+                # 確認した対象はセッションに保持し、削除の実行時に一覧を取得し直さずに使います
+                st.session_state.delete_preview = {
+                    "conditions": preview_conditions,
+                    "events": preview_result['events'],
+                    "scanned": preview_result['scanned'],
+                }
+                st.session_state.show_delete_confirmation = True
+                st.rerun() # 再描画して確認ダイアログを表示
 
         # 確認フラグがTrueの場合にのみ確認メッセージと「はい」/「いいえ」ボタンを表示
-        if st.session_state.show_delete_confirmation:
-            # ここでメッセージを1行にまとめる
-            st.warning(f"「{selected_calendar_name_del}」カレンダーから {delete_start_date.strftime('%Y年%m月%d日')}から{delete_end_date.strftime('%Y年%m月%d日')}までの全てのイベントを削除します。この操作は元に戻せません。よろしいですか？")
-            
-            col1, col2 = st.columns(2)
-            with col1:
-                if st.button("はい、削除を実行します", key="confirm_delete_button_final"):
-                    deleted_count = delete_events_from_calendar(
-                        service, calendar_id_del, # ここもserviceを共有
-                        datetime.combine(delete_start_date, datetime.min.time()),
-                        datetime.combine(delete_end_date, datetime.max.time()) # 日付の終わりまで含める
-                    )
-                    st.session_state.last_deleted_count = deleted_count # 削除件数を保存
-                    st.session_state.show_delete_confirmation = False # 削除処理後、フラグをリセット
-                    st.rerun() # 画面をリフレッシュしてメッセージを更新
-            with col2:
-                if st.button("いいえ、キャンセルします", key="cancel_delete_button"):
-                    st.info("削除はキャンセルされました。")
-                    st.session_state.show_delete_confirmation = False # フラグをリセット
-                    st.session_state.last_deleted_count = None # 件数をリセット
-                    st.rerun() # 画面をリフレッシュ
+        if st.session_state.show_delete_confirmation and preview is not None:
+            preview_events = preview['events']
+            period_text = f"{delete_start_date.strftime('%Y年%m月%d日')}から{delete_end_date.strftime('%Y年%m月%d日')}まで"
+            if not preview_events:
+                st.info(f"{period_text}に条件に一致するイベントはありません（期間内 {preview['scanned']} 件）。")
+            else:
+                # ここでメッセージを1行にまとめる
+                st.warning(f"「{selected_calendar_name_del}」カレンダーから {period_text}の {len(preview_events)} 件のイベント（期間内 {preview['scanned']} 件中）を削除します。この操作は元に戻せません。よろしいですか？")
+                st.caption("、".join(event['summary'] for event in preview_events[:10]) + (" ほか" if len(preview_events) > 10 else ""))
+
+                col1, col2 = st.columns(2)
+                with col1:
+                    if st.button("はい、削除を実行します", key="confirm_delete_button_final"):
+                        if delete_in_background:
+                            st.session_state.last_delete_job = get_job_runner().submit_delete_events(
+                                creds, calendar_id_del, preview_events
+                            )
+                        else:
+                            delete_metrics = RunMetrics(f"削除 {selected_calendar_name_del}")
+                            with delete_metrics.activate(), delete_metrics.stage("delete"):
+                                deleted_count = delete_events_from_calendar(
+                                    service, calendar_id_del, # ここもserviceを共有
+                                    start_dt, end_dt, events=preview_events
+                                )
+                            st.session_state.last_deleted_count = deleted_count # 削除件数を保存
+                            st.session_state.last_delete_metrics = delete_metrics.finish().to_dict()
+                        st.session_state.show_delete_confirmation = False # 削除処理後、フラグをリセット
+                        st.session_state.delete_preview = None
+                        st.rerun() # 画面をリフレッシュしてメッセージを更新
+                with col2:
+                    if st.button("いいえ、キャンセルします", key="cancel_delete_button"):
+                        st.info("削除はキャンセルされました。")
+                        st.session_state.show_delete_confirmation = False # フラグをリセット
+                        st.session_state.delete_preview = None
+                        st.session_state.last_deleted_count = None # 件数をリセット
+                        st.rerun() # 画面をリフレッシュ
 
         # 削除完了メッセージを表示 (確認ダイアログとは独立して表示)
         # show_delete_confirmationがTrueの間は表示しないようにする
+        if not st.session_state.show_delete_confirmation and st.session_state.last_delete_job:
+            st.success(f"削除ジョブ {st.session_state.last_delete_job} を開始しました。進捗は「4. ジョブの状況」タブで確認できます。")
         if not st.session_state.show_delete_confirmation and st.session_state.last_deleted_count is not None:
             if st.session_state.last_deleted_count > 0:
                 st.success(f"✅ {st.session_state.last_deleted_count} 件のイベントが削除されました。")
             else:
                 st.info("指定された期間内に削除するイベントは見つかりませんでした。")
+            if st.session_state.get('last_delete_metrics'):
+                show_run_metrics(st.session_state['last_delete_metrics'], key="metrics_last_delete")
             # メッセージ表示後、stateをクリアして次回表示を防ぐ
             # st.session_state.last_deleted_count = None # これを有効にすると一度しか表示されない
@@ -0,0 +1,73 @@
+# payloads.py
+#
+# イベントのバッチ（event_batch.EventBatch。開始・終了は datetime64 の列）から、
+# Calendar API に送るイベント本体を列単位の変換でまとめて作成します。
+# 日時を一度文字列にしてから strptime で戻す build_event_data の行ごとの処理を通らないため、
+# 件数の多い登録で速く、結果は登録・差分同期・バックグラウンドジョブ・CLI のどれにもそのまま渡せます。
+# iter_event_payloads は PAYLOAD_CHUNK_ROWS 件ずつ作成するため、送信側が順に受け取れば全件分の dict を保持しません。
+
+import numpy as np
+
+from calendar_utils import attach_sync_properties
+from event_batch import EventBatch
+
+EVENT_TIME_ZONE = "Asia/Tokyo" # 時間指定イベントのタイムゾーン
+PAYLOAD_CHUNK_ROWS = 5000 # 日時の文字列化などをまとめて行う行数
+
+def _time_values(values, all_day):
+    # 日時の配列をまとめて変換します。終日は日付、時間指定は build_event_data と同じく分単位の日時です
+    if all_day.all():
+        return [{"date": value} for value in np.datetime_as_string(values.astype("datetime64[D]"), unit="D").tolist()]
+    texts = np.datetime_as_string(values, unit="s").tolist()
+    if not all_day.any():
+        return [{"dateTime": value, "timeZone": EVENT_TIME_ZONE} for value in texts]
+    return [
+        {"date": value[:10]} if is_all_day else {"dateTime": value, "timeZone": EVENT_TIME_ZONE}
+        for value, is_all_day in zip(texts, all_day.tolist())
+    ]
+
+def _values(values, rows):
+    # 文字列配列・categorical の rows の範囲を値のリストにします
+    return np.asarray(values[rows], dtype=object).tolist()
+
+def iter_event_payloads(batch, sync_properties=True, chunk_rows=PAYLOAD_CHUNK_ROWS):
+    """
+    (管理番号, イベント本体) を行の順に返すジェネレーターです。イベント本体は build_event_data の結果と同じ内容です。
+    sync_properties が True の場合、管理番号のある行には差分同期用の extendedProperties を設定します。
+    """
+    for offset in range(0, len(batch), chunk_rows):
+        rows = slice(offset, offset + chunk_rows)
+        all_day = batch.all_day[rows]
+        for key, summary, location, description, start_value, end_value, private in zip(
+            batch.mng_num[rows].tolist(), batch.subject[rows].tolist(),
+            _values(batch.location, rows), _values(batch.description, rows),
+            _time_values(batch.start[rows], all_day), _time_values(batch.end[rows], all_day),
+            batch.private[rows].tolist()
+        ):
+            event_data = {
+                "summary": summary,
+                "location": location,
+                "description": description,
+                "start": start_value,
+                "end": end_value,
+                "transparency": "transparent" if private else "opaque",
+            }
+            if key and sync_properties:
+                attach_sync_properties(event_data, key)
+            yield key, event_data
+
+def build_event_payloads(events, all_day_event=None, private_event=None, sync_properties=True):
+    """
+    (管理番号, イベント本体) のリストを返します。
+    events は EventBatch、または build_typed_event_frame の結果のDataFrameです。
+    all_day_event / private_event を指定した場合は、バッチの設定に関わらず全行にその指定を使います。
+    """
+    if not isinstance(events, EventBatch):
+        events = EventBatch.from_frame(events, bool(all_day_event), True if private_event is None else private_event)
+    elif all_day_event is not None or private_event is not None:
+        events = events.take(np.arange(len(events)))
+        if all_day_event is not None:
+            events.all_day[:] = bool(all_day_event)
+        if private_event is not None:
+            events.private[:] = bool(private_event)
+    return list(iter_event_payloads(events, sync_properties))
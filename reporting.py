@@ -0,0 +1,76 @@
+# reporting.py
+#
+# 処理中のお知らせ・警告・エラー・進捗の通知先を差し替えるための仕組みです。
+# コアの処理（excel_parser / calendar_utils）は Streamlit に依存せず Reporter に通知し、
+# 画面では StreamlitReporter、CLI や定期実行では LoggingReporter を使います。
+
+import logging
+
+logger = logging.getLogger("calendar_import")
+
+class Reporter:
+    """
+    通知を受け取る基底クラスです。すべての通知を無視します。
+    """
+
+    def info(self, message):
+        pass
+
+    def warning(self, message):
+        pass
+
+    def error(self, message):
+        pass
+
+    def progress(self, fraction, text=None):
+        pass
+
+class LoggingReporter(Reporter):
+    """
+    通知を logging に出力します。進捗は DEBUG レベルで出力します。
+    """
+
+    def __init__(self, log=logger):
+        self.log = log
+
+    def info(self, message):
+        self.log.info(message)
+
+    def warning(self, message):
+        self.log.warning(message)
+
+    def error(self, message):
+        self.log.error(message)
+
+    def progress(self, fraction, text=None):
+        self.log.debug("進捗 %.0f%% %s", fraction * 100, text or "")
+
+class StreamlitReporter(Reporter):
+    """
+    通知を Streamlit の画面に表示します。プログレスバーは最初の進捗通知で作成します。
+    """
+
+    def __init__(self):
+        import streamlit as st
+        self._st = st
+        self._progress_bar = None
+
+    def info(self, message):
+        self._st.info(message)
+
+    def warning(self, message):
+        self._st.warning(message)
+
+    def error(self, message):
+        self._st.error(message)
+
+    def progress(self, fraction, text=None):
+        if self._progress_bar is None:
+            self._progress_bar = self._st.progress(0)
+        self._progress_bar.progress(min(max(fraction, 0.0), 1.0), text=text)
+
+def get_reporter(reporter=None):
+    """
+    reporter が指定されていなければ LoggingReporter を返します。
+    """
+    return reporter if reporter is not None else LoggingReporter()
@@ -0,0 +1,191 @@
+# routing.py
+#
+# 1回の読み込み結果（event_batch.EventBatch）を、列の値（住所の区など）やルール表に従って
+# 複数のカレンダーに振り分けて登録します。イベント本体はカレンダーごとの送信処理の中で順に作成します。
+# カレンダーごとに専用の ApiExecutor（同時実行数・再試行）で並行して送信し、応答待ちの時間を重ねます。
+# 流量制限はすべてのカレンダーで1つのバケットを共有するため、合計の送信量はユーザーのクォータを超えません。
+# 1つのカレンダーへの登録（register_events）は、振り分けない通常の登録でも画面・CLIから共通で使います。
+
+import contextlib
+import contextvars
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from api_executor import get_calendar_executor
+from calendar_utils import PROGRESS_UPDATE_INTERVAL, add_events_to_calendar_batch, sync_events_to_calendar
+from payloads import iter_event_payloads
+
+ROUTE_LOCATION_COLUMN = "Location" # 既定で振り分けに使う列（住所・所在地から作成した場所）
+ROUTE_WARD_PATTERN = r"^(.+?区)" # 住所から区を取り出す正規表現
+ROUTE_MAX_CALENDARS = 8 # 同時に登録するカレンダー数の上限
+
+def _text_series(batch, column):
+    # 振り分けに使う列を文字列にします（欠損値は空文字）
+    values = batch.column(column).astype(object)
+    return values.where(values.notna(), "").map(str)
+
+def extract_route_keys(batch, column=ROUTE_LOCATION_COLUMN, pattern=ROUTE_WARD_PATTERN):
+    """
+    列の値から振り分けのキーを取り出した Series を返します。
+    pattern に括弧のグループがあれば最初のグループ、なければ一致した部分がキーになり、一致しない行は None です。
+    pattern を省略した場合は値そのもの（前後の空白を除く）がキーになります。
+    """
+    values = _text_series(batch, column)
+    if not pattern:
+        keys = values.str.strip()
+        return keys.where(keys != "", None)
+    regex = re.compile(pattern)
+    if regex.groups == 0:
+        regex = re.compile(f"({pattern})")
+    keys = values.str.extract(regex, expand=False)
+    return keys.astype(object).where(keys.notna(), None)
+
+def route_by_value(batch, mapping, column=ROUTE_LOCATION_COLUMN, pattern=ROUTE_WARD_PATTERN):
+    """
+    extract_route_keys のキーを mapping（{キー: カレンダーID}）で登録先に変換した Series を返します。
+    mapping にないキーの行は None です。
+    """
+    routes = extract_route_keys(batch, column, pattern).map(mapping).astype(object)
+    return routes.where(routes.notna(), None)
+
+def route_by_rules(batch, rules):
+    """
+    ルール表に従って各行の登録先を決めた Series を返します。
+    rules は (列名, 正規表現, カレンダーID) のリストで、上から順に照合して最初に一致（re.search）したものを使います。
+    どのルールにも一致しない行は None です。
+    """
+    routes = pd.Series(None, index=pd.RangeIndex(len(batch)), dtype=object)
+    for column, pattern, calendar_id in rules:
+        if column not in batch.columns:
+            continue
+        matched = routes.isna() & _text_series(batch, column).str.contains(re.compile(pattern), regex=True)
+        routes[matched] = calendar_id
+    return routes
+
+def split_batch(batch, routes):
+    """
+    バッチを登録先ごとに分けます。({カレンダーID: EventBatch}, 登録先のない行の EventBatch) を返します。
+    """
+    targets = routes.to_numpy(dtype=object)
+    routed = pd.notna(targets)
+    groups = {}
+    if routed.any():
+        codes, calendar_ids = pd.factorize(targets[routed], sort=False)
+        positions = np.flatnonzero(routed)
+        for code, calendar_id in enumerate(calendar_ids):
+            groups[calendar_id] = batch.take(positions[codes == code])
+    return groups, batch.take(np.flatnonzero(~routed))
+
+def register_events(service, calendar_id, batch, sync=False, delete_orphans=False, mirror=None, executor=None,
+                    progress_callback=None, metrics=None):
+    """
+    1回の読み込み結果（EventBatch）を1つのカレンダーに登録します。画面・CLI・振り分け登録で共通の処理です。
+    sync が True の場合は管理番号のあるイベントを差分同期し、管理番号のないイベントだけを追加します。
+    progress_callback(processed, total) の total はバッチの件数で、metrics（RunMetrics）を指定すると
+    "build"・"sync"・"insert" の段階を記録します。
+    戻り値は {"events", "inserted", "updated", "unchanged", "deleted", "failures": [(件名, 例外)]} の辞書です。
+    """
+    summary = {"events": len(batch), "inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0, "failures": []}
+    total = len(batch)
+
+    def stage(name):
+        return metrics.stage(name) if metrics is not None else contextlib.nullcontext()
+
+    def report(processed):
+        if progress_callback:
+            progress_callback(processed, total)
+
+    if sync:
+        synced = []
+        events = []
+        with stage("build"):
+            for key, event_data in iter_event_payloads(batch, sync_properties=False):
+                if key:
+                    synced.append((key, event_data))
+                else:
+                    events.append(event_data)
+        labels = [event_data.get("summary") for event_data in events]
+        if synced:
+            with stage("sync"):
+                result = sync_events_to_calendar(
+                    service, calendar_id, synced, delete_orphans=delete_orphans, executor=executor, mirror=mirror,
+                    progress_callback=lambda processed, _: report(processed)
+                )
+            for name in ("inserted", "updated", "unchanged", "deleted"):
+                summary[name] += result[name]
+            summary["failures"].extend(result["failures"])
+        done = len(synced)
+    else:
+        # イベント本体は送信しながら順に作成し、全件分を保持しません
+        # （差分同期しない場合も、次回以降の差分同期で照合できるよう管理番号を記録しておきます）
+        events = (event_data for _, event_data in iter_event_payloads(batch))
+        labels = batch.subject
+        done = 0
+    if total > done:
+        with stage("insert"):
+            results = add_events_to_calendar_batch(
+                service, calendar_id, events, executor=executor,
+                progress_callback=lambda processed: report(done + processed)
+            )
+        for result in results:
+            if result["success"]:
+                summary["inserted"] += 1
+            else:
+                summary["failures"].append((labels[result["index"]], result["error"]))
+    report(total)
+    return summary
+
+def _register_calendar(service, calendar_id, batch, sync, delete_orphans, mirror, executor, progress):
+    # 振り分け登録の1カレンダー分です。progress[calendar_id] を更新し、呼び出し元のスレッドが集計して表示します
+    summary = {"events": len(batch), "inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0,
+               "failures": [], "seconds": 0.0, "error": None}
+    started = time.perf_counter()
+    try:
+        summary.update(register_events(
+            service, calendar_id, batch, sync, delete_orphans, mirror, executor,
+            progress_callback=lambda processed, total: progress.__setitem__(calendar_id, processed)
+        ))
+    except Exception as e:
+        summary["error"] = e
+    summary["seconds"] = time.perf_counter() - started
+    return summary
+
+def register_routed_events(service, groups, sync=False, delete_orphans=False, mirror=None,
+                           max_calendars=ROUTE_MAX_CALENDARS, progress_interval=PROGRESS_UPDATE_INTERVAL,
+                           progress_callback=None, executors=None):
+    """
+    split_batch で分けたイベント（{カレンダーID: EventBatch}）を、カレンダーごとに並行して登録します。
+    各カレンダーは get_calendar_executor の専用の ApiExecutor（executors で {カレンダーID: ApiExecutor} を指定可）で送信し、
+    sync が True の場合は管理番号のあるイベントをカレンダーごとに差分同期します。
+    progress_callback(processed, total) は全カレンダーの合計で、呼び出し元のスレッドで実行されます。
+    戻り値は {カレンダーID: {"events", "inserted", "updated", "unchanged", "deleted", "failures", "seconds", "error"}} です。
+    """
+    executors = executors or {}
+    total = sum(len(batch) for batch in groups.values())
+    progress = {calendar_id: 0 for calendar_id in groups}
+    summaries = {}
+    if not groups:
+        return summaries
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_calendars, len(groups))),
+                            thread_name_prefix="calendar-route") as pool:
+        # 計測中の RunMetrics をワーカースレッドに引き継ぐため、コンテキストをコピーして実行します
+        futures = {
+            pool.submit(
+                contextvars.copy_context().run, _register_calendar, service, calendar_id, batch, sync,
+                delete_orphans, mirror, executors.get(calendar_id) or get_calendar_executor(calendar_id), progress
+            ): calendar_id
+            for calendar_id, batch in groups.items()
+        }
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=progress_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                summaries[futures[future]] = future.result()
+            if progress_callback:
+                progress_callback(sum(progress.values()), total)
+    return summaries
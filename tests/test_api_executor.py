@@ -0,0 +1,211 @@
+# tests/test_api_executor.py
+#
+# api_executor の流量制限（TokenBucket）・同時実行数の制御（AdaptiveConcurrency）・バックオフの確認です。
+# 時刻は偽の時計に差し替え、待ち時間なしで結果が決まるようにしています
+# （待ち秒数が2進数で割り切れる値になるよう、流量は4件/秒にしています）。
+
+import threading
+from datetime import datetime
+
+import httplib2
+import pytest
+from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.errors import HttpError
+from googleapiclient.http import DEFAULT_HTTP_TIMEOUT_SEC, HttpMock, build_http
+
+import api_executor
+from api_executor import (
+    AdaptiveConcurrency, ApiExecutor, TokenBucket, get_calendar_executor, get_default_executor, get_shared_bucket,
+    thread_http
+)
+from benchmarks.fake_calendar import FakeCalendarBackend, build_fake_service
+from calendar_utils import delete_events_in_range
+
+class FakeClock:
+    """
+    time.monotonic / time.sleep / time.perf_counter の代わりです。sleep は待たずに時刻を進めます。
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    perf_counter = monotonic
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(api_executor, "time", fake)
+    return fake
+
+def _http_error(status, headers=None, reason="rateLimitExceeded"):
+    resp = httplib2.Response({"status": str(status), **(headers or {})})
+    return HttpError(resp, f'{{"error": {{"errors": [{{"reason": "{reason}"}}]}}}}'.encode())
+
+def test_token_bucket_allows_burst_then_waits_for_refill(clock):
+    bucket = TokenBucket(rate=4, capacity=5)
+    for _ in range(5):
+        bucket.acquire()
+    assert clock.slept == []
+
+    bucket.acquire(2)
+    assert clock.slept == [pytest.approx(0.5)]
+
+def test_token_bucket_caps_cost_at_capacity(clock):
+    bucket = TokenBucket(rate=4, capacity=5)
+    bucket.acquire(50) # バッチ1回分がバケットより大きくても、満杯になれば取得できます
+    assert clock.slept == []
+    clock.now += 100 # 長く空いても capacity を超えて貯まりません
+    bucket.acquire(5)
+    bucket.acquire(1)
+    assert clock.slept == [pytest.approx(0.25)]
+
+def test_concurrency_halves_on_throttle_with_cooldown(clock):
+    concurrency = AdaptiveConcurrency(8, 1, 8, cooldown=2.0)
+    concurrency.report_throttle()
+    assert concurrency.limit == 4
+    concurrency.report_throttle() # cooldown 中は下げません
+    assert concurrency.limit == 4
+    clock.now += 2.0
+    concurrency.report_throttle()
+    assert concurrency.limit == 2
+    for _ in range(3):
+        clock.now += 2.0
+        concurrency.report_throttle()
+    assert concurrency.limit == 1 # 下限で止まります
+
+def test_concurrency_grows_by_one_per_clean_window(clock):
+    concurrency = AdaptiveConcurrency(2, 1, 3, window=20, error_threshold=0.05)
+    for _ in range(19):
+        concurrency.acquire()
+        concurrency.release()
+    assert concurrency.limit == 2
+    concurrency.acquire()
+    concurrency.release()
+    assert concurrency.limit == 3
+    for _ in range(40):
+        concurrency.acquire()
+        concurrency.release()
+    assert concurrency.limit == 3 # 上限を超えません
+
+def test_concurrency_does_not_grow_when_window_has_errors(clock):
+    concurrency = AdaptiveConcurrency(2, 1, 8, window=20, error_threshold=0.05, cooldown=1000)
+    concurrency.report_throttle()
+    assert concurrency.limit == 1
+    clock.now += 1
+    for i in range(20):
+        concurrency.acquire()
+        concurrency.release(throttled=i < 2) # cooldown 中の throttle はエラーとして数えるだけ
+    assert concurrency.limit == 1
+
+def test_concurrency_acquire_blocks_at_limit():
+    concurrency = AdaptiveConcurrency(1, 1, 1)
+    concurrency.acquire()
+    acquired = threading.Event()
+
+    def worker():
+        concurrency.acquire()
+        acquired.set()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    assert not acquired.wait(0.1)
+    concurrency.release()
+    assert acquired.wait(1)
+    thread.join()
+
+def test_calendar_executors_share_one_rate_limit():
+    first = get_calendar_executor("test-a@group.calendar.google.com")
+    second = get_calendar_executor("test-b@group.calendar.google.com")
+
+    assert first is not second
+    assert first.concurrency is not second.concurrency # 同時実行数はカレンダーごと
+    assert first.bucket is second.bucket is get_default_executor().bucket is get_shared_bucket()
+
+def test_shared_bucket_limits_total_rate_across_executors(clock):
+    bucket = TokenBucket(rate=4, capacity=4)
+    executors = [ApiExecutor(bucket=bucket) for _ in range(4)]
+    for executor in executors:
+        executor.bucket.acquire(1) # 4つの実行層で1件ずつ、合計でバケットを使い切ります
+    assert clock.slept == []
+
+    executors[0].bucket.acquire(2)
+    assert clock.slept == [pytest.approx(0.5)]
+
+def _client_timeout(http):
+    # スレッドごとのクライアントを別スレッドで作成し、そのタイムアウトを返します
+    result = []
+    thread = threading.Thread(target=lambda: result.append(thread_http(http)))
+    thread.start()
+    thread.join()
+    client = result[0]
+    return getattr(client, "http", client).timeout
+
+def test_thread_clients_keep_a_timeout():
+    credentials = Credentials(token="token")
+    assert _client_timeout(AuthorizedHttp(credentials, http=build_http())) == DEFAULT_HTTP_TIMEOUT_SEC
+    assert _client_timeout(AuthorizedHttp(credentials, http=httplib2.Http(timeout=5))) == 5
+    assert _client_timeout(httplib2.Http()) == DEFAULT_HTTP_TIMEOUT_SEC # 元が無制限でも既定値を使います
+    assert thread_http(HttpMock()) is None
+
+def test_backoff_delay_respects_retry_after_floor():
+    executor = ApiExecutor(base_delay=1.0, max_delay=4.0)
+    error = _http_error(429, {"retry-after": "7"})
+    assert all(executor.backoff_delay(attempt, error) >= 7 for attempt in range(5))
+    assert all(0 <= executor.backoff_delay(attempt, _http_error(429)) <= 4.0 for attempt in range(10))
+    assert all(executor.backoff_delay(0) <= 1.0 for _ in range(20))
+
+class _FlakyRequest:
+    # 指定した例外を順に送出し、最後に成功する HttpRequest の代わり
+    http = None
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+
+    def execute(self, http=None):
+        if self.errors:
+            raise self.errors.pop(0)
+        return {"id": "ok"}
+
+def test_execute_retries_and_counts_throttles(clock):
+    executor = ApiExecutor(rate_per_second=1e6, burst=1e6)
+    request = _FlakyRequest([_http_error(429), _http_error(503, reason="backendError")])
+
+    assert executor.execute(request) == {"id": "ok"}
+    assert executor.stats["retries"] == 2
+    assert executor.stats["throttled"] == 1
+    assert executor.concurrency.limit == executor.max_concurrency // 2
+
+def test_execute_does_not_retry_client_errors(clock):
+    executor = ApiExecutor(rate_per_second=1e6, burst=1e6)
+    request = _FlakyRequest([_http_error(400, reason="invalid")])
+
+    with pytest.raises(HttpError):
+        executor.execute(request)
+    assert executor.stats["retries"] == 0
+    assert executor.stats["failed"] == 1
+
+def test_throttled_delete_batches_are_reported():
+    backend = FakeCalendarBackend(error_rate=0.05, seed=4)
+    service = build_fake_service(backend)
+    backend.seed_events("cal", [
+        {"summary": f"予定{i}", "start": {"dateTime": "2025-01-06T09:00:00+09:00"},
+         "end": {"dateTime": "2025-01-06T10:00:00+09:00"}}
+        for i in range(300)
+    ])
+    executor = ApiExecutor(rate_per_second=1e6, burst=1e6, base_delay=0.001, max_delay=0.001)
+
+    delete_events_in_range(service, "cal", datetime(2025, 1, 6), datetime(2025, 1, 6), executor=executor)
+
+    assert backend.errors[429] > 0
+    assert executor.stats["throttled"] > 0
+    assert executor.concurrency.limit < executor.max_concurrency
+    assert backend.count("cal") == 0
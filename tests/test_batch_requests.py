@@ -0,0 +1,129 @@
+# tests/test_batch_requests.py
+#
+# execute_requests_in_batches / add_events_to_calendar_batch の分割送信・サブリクエストごとの再試行の確認です。
+# HttpMockSequence で決まった順にバッチの応答を返し、一部だけ失敗したバッチが再送で成功することを確かめます。
+
+import json
+
+import pytest
+from googleapiclient.discovery import build
+from googleapiclient.http import HttpMockSequence
+
+from api_executor import ApiExecutor
+from benchmarks.fake_calendar import FakeCalendarBackend, build_fake_service
+from calendar_utils import add_events_to_calendar_batch, execute_requests_in_batches
+from instrumentation import RunMetrics
+
+BOUNDARY = "batch_test"
+
+def _batch_response(*parts):
+    # (リクエストID, ステータス, 応答本体) のリストから、バッチのマルチパート応答を作成します
+    chunks = []
+    for request_id, status, payload in parts:
+        chunks.append(
+            f"--{BOUNDARY}\r\nContent-Type: application/http\r\n"
+            f"Content-ID: <response-test + {request_id}>\r\n\r\n"
+            f"HTTP/1.1 {status} {'OK' if status < 300 else 'Error'}\r\n"
+            f"Content-Type: application/json; charset=UTF-8\r\n\r\n{json.dumps(payload)}\r\n"
+        )
+    chunks.append(f"--{BOUNDARY}--\r\n")
+    return {"status": "200", "content-type": f"multipart/mixed; boundary={BOUNDARY}"}, "".join(chunks)
+
+def _error(status, reason):
+    return {"error": {"code": status, "message": reason, "errors": [{"reason": reason, "message": reason}]}}
+
+def _event(number):
+    return {
+        "summary": f"予定{number}",
+        "start": {"dateTime": "2025-01-06T09:00:00", "timeZone": "Asia/Tokyo"},
+        "end": {"dateTime": "2025-01-06T10:00:00", "timeZone": "Asia/Tokyo"},
+    }
+
+@pytest.fixture
+def executor():
+    # 流量制限とバックオフの待ち時間を実質なくした実行層
+    return ApiExecutor(rate_per_second=1e6, burst=1e6, base_delay=0.001, max_delay=0.001)
+
+def test_partial_batch_failure_is_retried_until_success(executor):
+    http = HttpMockSequence([
+        _batch_response((0, 200, {"id": "a"}), (1, 429, _error(429, "rateLimitExceeded")), (2, 200, {"id": "c"})),
+        _batch_response((1, 200, {"id": "b"})),
+    ])
+    service = build("calendar", "v3", http=http, static_discovery=True, cache_discovery=False)
+
+    results = add_events_to_calendar_batch(service, "cal", [_event(i) for i in range(3)], executor=executor)
+
+    assert [result["success"] for result in results] == [True, True, True]
+    assert [result["response"]["id"] for result in results] == ["a", "b", "c"]
+    # 2回目のバッチには失敗した1件だけが含まれます
+    assert len(http.request_sequence) == 2
+    assert http.request_sequence[1][2].count("POST /calendar/v3/calendars/cal/events") == 1
+    assert executor.stats["retries"] == 1
+    assert executor.stats["throttled"] == 1
+
+def test_non_retryable_failure_is_not_resent(executor):
+    http = HttpMockSequence([
+        _batch_response((0, 200, {"id": "a"}), (1, 404, _error(404, "notFound"))),
+    ])
+    service = build("calendar", "v3", http=http, static_discovery=True, cache_discovery=False)
+
+    results = add_events_to_calendar_batch(service, "cal", [_event(i) for i in range(2)], executor=executor)
+
+    assert results[0]["success"] is True
+    assert results[1]["success"] is False
+    assert results[1]["error"].resp.status == 404
+    assert len(http.request_sequence) == 1
+
+def test_retries_stop_after_max_retries(executor):
+    throttled = _batch_response((0, 503, _error(503, "backendError")))
+    http = HttpMockSequence([throttled] * 3)
+    service = build("calendar", "v3", http=http, static_discovery=True, cache_discovery=False)
+
+    results = add_events_to_calendar_batch(service, "cal", [_event(0)], max_retries=2, executor=executor)
+
+    assert results[0]["success"] is False
+    assert results[0]["error"].resp.status == 503
+    assert len(http.request_sequence) == 3
+
+def test_requests_are_split_into_chunks_in_input_order(executor):
+    backend = FakeCalendarBackend()
+    service = build_fake_service(backend)
+    processed = []
+
+    results = add_events_to_calendar_batch(
+        service, "cal", (_event(i) for i in range(120)), executor=executor, progress_callback=processed.append
+    )
+
+    assert backend.calls["batch"] == 3 # 50 + 50 + 20 件
+    assert [result["index"] for result in results] == list(range(120))
+    assert [result["response"]["summary"] for result in results] == [f"予定{i}" for i in range(120)]
+    assert processed[-1] == 120
+    assert backend.count("cal") == 120
+
+def test_injected_errors_leave_no_event_behind(executor):
+    backend = FakeCalendarBackend(error_rate=0.05, seed=1)
+    service = build_fake_service(backend)
+    metrics = RunMetrics("test")
+
+    with metrics.activate():
+        results = add_events_to_calendar_batch(service, "cal", [_event(i) for i in range(200)], executor=executor)
+
+    assert backend.errors[429] > 0
+    assert all(result["success"] for result in results)
+    assert backend.count("cal") == 200
+    # 失敗したサブリクエストはすべて1件ずつ再送・スロットリングとして数えます
+    assert executor.stats["retries"] == executor.stats["throttled"] == backend.errors[429]
+    assert metrics.counters["retries"] == metrics.counters["throttled"] == backend.errors[429]
+
+def test_result_callback_receives_every_result_without_keeping_them(executor):
+    backend = FakeCalendarBackend()
+    service = build_fake_service(backend)
+    received = []
+    factories = [
+        (lambda i=i: service.events().insert(calendarId="cal", body=_event(i))) for i in range(75)
+    ]
+
+    results = execute_requests_in_batches(service, factories, executor=executor, result_callback=received.append)
+
+    assert results == []
+    assert sorted(result["index"] for result in received) == list(range(75))
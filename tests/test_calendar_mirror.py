@@ -0,0 +1,114 @@
+# tests/test_calendar_mirror.py
+#
+# ローカルの索引（calendar_mirror）の更新が、取得中に SQLite の書き込みロックを持ち続けないこと、
+# 途中で失敗しても前回の状態が残ることの確認です。
+
+import sqlite3
+from datetime import datetime
+
+import pytest
+from googleapiclient.errors import HttpError
+
+from api_executor import ApiExecutor
+from benchmarks.fake_calendar import FakeCalendarBackend, build_fake_service
+from calendar_mirror import MIRROR_LIST_PAGE_SIZE, CalendarMirror
+
+def _events(prefix, count):
+    return [
+        {"summary": f"{prefix}{i}", "start": {"dateTime": "2025-01-06T09:00:00+09:00"},
+         "end": {"dateTime": "2025-01-06T10:00:00+09:00"}}
+        for i in range(count)
+    ]
+
+class LockCheckingBackend(FakeCalendarBackend):
+    """
+    一覧の取得を受けるたびに、別の接続から索引のファイルへ書き込めるかを記録する偽のバックエンドです。
+    """
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.locked = []
+        self.fail_after = None # この回数の一覧取得の後は 500 を返します
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=None, connection_type=None):
+        if "/events" in uri and method == "GET":
+            conn = sqlite3.connect(self.path, timeout=0)
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.rollback()
+                self.locked.append(False)
+            except sqlite3.OperationalError:
+                self.locked.append(True)
+            finally:
+                conn.close()
+            if self.fail_after is not None and len(self.locked) > self.fail_after:
+                return self._response(500, {"error": {"code": 500, "errors": [{"reason": "backendError"}]}})
+        return super().request(uri, method, body, headers, redirections, connection_type)
+
+@pytest.fixture
+def executor():
+    return ApiExecutor(rate_per_second=1e6, burst=1e6, max_retries=0)
+
+@pytest.fixture
+def mirror_path(tmp_path):
+    return str(tmp_path / "mirror.sqlite3")
+
+def test_pages_are_fetched_without_holding_the_write_lock(mirror_path, executor):
+    backend = LockCheckingBackend(mirror_path)
+    backend.seed_events("cal", _events("予定", MIRROR_LIST_PAGE_SIZE * 2 + 10))
+    mirror = CalendarMirror(mirror_path)
+    service = build_fake_service(backend)
+
+    summary = mirror.refresh(service, "cal", executor)
+    assert summary["full"] and summary["changed"] == MIRROR_LIST_PAGE_SIZE * 2 + 10
+
+    service.events().delete(calendarId="cal", eventId=backend.events("cal")[0]["id"]).execute()
+    backend.seed_events("cal", _events("追加", MIRROR_LIST_PAGE_SIZE + 5))
+    summary = mirror.refresh(service, "cal", executor)
+
+    assert not summary["full"]
+    assert summary["changed"] == MIRROR_LIST_PAGE_SIZE + 5 and summary["removed"] == 1
+    assert mirror.sync_state("cal")["count"] == backend.count("cal")
+    assert len(backend.locked) == 5 # 全体3ページ + 差分2ページ
+    assert not any(backend.locked)
+
+def test_failed_full_refresh_keeps_previous_state(mirror_path, executor):
+    backend = LockCheckingBackend(mirror_path)
+    backend.seed_events("cal", _events("予定", 10))
+    mirror = CalendarMirror(mirror_path)
+    service = build_fake_service(backend)
+    mirror.refresh(service, "cal", executor)
+    before = mirror.sync_state("cal")
+
+    backend.seed_events("cal", _events("追加", MIRROR_LIST_PAGE_SIZE * 2))
+    backend.invalidate_sync_tokens() # 次の更新は全体の取得になります
+    backend.fail_after = len(backend.locked) + 2 # 410 の後、全体の2ページ目で失敗します
+    with pytest.raises(HttpError):
+        mirror.refresh(service, "cal", executor)
+
+    assert mirror.sync_state("cal") == before
+    assert len(mirror.events_in_range("cal", datetime(2025, 1, 6), datetime(2025, 1, 7))) == 10
+
+    backend.fail_after = None
+    assert mirror.refresh(service, "cal", executor)["full"]
+    assert mirror.sync_state("cal")["count"] == 10 + MIRROR_LIST_PAGE_SIZE * 2
+
+def test_failed_incremental_refresh_is_replayed(mirror_path, executor):
+    backend = LockCheckingBackend(mirror_path)
+    backend.seed_events("cal", _events("予定", 10))
+    mirror = CalendarMirror(mirror_path)
+    service = build_fake_service(backend)
+    mirror.refresh(service, "cal", executor)
+    token = mirror.sync_state("cal")["sync_token"]
+
+    backend.seed_events("cal", _events("追加", MIRROR_LIST_PAGE_SIZE + 1))
+    backend.fail_after = len(backend.locked) + 1 # 差分の2ページ目で失敗します
+    with pytest.raises(HttpError):
+        mirror.refresh(service, "cal", executor)
+    assert mirror.sync_state("cal")["sync_token"] == token
+
+    backend.fail_after = None
+    summary = mirror.refresh(service, "cal", executor)
+    assert not summary["full"]
+    assert mirror.sync_state("cal")["count"] == 11 + MIRROR_LIST_PAGE_SIZE
@@ -0,0 +1,128 @@
+# tests/test_credential_store.py
+#
+# 共有の認証情報が、多数のセッションから同時に使われても1回だけ更新されること、
+# 更新中も get() が待たされないこと、token.pickle の移行と暗号化した保存ファイルの読み書きの確認です。
+
+import json
+import pickle
+import threading
+from datetime import timedelta
+
+import pytest
+from cryptography.fernet import Fernet
+from google.oauth2.credentials import Credentials
+
+from credential_store import CredentialManager, _utcnow
+
+class FakeCredentials:
+    # 更新（refresh）の回数を数え、release が設定されるまで更新を終えない認証情報です
+    def __init__(self, expires_in):
+        self.token = "token-0"
+        self.refresh_token = "refresh"
+        self.expiry = _utcnow() + timedelta(seconds=expires_in)
+        self.refresh_count = 0
+        self.refresh_started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    @property
+    def valid(self):
+        return self.expiry > _utcnow()
+
+    def refresh(self, request):
+        self.refresh_started.set()
+        self.release.wait(5)
+        self.refresh_count += 1
+        self.token = f"token-{self.refresh_count}"
+        self.expiry = _utcnow() + timedelta(hours=1)
+
+    def to_json(self):
+        return json.dumps({"token": self.token, "refresh_token": self.refresh_token})
+
+def _credentials():
+    return Credentials(
+        token="access", refresh_token="refresh", client_id="client", client_secret="secret",
+        token_uri="https://oauth2.googleapis.com/token", expiry=_utcnow() + timedelta(hours=1)
+    )
+
+@pytest.fixture
+def manager_factory(tmp_path):
+    managers = []
+
+    def create(key=None):
+        manager = CredentialManager(str(tmp_path / "token.json"), key=key, legacy_path=str(tmp_path / "token.pickle"))
+        managers.append(manager)
+        return manager
+
+    yield create
+    for manager in managers:
+        manager.stop()
+
+def test_expired_credentials_are_refreshed_once_for_many_sessions(manager_factory):
+    manager = manager_factory()
+    creds = FakeCredentials(expires_in=-60)
+    creds.release.clear()
+    manager.set(creds)
+
+    results = []
+    sessions = [threading.Thread(target=lambda: results.append(manager.get())) for _ in range(20)]
+    for session in sessions:
+        session.start()
+    assert creds.refresh_started.wait(5)
+    creds.release.set()
+    for session in sessions:
+        session.join(5)
+
+    assert results == [creds] * 20
+    assert creds.refresh_count == 1
+    assert manager.refresh_count == 1
+
+def test_get_does_not_wait_for_background_refresh(manager_factory):
+    manager = manager_factory()
+    creds = FakeCredentials(expires_in=120) # 有効ですが更新の時期（期限の10分前）を過ぎています
+    creds.release.clear()
+    manager.set(creds)
+    assert creds.refresh_started.wait(5) # 更新スレッドがロックを持ったまま更新中です
+
+    results = []
+    session = threading.Thread(target=lambda: results.append(manager.get()))
+    session.start()
+    session.join(1)
+    creds.release.set()
+
+    assert results == [creds]
+    manager.stop()
+    manager._thread.join(5)
+    assert creds.refresh_count == 1
+
+@pytest.mark.parametrize("encrypted", [False, True])
+def test_legacy_pickle_is_migrated(tmp_path, manager_factory, encrypted):
+    key = Fernet.generate_key() if encrypted else None
+    with open(tmp_path / "token.pickle", "wb") as f:
+        pickle.dump(_credentials(), f)
+
+    creds = manager_factory(key).get()
+
+    assert creds.token == "access"
+    assert not (tmp_path / "token.pickle").exists()
+    data = (tmp_path / "token.json").read_bytes()
+    if encrypted:
+        data = Fernet(key).decrypt(data)
+    assert json.loads(data)["refresh_token"] == "refresh"
+    # 移行後は新しい保存ファイルから読み込みます
+    assert manager_factory(key).get().token == "access"
+
+def test_encrypted_store_round_trip(tmp_path, manager_factory):
+    key = Fernet.generate_key()
+    manager_factory(key).set(_credentials())
+
+    assert not (tmp_path / "token.json").read_bytes().lstrip().startswith(b"{")
+    assert manager_factory(key).get().refresh_token == "refresh"
+
+def test_plain_store_is_encrypted_once_a_key_is_set(tmp_path, manager_factory):
+    manager_factory().set(_credentials())
+    assert (tmp_path / "token.json").read_bytes().startswith(b"{")
+
+    key = Fernet.generate_key()
+    assert manager_factory(key).get().token == "access"
+    assert json.loads(Fernet(key).decrypt((tmp_path / "token.json").read_bytes()))["token"] == "access"
@@ -0,0 +1,84 @@
+# tests/test_delete_events.py
+#
+# 期間指定の削除・確認済みイベントの削除が、スロットリングを受けても取りこぼさないことの確認です。
+
+from datetime import datetime
+
+import pytest
+
+from api_executor import ApiExecutor
+from benchmarks.fake_calendar import FakeCalendarBackend, build_fake_service
+from calendar_utils import delete_events_by_ids, delete_events_in_range, preview_events_in_range
+
+START = datetime(2025, 1, 6)
+END = datetime(2025, 1, 31)
+
+def _seed(backend, count, calendar_id="cal"):
+    backend.seed_events(calendar_id, [
+        {
+            "summary": f"予定{i}",
+            "start": {"dateTime": f"2025-01-{6 + i % 20:02d}T09:00:00+09:00"},
+            "end": {"dateTime": f"2025-01-{6 + i % 20:02d}T10:00:00+09:00"},
+        }
+        for i in range(count)
+    ])
+
+@pytest.fixture
+def executor():
+    return ApiExecutor(rate_per_second=1e6, burst=1e6, base_delay=0.001, max_delay=0.001)
+
+def test_delete_by_ids_retries_throttled_items(executor):
+    backend = FakeCalendarBackend()
+    service = build_fake_service(backend)
+    _seed(backend, 500)
+    preview = preview_events_in_range(service, "cal", START, END, executor=executor)
+    assert len(preview["events"]) == 500
+
+    backend.error_rate = 0.05 # 削除のサブリクエストの5%に429を返します
+    result = delete_events_by_ids(service, "cal", preview["events"], executor=executor)
+
+    assert backend.errors[429] > 0
+    assert result["failures"] == []
+    assert result["deleted"] == result["found"] == 500
+    assert backend.count("cal") == 0
+
+def test_delete_in_range_retries_throttled_items(executor):
+    backend = FakeCalendarBackend(error_rate=0.05, seed=2)
+    service = build_fake_service(backend)
+    _seed(backend, 500)
+
+    result = delete_events_in_range(service, "cal", START, END, executor=executor)
+
+    assert backend.errors[429] > 0
+    assert result["error"] is None
+    assert result["failures"] == []
+    assert backend.count("cal") == 0
+
+def test_already_deleted_events_count_as_deleted(executor):
+    backend = FakeCalendarBackend()
+    service = build_fake_service(backend)
+    _seed(backend, 10)
+    events = preview_events_in_range(service, "cal", START, END, executor=executor)["events"]
+    delete_events_by_ids(service, "cal", events[:4], executor=executor)
+
+    # 削除済み（410）と存在しない（404）イベントを含めて削除しても失敗になりません
+    result = delete_events_by_ids(service, "cal", events + [{"id": "missing"}], executor=executor)
+
+    assert result["failures"] == []
+    assert result["deleted"] == 11
+    assert backend.count("cal") == 0
+
+def test_delete_by_ids_reports_progress(executor):
+    backend = FakeCalendarBackend()
+    service = build_fake_service(backend)
+    _seed(backend, 120)
+    events = preview_events_in_range(service, "cal", START, END, executor=executor)["events"]
+    calls = []
+
+    delete_events_by_ids(
+        service, "cal", events, max_concurrent_batches=1, progress_interval=0,
+        progress_callback=lambda deleted, found: calls.append((deleted, found)), executor=executor
+    )
+
+    # 1バッチ（50件）ずつ送信し、完了するたびに進捗を通知します
+    assert calls == [(50, 120), (100, 120), (120, 120), (120, 120)]
@@ -0,0 +1,44 @@
+# tests/test_excel_parser_parity.py
+#
+# 列単位に書き換えた process_excel_files が、最初の iterrows 版と同じ結果を返すことの確認です。
+# fixtures/parser_input.xlsx（空欄・変換できない日時・重複した管理番号・札幌市以外の住所などを含む）を
+# 当時の実装で処理した結果を fixtures/parser_baseline.json に保存してあり、それと比べます。
+# 当時は出力になかった 管理番号 の列（差分同期用に後から追加）は比較から除きます。
+
+import io
+import json
+import math
+import os
+
+import pytest
+
+from excel_parser import process_excel_files
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+with open(os.path.join(FIXTURES, "parser_baseline.json"), encoding="utf-8") as f:
+    BASELINE = json.load(f)
+
+def _workbook():
+    with open(os.path.join(FIXTURES, "parser_input.xlsx"), "rb") as f:
+        buffer = io.BytesIO(f.read())
+    buffer.name = "parser_input.xlsx"
+    return buffer
+
+def _records(df):
+    # 欠損値は JSON の null と比べられるよう None にします
+    return [
+        {key: None if isinstance(value, float) and math.isnan(value) else value for key, value in record.items()}
+        for record in df.to_dict(orient="records")
+    ]
+
+@pytest.mark.parametrize("case", sorted(BASELINE))
+def test_output_matches_baseline(case):
+    expected = BASELINE[case]
+    df = process_excel_files(
+        [_workbook()], expected["description_columns"], expected["all_day_event"], expected["private_event"]
+    )
+    assert "管理番号" in df.columns
+    df = df.drop(columns="管理番号")
+    assert list(df.columns) == list(expected["records"][0])
+    assert _records(df) == expected["records"]
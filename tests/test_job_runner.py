@@ -0,0 +1,127 @@
+# tests/test_job_runner.py
+#
+# バックグラウンドジョブの再開が、二度押しや複数のセッションから同時に呼ばれても1回だけ行われること、
+# 登録の途中で中断したジョブを再開しても同じイベントが重複して登録されないことの確認です。
+
+import threading
+
+import pytest
+
+import api_executor
+import job_runner
+from api_executor import ApiExecutor
+from benchmarks.fake_calendar import FakeCalendarBackend, build_fake_service
+from job_runner import (
+    JOB_DONE, JOB_FAILED, JOB_INTERRUPTED, JOB_QUEUED, JOB_RUNNING, JobRunner, JobStore, import_event_id
+)
+
+@pytest.fixture
+def runner(tmp_path, monkeypatch):
+    runner = JobRunner(JobStore(str(tmp_path / "jobs.sqlite3")))
+    started = []
+    # ワーカーでは送信せず、開始されたジョブを記録するだけにします
+    monkeypatch.setattr(runner, "_start", lambda job_id, creds: started.append(job_id))
+    runner.started = started
+    return runner
+
+def _interrupted_job(store):
+    job_id = store.create_job("import", "cal", {}, [("予定", {"summary": "予定"})])
+    store.set_status(job_id, JOB_INTERRUPTED)
+    return job_id
+
+def test_resume_starts_interrupted_job_once(runner):
+    job_id = _interrupted_job(runner.store)
+
+    assert runner.resume(job_id, creds=None) is True
+    assert runner.resume(job_id, creds=None) is False # 二度押し
+    assert runner.started == [job_id]
+    assert runner.store.get_job(job_id)["status"] == JOB_QUEUED
+
+def test_concurrent_resumes_start_one_worker(runner):
+    job_id = _interrupted_job(runner.store)
+    barrier = threading.Barrier(10)
+    results = []
+
+    def resume():
+        barrier.wait()
+        results.append(runner.resume(job_id, creds=None))
+
+    threads = [threading.Thread(target=resume) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 1
+    assert runner.started == [job_id]
+
+@pytest.mark.parametrize("status", [JOB_QUEUED, JOB_RUNNING, JOB_DONE])
+def test_resume_refuses_active_or_finished_jobs(runner, status):
+    job_id = _interrupted_job(runner.store)
+    runner.store.set_status(job_id, status)
+
+    assert runner.resume(job_id, creds=None, retry_failed=True) is False
+    assert runner.started == []
+    assert runner.store.get_job(job_id)["status"] == status
+
+def test_worker_does_not_run_a_job_that_is_no_longer_queued(tmp_path):
+    runner = JobRunner(JobStore(str(tmp_path / "jobs.sqlite3")))
+    job_id = _interrupted_job(runner.store)
+
+    runner._run(job_id, creds=None) # 待機中でないジョブは実行しません（認証情報なしでも失敗しません）
+
+    assert runner.store.get_job(job_id)["status"] == JOB_INTERRUPTED
+    assert job_id not in runner.metrics
+
+def _event(number):
+    return {
+        "summary": f"予定{number}",
+        "start": {"dateTime": "2025-01-06T09:00:00", "timeZone": "Asia/Tokyo"},
+        "end": {"dateTime": "2025-01-06T10:00:00", "timeZone": "Asia/Tokyo"},
+    }
+
+def test_interrupted_import_resumes_without_duplicates(tmp_path, monkeypatch):
+    backend = FakeCalendarBackend()
+    service = build_fake_service(backend)
+    monkeypatch.setattr(job_runner, "get_calendar_service", lambda creds: service)
+    monkeypatch.setattr(api_executor, "_default_executor", ApiExecutor(rate_per_second=1e6, burst=1e6, max_concurrency=1))
+    runner = JobRunner(JobStore(str(tmp_path / "jobs.sqlite3")))
+    job_id = runner.store.create_job("import", "cal", {}, [(f"予定{i}", _event(i)) for i in range(320)])
+
+    # 3回目の記録で失敗させ、送信済みのバッチ（3つ目）が pending のまま残る中断を再現します
+    mark_rows = runner.store.mark_rows
+    calls = []
+
+    def failing_mark_rows(job_id, updates):
+        calls.append(len(updates))
+        if len(calls) == 3:
+            raise RuntimeError("中断")
+        mark_rows(job_id, updates)
+
+    monkeypatch.setattr(runner.store, "mark_rows", failing_mark_rows)
+    runner._run(job_id, creds=None)
+    job = runner.store.get_job(job_id)
+    assert job["status"] == JOB_FAILED
+    assert job["done"] == 100 # バッチ（50件）ごとに記録されています
+    assert backend.count("cal") > job["done"]
+
+    monkeypatch.setattr(runner.store, "mark_rows", mark_rows)
+    monkeypatch.setattr(runner, "_start", runner._run) # ワーカーを使わずにこのスレッドで再開します
+    assert runner.resume(job_id, creds=None) is True
+
+    job = runner.store.get_job(job_id)
+    assert job["status"] == JOB_DONE
+    assert (job["done"], job["failed"], job["pending"]) == (320, 0, 0)
+    assert backend.count("cal") == 320
+    assert {event["id"] for event in backend.events("cal")} == {import_event_id(job_id, i) for i in range(320)}
+
+def test_interrupted_enqueue_leaves_no_job(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+
+    def rows():
+        yield "予定0", _event(0)
+        raise KeyboardInterrupt # 行の追加中の画面の再実行など
+
+    with pytest.raises(KeyboardInterrupt):
+        store.create_job("import", "cal", {}, rows())
+    assert store.list_jobs() == []
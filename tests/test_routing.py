@@ -0,0 +1,66 @@
+# tests/test_routing.py
+#
+# 通常の登録（画面・CLI）と振り分け登録が、共通の register_events で同じように登録・差分同期することの確認です。
+
+import pandas as pd
+import pytest
+
+from api_executor import ApiExecutor
+from benchmarks.fake_calendar import FakeCalendarBackend, build_fake_service
+from event_batch import EventBatch
+from routing import register_events, register_routed_events, route_by_rules, split_batch
+
+def _batch(count, keyed=True):
+    start = pd.Series(pd.date_range("2025-01-06 09:00", periods=count, freq="D"))
+    return EventBatch.from_frame(pd.DataFrame({
+        "Subject": [f"予定{i}" for i in range(count)],
+        "Start": start,
+        "End": start + pd.Timedelta(hours=1),
+        "Location": ["中央区" if i % 2 else "北区" for i in range(count)],
+        "Description": [""] * count,
+        "管理番号": [f"{i:04d}" if keyed and i % 3 else "" for i in range(count)],
+    }))
+
+@pytest.fixture
+def executor():
+    return ApiExecutor(rate_per_second=1e6, burst=1e6, base_delay=0.001, max_delay=0.001)
+
+def test_register_without_sync_inserts_every_row(executor):
+    backend = FakeCalendarBackend()
+    service = build_fake_service(backend)
+    calls = []
+
+    result = register_events(service, "cal", _batch(120), executor=executor,
+                             progress_callback=lambda processed, total: calls.append((processed, total)))
+
+    assert (result["events"], result["inserted"], result["failures"]) == (120, 120, [])
+    assert backend.count("cal") == 120
+    assert calls[-1] == (120, 120)
+
+def test_register_with_sync_inserts_unkeyed_rows_and_skips_unchanged(executor):
+    backend = FakeCalendarBackend()
+    service = build_fake_service(backend)
+    batch = _batch(30)
+
+    first = register_events(service, "cal", batch, sync=True, executor=executor)
+    second = register_events(service, "cal", batch, sync=True, executor=executor)
+
+    assert (first["inserted"], first["failures"]) == (30, [])
+    # 管理番号のある20件は変更なし、管理番号のない10件だけが再び追加されます
+    assert (second["inserted"], second["unchanged"], second["updated"]) == (10, 20, 0)
+    assert backend.count("cal") == 40
+
+def test_routed_registration_uses_the_same_path(executor):
+    backend = FakeCalendarBackend()
+    service = build_fake_service(backend)
+    batch = _batch(30)
+    rules = [("Location", "^中央区", "chuo"), ("Location", "^北区", "kita")]
+    groups, unrouted = split_batch(batch, route_by_rules(batch, rules))
+
+    results = register_routed_events(service, groups, sync=True, executors={"chuo": executor, "kita": executor})
+
+    assert len(unrouted) == 0
+    assert {target: (result["inserted"], result["error"]) for target, result in results.items()} == {
+        "chuo": (15, None), "kita": (15, None)
+    }
+    assert backend.count("chuo") == backend.count("kita") == 15
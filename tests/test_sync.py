@@ -0,0 +1,100 @@
+# tests/test_sync.py
+#
+# 管理番号による差分同期（sync_events_to_calendar）の確認です。
+# 一覧取得で照合する場合と、ローカルの索引（calendar_mirror）で照合する場合の両方で、
+# 登録・変更なし・更新・ファイルにないイベントの削除・重複の削除・期間外への日付の移動を確かめます。
+
+import pytest
+
+import calendar_utils
+from api_executor import ApiExecutor
+from benchmarks.fake_calendar import FakeCalendarBackend, build_fake_service
+from calendar_mirror import CalendarMirror
+from calendar_utils import SYNC_KEY_PROPERTY, attach_sync_properties, sync_events_to_calendar
+
+def _event(summary, day, hour=9):
+    return {
+        "summary": summary,
+        "location": "",
+        "description": "",
+        "start": {"dateTime": f"2025-{day}T{hour:02d}:00:00", "timeZone": "Asia/Tokyo"},
+        "end": {"dateTime": f"2025-{day}T{hour + 1:02d}:00:00", "timeZone": "Asia/Tokyo"},
+    }
+
+def _keys(backend):
+    return sorted(event["extendedProperties"]["private"][SYNC_KEY_PROPERTY] for event in backend.events("cal"))
+
+@pytest.fixture(params=["list", "mirror"])
+def sync(request, tmp_path):
+    backend = FakeCalendarBackend()
+    service = build_fake_service(backend)
+    executor = ApiExecutor(rate_per_second=1e6, burst=1e6, base_delay=0.001, max_delay=0.001)
+    mirror = CalendarMirror(str(tmp_path / "mirror.sqlite3")) if request.param == "mirror" else None
+
+    def run(rows, delete_orphans=False):
+        return sync_events_to_calendar(service, "cal", rows, delete_orphans=delete_orphans, executor=executor, mirror=mirror)
+
+    run.backend = backend
+    return run
+
+def test_inserts_new_keys_and_skips_unchanged(sync):
+    summary = sync([("A", _event("A", "03-01")), ("B", _event("B", "05-01"))])
+    assert (summary["inserted"], summary["unchanged"]) == (2, 0)
+
+    summary = sync([("A", _event("A", "03-01")), ("B", _event("B", "05-01"))])
+    assert (summary["inserted"], summary["updated"], summary["unchanged"]) == (0, 0, 2)
+    assert _keys(sync.backend) == ["A", "B"]
+
+def test_patches_changed_events(sync):
+    sync([("A", _event("A", "03-01")), ("B", _event("B", "05-01"))])
+
+    summary = sync([("A", _event("A 変更", "03-01")), ("B", _event("B", "05-01"))])
+
+    assert (summary["inserted"], summary["updated"], summary["unchanged"]) == (0, 1, 1)
+    assert sorted(event["summary"] for event in sync.backend.events("cal")) == ["A 変更", "B"]
+
+def test_deletes_orphans_only_inside_the_window(sync):
+    sync([("A", _event("A", "03-01")), ("B", _event("B", "03-10")), ("C", _event("C", "08-01"))])
+
+    # 3/1〜3/10 のファイルに B がないため B は削除し、期間外の C は残します
+    summary = sync([("A", _event("A", "03-01")), ("D", _event("D", "03-10"))], delete_orphans=True)
+
+    assert (summary["inserted"], summary["deleted"]) == (1, 1)
+    assert _keys(sync.backend) == ["A", "C", "D"]
+
+def test_orphans_are_kept_without_delete_orphans(sync):
+    sync([("A", _event("A", "03-01")), ("B", _event("B", "03-10"))])
+    summary = sync([("A", _event("A", "03-01")), ("C", _event("C", "03-10"))])
+    assert summary["deleted"] == 0
+    assert _keys(sync.backend) == ["A", "B", "C"]
+
+def test_deletes_duplicates(sync):
+    sync.backend.seed_events("cal", [
+        attach_sync_properties(_event("A", "03-01"), "A"),
+        attach_sync_properties(_event("A", "03-01"), "A"),
+    ])
+
+    summary = sync([("A", _event("A", "03-01"))], delete_orphans=True)
+
+    assert (summary["inserted"], summary["unchanged"], summary["deleted"]) == (0, 1, 1)
+    assert _keys(sync.backend) == ["A"]
+
+@pytest.mark.parametrize("delete_orphans", [False, True])
+def test_rescheduled_row_outside_previous_window_is_patched(sync, delete_orphans):
+    sync([("A", _event("A", "03-01")), ("B", _event("B", "05-01"))])
+
+    summary = sync([("A", _event("A", "06-01"))], delete_orphans=delete_orphans)
+
+    assert (summary["inserted"], summary["updated"]) == (0, 1)
+    events = {event["summary"]: event for event in sync.backend.events("cal")}
+    assert len(events) == 2 # A を移動しただけで、2件目は作りません
+    assert events["A"]["start"]["dateTime"].startswith("2025-06-01")
+
+def test_many_rescheduled_rows_use_one_full_listing(sync, monkeypatch):
+    monkeypatch.setattr(calendar_utils, "SYNC_KEY_LOOKUP_LIMIT", 2)
+    sync([(key, _event(key, "03-01")) for key in "ABCDE"])
+
+    summary = sync([(key, _event(key, "09-01")) for key in "ABCDE"], delete_orphans=True)
+
+    assert (summary["inserted"], summary["updated"], summary["deleted"]) == (0, 5, 0)
+    assert _keys(sync.backend) == list("ABCDE")